@@ -0,0 +1,128 @@
+"""
+Bulk transfer throughput between two local aiortc peers (`BulkTransfer`).
+
+Connects two peer connections in-process (loopback ICE, no signaling server), sends a random
+file of --size MB for every combination of --channels and --chunk-kb, checks the received copy
+and reports the throughput, the flow control stalls and the peak `bufferedAmount` of the sender.
+--unpaced disables the flow control (everything is queued at once, the receiver's reordering
+window is unbounded) for comparison.
+
+--resume interrupts every transfer halfway and sends the file again: the second attempt resumes
+at the receiver's offset, the chunks still in flight from the first one are ignored.
+
+    python benchmarks/bench_bulk_transfer.py --size 32
+    python benchmarks/bench_bulk_transfer.py --size 32 --channels 1 4 --chunk-kb 16 64 256
+    python benchmarks/bench_bulk_transfer.py --size 32 --unpaced
+    python benchmarks/bench_bulk_transfer.py --size 32 --resume
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import sys, os
+import tempfile
+
+from aiortc import RTCPeerConnection
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.BulkTransfer import BulkTransfer
+
+logger = logging.getLogger(__name__)
+
+
+async def connect_pair() -> tuple[RTCPeerConnection, RTCPeerConnection]:
+    sender, receiver = RTCPeerConnection(), RTCPeerConnection()
+    sender.createDataChannel("chat")
+    await sender.setLocalDescription(await sender.createOffer())
+    await receiver.setRemoteDescription(sender.localDescription)
+    await receiver.setLocalDescription(await receiver.createAnswer())
+    await sender.setRemoteDescription(receiver.localDescription)
+    return sender, receiver
+
+def sha256(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+async def sample_buffered(sender: BulkTransfer, pc: RTCPeerConnection, peak: list[int]):
+    while True:
+        link = sender.links.get(pc)
+        if link is not None:
+            peak[0] = max(peak[0], sum(channel.bufferedAmount for channel in link.channels))
+        await asyncio.sleep(0.005)
+
+async def interrupt_halfway(receiver: BulkTransfer, send: asyncio.Task, size: int):
+    while not send.done():
+        if any(transfer.offset > size // 2 for transfer in receiver.incoming.values()):
+            send.cancel()  # The channels stay open, the next offer replaces the transfer
+            return
+        await asyncio.sleep(0.005)
+
+async def measure(source: str, channels=2, chunk_size=16 * 1024, unpaced=False, resume=False) -> dict:
+    size = os.path.getsize(source)
+    with tempfile.TemporaryDirectory() as directory:
+        sender_pc, receiver_pc = await connect_pair()
+        # Unpaced, one channel can be the whole file ahead of the other: the receiver's window must allow it
+        sender = BulkTransfer(logger, channels=channels, chunk_size=chunk_size, **({"high_water": 2**62} if unpaced else {}))
+        receiver = BulkTransfer(logger, directory=directory, **({"window": 2**62} if unpaced else {}))
+        receiver_pc.on("datachannel", receiver.accept_channel)
+
+        peak = [0]
+        sampler = asyncio.create_task(sample_buffered(sender, sender_pc, peak))
+        try:
+            if resume:
+                send = asyncio.create_task(sender.send_file(sender_pc, source))
+                await interrupt_halfway(receiver, send, size)
+                try:
+                    await send
+                except asyncio.CancelledError:
+                    pass
+            stats = await sender.send_file(sender_pc, source)
+        finally:
+            sampler.cancel()
+            await sender_pc.close()
+            await receiver_pc.close()
+
+        received = os.path.join(directory, os.path.basename(source))
+        return {
+            **stats,
+            "chunk_kb": chunk_size // 1024,
+            "unpaced": unpaced,
+            "peak_buffered_kb": peak[0] // 1024,
+            "intact": sha256(received) == sha256(source),
+        }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=float, default=16, help="file size in MB")
+    parser.add_argument("--channels", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--chunk-kb", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--unpaced", action="store_true", help="no bufferedAmount flow control")
+    parser.add_argument("--resume", action="store_true", help="interrupt halfway and resume")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "track.flac")
+        with open(source, "wb") as file:
+            file.write(os.urandom(int(args.size * 1024 * 1024)))
+
+        for channels in args.channels:
+            for chunk_kb in args.chunk_kb:
+                result = await measure(source, channels, chunk_kb * 1024, args.unpaced, args.resume)
+                results.append(result)
+                resumed = f" resumed at {result['resumed_from'] / 2**20:.1f} MB" if args.resume else ""
+                print(f"channels={channels} chunk={chunk_kb:4}KB: {result['mbps']:6.1f} Mbit/s in {result['seconds']:6.2f}s, "
+                      f"{result['stalls']:5} stalls, peak buffered {result['peak_buffered_kb']:7} KB, "
+                      f"{'intact' if result['intact'] else 'CORRUPTED'}{resumed}")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
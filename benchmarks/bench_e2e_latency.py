@@ -0,0 +1,241 @@
+"""
+End-to-end audio latency between two win client peers over local loopback.
+
+Starts the signaling server in-process and two `SignalingClient`s on 127.0.0.1. The sender
+captures a `MarkerBackend` (a short tone burst every --interval seconds, capture time recorded),
+the receiver mixes into a `MarkerSink` which records when each burst plays out.
+
+Reports capture -> playout latency (capture thread, encoder, RTP, jitter buffers, mixer) and
+signaling setup: receiver start -> peer connection connected -> first marker played.
+The output device's own buffer is not included.
+
+Each detection is matched to the latest marker captured before it, so latency above --interval
+is not measurable (reported as unmatched).
+
+With --listeners N the sender streams to N receivers: directly (mesh, N uploads) or with --sfu
+through the server's SFU (one upload). The sender's upload bitrate is reported.
+
+With --trace FILE every client traces its negotiations (JOIN -> OFFER -> ANSWER -> connected, see
+`SignalingTracer`); the spans are appended to FILE and the sender's are broken down per hop.
+
+    python benchmarks/bench_e2e_latency.py --seconds 10
+    python benchmarks/bench_e2e_latency.py --seconds 30 --json latency.json
+    python benchmarks/bench_e2e_latency.py --listeners 4 --sfu
+    python benchmarks/bench_e2e_latency.py --trace negotiation.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import ssl
+import sys, os
+import time
+
+import numpy as np
+import websockets
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from config import get_ssl_context
+from servers import signaling_main
+from servers.signaling_main import signaling_server
+from includes.AudioMixer import AudioMixer
+from includes.MediaController import MediaController
+from includes.SignalingTracer import SignalingTracer
+from includes.WebSocketClient import WebSocketClient
+from includes.audio_backends import MarkerBackend
+from includes.audio_sinks import MarkerSink
+from includes.audio_tracks import CustomAudioTrack
+from includes.media_backends import FakeMediaBackend
+from includes.peer_stats import summarize_report
+from win_client_main import SignalingClient
+
+logger = logging.getLogger(__name__)
+
+
+def client_ssl_context() -> ssl.SSLContext:
+    ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+def match_markers(markers: list[float], detections: list[float], interval: float) -> tuple[list[float], int]:
+    """
+    :returns: latency of every detection matched to the latest earlier marker, unmatched detections
+    """
+    latencies, unmatched = [], 0
+    markers = np.array(markers)
+    for detected_at in detections:
+        index = np.searchsorted(markers, detected_at) - 1
+        if index >= 0 and detected_at - markers[index] < interval:
+            latencies.append(detected_at - markers[index])
+        else:
+            unmatched += 1
+    return latencies, unmatched
+
+def distribution(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "min_ms": round(float(values.min()), 1),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p90_ms": round(float(np.percentile(values, 90)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "max_ms": round(float(values.max()), 1),
+        "mean_ms": round(float(values.mean()), 1),
+    }
+
+def create_client(name: str, url: str, audio_track, playback: AudioMixer = None, trace_path: str = None) -> SignalingClient:
+    tracer = SignalingTracer(logger, trace_path) if trace_path else None
+    wsc = WebSocketClient(url, client_ssl_context(), logger, tracer=tracer)
+    media_controller = MediaController(logger, FakeMediaBackend(logger))
+    return SignalingClient(name=name, logger=logger, media_controller=media_controller, wsc=wsc, audio_track=audio_track,
+                           encode_once=True, playback=playback)
+
+async def stop_client(client: SignalingClient, task: asyncio.Task):
+    if client.wsc.websocket is not None:
+        await client.wsc.close()
+    await task
+    for remote_user in client.remotePeers.values():
+        if remote_user.peerConnection is not None:
+            await remote_user.peerConnection.close()
+    client.audio_broadcaster.stop()
+    client.audio_track.stop()
+
+async def bytes_sent(client: SignalingClient) -> int:
+    total = 0
+    for remote_user in client.remotePeers.values():
+        if remote_user.peerConnection is not None:
+            total += summarize_report(await remote_user.peerConnection.getStats())["bytes_sent"]
+    return total
+
+def connected(client: SignalingClient) -> bool:
+    return any(peer.peerConnection is not None and peer.peerConnection.connectionState == "connected" for peer in client.remotePeers.values())
+
+def negotiation_breakdown(spans: list[dict]) -> dict:
+    """
+    :returns: median milliseconds of every hop-to-hop segment and of the whole negotiation
+    """
+    segments: dict[str, list[float]] = {}
+    for span in spans:
+        for segment in span["segments"]:
+            segments.setdefault(segment["name"], []).append(segment["ms"])
+    return {
+        "spans": len(spans),
+        "total_ms": float(np.median([span["total_ms"] for span in spans])) if spans else None,
+        "segments_ms": {name: float(np.median(values)) for name, values in segments.items()},
+    }
+
+async def measure(seconds=10.0, interval=0.5, jitter_frames=3, profile="music", listeners=1, sfu=False, trace_path=None, connect_timeout=10.0) -> dict:
+    if sfu:
+        signaling_main.enable_sfu()
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0, ssl=get_ssl_context())
+    url = f"wss://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    backend = MarkerBackend(logger, interval=interval)
+    sender = create_client("sender", url, CustomAudioTrack(logger, profile, backend=backend), trace_path=trace_path)
+    sinks = [MarkerSink(logger) for _ in range(listeners)]
+    receivers = [
+        create_client(f"receiver{i}", url, CustomAudioTrack(logger, profile, backend=MarkerBackend(logger, amplitude=0)),
+                      playback=AudioMixer(logger, sink, jitter_frames=jitter_frames), trace_path=trace_path)
+        for i, sink in enumerate(sinks)
+    ]
+
+    sender_task = asyncio.create_task(sender.run())
+    deadline = time.perf_counter() + connect_timeout
+    while sender.id is None:
+        if sender_task.done() or time.perf_counter() > deadline:
+            server.close()
+            raise RuntimeError("The sender never got its id") from (sender_task.exception() if sender_task.done() else None)
+        await asyncio.sleep(0.01)
+
+    # The receivers' JOIN makes the sender offer, like browsers joining the bot
+    started_at = time.perf_counter()
+    receiver_tasks = [asyncio.create_task(receiver.run()) for receiver in receivers]
+    connected_at = upload_from = None
+    try:
+        while time.perf_counter() - started_at < seconds:
+            await asyncio.sleep(0.01)
+            if connected_at is None and all(connected(receiver) for receiver in receivers):
+                connected_at = time.perf_counter()
+                upload_from = (connected_at, await bytes_sent(sender))
+        upload = (await bytes_sent(sender) - upload_from[1]) / (time.perf_counter() - upload_from[0]) if upload_from else None
+    finally:
+        playback_stats = receivers[0].playback.get_stats()
+        audio_uploads = len(sender.audio_broadcaster.subscribers)
+        sfu_stats = signaling_main.sfu.get_stats() if sfu else None
+        for receiver, task in zip(receivers, receiver_tasks):
+            await stop_client(receiver, task)
+        await stop_client(sender, sender_task)
+        server.close()
+        await server.wait_closed()
+        if sfu:
+            await signaling_main.disable_sfu()
+
+    latencies, unmatched = [], 0
+    for sink in sinks:
+        sink_latencies, sink_unmatched = match_markers(backend.markers, sink.detections, interval)
+        latencies += sink_latencies
+        unmatched += sink_unmatched
+    markers_after_connect = sum(marker > connected_at for marker in backend.markers) if connected_at else 0
+    first_detections = [sink.detections[0] for sink in sinks if sink.detections]
+    return {
+        "latency": distribution(latencies),
+        "listeners": listeners,
+        "sfu": sfu_stats,
+        "markers_sent": markers_after_connect * listeners,
+        "markers_detected": len(latencies),
+        "unmatched_detections": unmatched,
+        "setup": {
+            "connected_ms": round(1000 * (connected_at - started_at), 1) if connected_at else None,
+            "first_audio_ms": round(1000 * (max(first_detections) - started_at), 1) if len(first_detections) == listeners else None,
+        },
+        "sender": {
+            "audio_uploads": audio_uploads,
+            "upload_kbps": round(8 * upload / 1000, 1) if upload is not None else None,
+        },
+        "jitter_frames": jitter_frames,
+        "mixer": {key: playback_stats[key] for key in ("frames_mixed", "late_ticks", "mix_us_per_frame")},
+        "negotiation": negotiation_breakdown(sender.wsc.tracer.spans) if trace_path else None,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between markers")
+    parser.add_argument("--jitter-frames", type=int, default=3, help="receiver jitter buffer target, in 20 ms frames")
+    parser.add_argument("--listeners", type=int, default=1)
+    parser.add_argument("--sfu", action="store_true", help="forward through the server's SFU instead of the mesh")
+    parser.add_argument("--trace", help="trace the negotiations, spans are appended to this file")
+    parser.add_argument("--json", help="also write the results to this file (e.g. for CI)")
+    args = parser.parse_args()
+
+    # Every signaling message is logged at DEBUG otherwise
+    signaling_server.logger.setLevel(logging.WARNING)
+    signaling_main.logger.setLevel(logging.WARNING)
+
+    result = await measure(args.seconds, args.interval, args.jitter_frames, listeners=args.listeners, sfu=args.sfu, trace_path=args.trace)
+    latency, setup, sender = result["latency"], result["setup"], result["sender"]
+    print(f"listeners={args.listeners} {'sfu' if args.sfu else 'mesh'}: sender uploads {sender['audio_uploads']} audio stream(s), "
+          f"{sender['upload_kbps']}kbps")
+    print(f"markers: {result['markers_detected']}/{result['markers_sent']} detected, {result['unmatched_detections']} unmatched")
+    if latency["count"]:
+        print(f"capture->playout: p50={latency['p50_ms']}ms p90={latency['p90_ms']}ms p99={latency['p99_ms']}ms "
+              f"min={latency['min_ms']}ms max={latency['max_ms']}ms")
+    print(f"setup: connected={setup['connected_ms']}ms first audio={setup['first_audio_ms']}ms")
+    if result["negotiation"] and result["negotiation"]["spans"]:
+        negotiation = result["negotiation"]
+        print(f"negotiation (sender, {negotiation['spans']} spans): {negotiation['total_ms']:.1f}ms")
+        for name, ms in negotiation["segments_ms"].items():
+            print(f"  {name:45} {ms:8.2f}ms")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
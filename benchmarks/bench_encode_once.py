@@ -0,0 +1,82 @@
+"""
+CPU-per-listener benchmark of the win client audio send path.
+
+Compares aiortc's default (every sender encodes Opus itself) with the encode-once
+`AudioBroadcaster`. Senders are emulated exactly like `RTCRtpSender._next_encoded_frame`,
+the source is a real-time paced `SyntheticBackend`, so it runs on Linux.
+
+    python benchmarks/bench_encode_once.py --listeners 1,5,10 --frames 250
+"""
+import argparse
+import asyncio
+import logging
+import sys, os
+import time
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from av.frame import Frame
+from aiortc import RTCRtpCodecParameters
+from aiortc.codecs import get_encoder
+
+from includes.audio_backends import SyntheticBackend
+from includes.audio_tracks import CustomAudioTrack
+from includes.AudioBroadcaster import AudioBroadcaster
+
+OPUS = RTCRtpCodecParameters(mimeType="audio/opus", clockRate=48000, channels=2, payloadType=96)
+logger = logging.getLogger(__name__)
+
+
+async def emulated_sender(track, frames:int, sent_bytes:list):
+    """
+    Same work as RTCRtpSender: encode frames in an executor, only pack pre-encoded packets
+    """
+    loop = asyncio.get_running_loop()
+    encoder = get_encoder(OPUS)
+    for _ in range(frames):
+        data = await track.recv()
+        if isinstance(data, Frame):
+            payloads, _ = await loop.run_in_executor(None, encoder.encode, data, False)
+        else:
+            payloads, _ = encoder.pack(data)
+        sent_bytes.append(sum(len(p) for p in payloads))
+
+async def run(listeners:int, frames:int, encode_once:bool) -> dict:
+    source = CustomAudioTrack(logger, backend=SyntheticBackend(logger))
+    broadcaster = AudioBroadcaster(logger, source, max_queue=50, encode_once=encode_once)
+    tracks = [broadcaster.subscribe(codec=OPUS) for _ in range(listeners)]
+    sent_bytes = []
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(emulated_sender(track, frames, sent_bytes) for track in tracks))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    # Read before stopping: `stop` unsubscribes every track, which removes their groups
+    encodes = sum(group.frames_encoded for group in broadcaster.groups.values()) if encode_once else listeners * frames
+    broadcaster.stop()
+    return {
+        "cpu_percent": 100 * cpu / wall,
+        "cpu_ms_per_frame": 1000 * cpu / frames,
+        "encodes": encodes,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--listeners", default="1,5,10", help="comma separated listener counts")
+    parser.add_argument("--frames", type=int, default=250, help="20 ms frames per run")
+    args = parser.parse_args()
+
+    print(f"{'listeners':>9} {'mode':>12} {'encodes':>8} {'cpu %':>7} {'ms/frame':>9} {'% per listener':>15}")
+    for listeners in (int(n) for n in args.listeners.split(",")):
+        for encode_once in (False, True):
+            result = await run(listeners, args.frames, encode_once)
+            mode = "encode-once" if encode_once else "per-sender"
+            print(
+                f"{listeners:>9} {mode:>12} {result['encodes']:>8} {result['cpu_percent']:>7.2f} "
+                f"{result['cpu_ms_per_frame']:>9.3f} {result['cpu_percent'] / listeners:>15.3f}"
+            )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Memory of the signaling server per idle client.
+
+Starts the signaling server (handlers of `servers.signaling_main`) in a separate process, opens
+--clients websocket connections which confirm their id and then stay idle, and reports the
+server's RSS before and after: the difference per client is the per-connection footprint
+(TLS, websocket protocol, `User`, handler task).
+
+The connection options are the `SignalingServer` ones (see `SignalingServer.connection_options`).
+Linux only: RSS is read from /proc.
+
+    python benchmarks/bench_idle_connections.py --clients 10000
+    python benchmarks/bench_idle_connections.py --clients 2000 --compression none
+    python benchmarks/bench_idle_connections.py --clients 2000 --websockets-defaults
+"""
+import argparse
+import asyncio
+import asyncio.sslproto
+import json
+import resource
+import ssl
+import subprocess
+import sys, os
+import time
+
+import websockets
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + "/..")
+
+SERVER = """
+import asyncio, json, logging, sys
+from config import get_ssl_context
+from servers.signaling_main import signaling_server, logger
+options = json.loads(sys.argv[2])
+tls = options.pop("tls")
+if options.pop("websockets_defaults"):
+    signaling_server.connection_options = lambda: {}
+    signaling_server.tls_read_buffer = None
+else:
+    for key, value in options.items():
+        setattr(signaling_server, key, value)
+signaling_server.host, signaling_server.port = "127.0.0.1", int(sys.argv[1])
+signaling_server.ssl_context = get_ssl_context() if tls else None
+signaling_server.logger.setLevel(logging.WARNING)
+logger.setLevel(logging.WARNING)
+asyncio.run(signaling_server.start())
+"""
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    raise RuntimeError("no VmRSS")
+
+def raise_fd_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def open_client(url: str, ssl_context, compression, index: int):
+    websocket = await websockets.connect(url, ssl=ssl_context, compression=compression, open_timeout=60)
+    await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": f"idle{index}"}}))
+    await websocket.recv()
+    return websocket
+
+async def wait_listening(port: int, process: subprocess.Popen, timeout=30.0):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            await asyncio.sleep(0.05)
+    raise TimeoutError("server did not start listening")
+
+async def measure(clients=10000, tls=True, compression="deflate", websockets_defaults=False, concurrency=200, settle=2.0) -> dict:
+    raise_fd_limit(clients + 100)
+    port = free_port()
+    options = {"tls": tls, "websockets_defaults": websockets_defaults}
+    if not websockets_defaults:
+        options["compression"] = compression if compression == "deflate" else None
+    process = subprocess.Popen([sys.executable, "-c", SERVER, str(port), json.dumps(options)], cwd=ROOT,
+                               preexec_fn=lambda: raise_fd_limit(clients + 100))
+    try:
+        await wait_listening(port, process)
+        await asyncio.sleep(settle)
+        baseline = rss_kb(process.pid)
+
+        ssl_context = None
+        if tls:
+            # The load generator's own TLS buffers, so 10k clients fit next to the server
+            asyncio.sslproto.SSLProtocol.max_size = 2**14
+            ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+        url = f"{'wss' if tls else 'ws'}://127.0.0.1:{port}"
+
+        semaphore = asyncio.Semaphore(concurrency)
+        async def limited(index):
+            async with semaphore:
+                return await open_client(url, ssl_context, "deflate" if compression == "deflate" else None, index)
+
+        started = time.perf_counter()
+        websockets_ = await asyncio.gather(*(limited(index) for index in range(clients)))
+        connect_seconds = time.perf_counter() - started
+        await asyncio.sleep(settle)
+        loaded = rss_kb(process.pid)
+
+        await asyncio.gather(*(websocket.close() for websocket in websockets_), return_exceptions=True)
+    finally:
+        process.kill()
+        process.wait()
+
+    return {
+        "clients": clients,
+        "tls": tls,
+        "compression": "websockets defaults" if websockets_defaults else compression,
+        "rss_idle_mb": round(baseline / 1024, 1),
+        "rss_loaded_mb": round(loaded / 1024, 1),
+        "kb_per_client": round((loaded - baseline) / clients, 2),
+        "connect_seconds": round(connect_seconds, 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--no-tls", action="store_true")
+    parser.add_argument("--compression", choices=["deflate", "none"], default="deflate", help="offered by the clients")
+    parser.add_argument("--websockets-defaults", action="store_true", help="the server uses the websockets defaults instead")
+    args = parser.parse_args()
+
+    result = await measure(args.clients, not args.no_tls, args.compression, args.websockets_defaults)
+    print(f"{result['clients']} idle clients ({'tls' if result['tls'] else 'plain'}, {result['compression']}): "
+          f"RSS {result['rss_idle_mb']} -> {result['rss_loaded_mb']} MB, {result['kb_per_client']} KB per client "
+          f"(connected in {result['connect_seconds']}s)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+JOIN-to-connected latency of the win client, cold vs pre-warmed peer connections.
+
+The real `SignalingHandler.handle_join` / `PeerConnectionManager` run against a local
+aiortc peer which plays the browser. Signaling is in-process, so the numbers are
+peer connection setup (ICE gathering, DTLS) only.
+
+    python benchmarks/bench_join_latency.py --joins 5
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys, os
+import time
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import AudioStreamTrack
+
+from servers.includes.enums import MessageType
+from includes.AudioBroadcaster import AudioBroadcaster
+from includes.PeerConnectionManager import PeerConnectionManager
+from includes.SignalingHandler import SignalingHandler
+from includes.classes.clients import LocalClient
+
+logger = logging.getLogger(__name__)
+
+
+class LoopbackBrowser:
+    """
+    Stands in for the WebSocketClient: answers every OFFER with a local aiortc peer
+    """
+    def __init__(self):
+        self.handler: SignalingHandler = None
+        self.peers: list[RTCPeerConnection] = []
+
+    async def send_to(self, target, message_type: MessageType, payload: dict):
+        if message_type != MessageType.OFFER:
+            return
+
+        pc = RTCPeerConnection()
+        pc.addTransceiver("audio", "recvonly")
+        self.peers.append(pc)
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=payload["sdp"], type="offer"))
+        await pc.setLocalDescription(await pc.createAnswer())
+        asyncio.create_task(self.handler.handle_answer({"user": {"id": target.id}, "sdp": pc.localDescription.sdp}))
+
+async def noop(*args):
+    pass
+
+async def measure(joins:int, pool_size:int) -> tuple[list[float], list[float]]:
+    browser = LoopbackBrowser()
+    local_client = LocalClient("bench", id="local")
+    broadcaster = AudioBroadcaster(logger, AudioStreamTrack())
+    manager = PeerConnectionManager(logger, noop, noop, noop, pool_size=pool_size)
+    browser.handler = SignalingHandler(browser, local_client, manager, logger)
+
+    manager.start_pool(broadcaster)
+    offer_latencies, latencies = [], []
+    for i in range(joins):
+        # Steady state: the pool had time to refill since the previous join
+        while len(manager.pool) < pool_size:
+            await asyncio.sleep(0.05)
+
+        user_id = f"remote-{i}"
+        started_at = time.perf_counter()
+        await browser.handler.handle_join({"user": {"id": user_id, "name": user_id}}, broadcaster)
+        offer_latencies.append(time.perf_counter() - started_at)
+        while user_id not in manager.connect_latencies:
+            await asyncio.sleep(0.005)
+        latencies.append(manager.connect_latencies[user_id])
+
+    await manager.close_pool()
+    for remote_user in local_client.remotePeers.values():
+        await remote_user.peerConnection.close()
+    for pc in browser.peers:
+        await pc.close()
+    broadcaster.stop()
+    return offer_latencies, latencies
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--joins", type=int, default=5)
+    parser.add_argument("--pool-size", type=int, default=2)
+    args = parser.parse_args()
+
+    for label, pool_size in (("cold", 0), (f"pool={args.pool_size}", args.pool_size)):
+        offer_latencies, latencies = await measure(args.joins, pool_size)
+        offer_latencies = [1000 * latency for latency in offer_latencies]
+        latencies = [1000 * latency for latency in latencies]
+        print(
+            f"{label:>8}: join->offer sent median={statistics.median(offer_latencies):.1f}ms | "
+            f"join->connected median={statistics.median(latencies):.1f}ms "
+            f"min={min(latencies):.1f}ms max={max(latencies):.1f}ms"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Win client media pipeline benchmark: backend -> capture thread -> `recv()` -> `AudioFrame` -> Opus.
+
+Runs N independent streams at the real frame rate with any platform-neutral source
+and reports CPU per stream, frame timing jitter and (optionally) Python allocations.
+Frames are encoded with the first Opus settings of the capture profile.
+
+    python benchmarks/bench_media_pipeline.py --source tone --streams 4 --seconds 5
+    python benchmarks/bench_media_pipeline.py --source wav --path clip.wav --trace-alloc
+    python benchmarks/bench_media_pipeline.py --profile voice --device-rate 44100 --device-channels 2
+
+Microphone + loopback as one mixed track (--mix: the source plus a voice tone) versus two tracks:
+
+    python benchmarks/bench_media_pipeline.py --source noise --mix
+    python benchmarks/bench_media_pipeline.py --source noise --streams 2
+"""
+import argparse
+import asyncio
+import logging
+import sys, os
+import time
+import tracemalloc
+
+import numpy as np
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import SharedOpusEncoder
+from includes.audio_backends import SyntheticBackend, create_backend
+from includes.audio_tracks import CustomAudioTrack, MixedAudioTrack, MixSource
+from includes.capture_profiles import CAPTURE_PROFILES
+
+logger = logging.getLogger(__name__)
+
+
+class AllocationMeter:
+    """
+    Bytes allocated while tracemalloc runs, sampled once per frame: the traced peak since the
+    previous sample above the memory live at that sample. Only the highest point between two
+    samples counts, memory freed and allocated again in between doesn't: a lower bound.
+    """
+    def __init__(self):
+        tracemalloc.start()
+        self.allocated = 0
+        self._live, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+
+    def sample(self):
+        live, peak = tracemalloc.get_traced_memory()
+        self.allocated += peak - self._live
+        self._live = live
+        tracemalloc.reset_peak()
+
+
+async def drive_stream(track: CustomAudioTrack, frames:int, meter: AllocationMeter = None) -> dict:
+    encoder = SharedOpusEncoder(track.profile.encoder_profiles[0])
+    arrivals = np.zeros(frames)
+    encoded_bytes = 0
+
+    for i in range(frames):
+        frame = await track.recv()
+        arrivals[i] = time.perf_counter()
+        encoded_bytes += sum(packet.size for packet in encoder.encode(frame))
+        if meter is not None:
+            meter.sample()
+
+    return {"arrivals": arrivals, "bytes": encoded_bytes, **track.get_stats()}
+
+def jitter_ms(arrivals:np.ndarray, period:float) -> dict:
+    deviation = np.abs(np.diff(arrivals) - period) * 1000
+    return {"mean": deviation.mean(), "p99": np.percentile(deviation, 99), "max": deviation.max()}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="tone", choices=["tone", "noise", "wav", "pipe"])
+    parser.add_argument("--path", help="WAV file or PCM pipe for `wav`/`pipe` sources")
+    parser.add_argument("--profile", default="music", choices=list(CAPTURE_PROFILES))
+    parser.add_argument("--device-rate", type=int, help="native rate of the source, default: the profile rate")
+    parser.add_argument("--device-channels", type=int, help="native channels of the source, default: the profile channels")
+    parser.add_argument("--streams", type=int, default=1)
+    parser.add_argument("--mix", action="store_true", help="mix a second (voice) source into each stream")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--trace-alloc", action="store_true", help="measure Python allocations per frame (slower)")
+    args = parser.parse_args()
+
+    profile = CAPTURE_PROFILES[args.profile]
+    rate, frames_per_buffer = profile.rate, profile.frames_per_buffer
+    frames = int(args.seconds * rate / frames_per_buffer)
+
+    backend_kwargs = {
+        "rate": args.device_rate or profile.rate,
+        "channels": args.device_channels or profile.channels,
+    }
+    if args.source == "wav":
+        backend_kwargs["path"] = args.path
+    elif args.source == "pipe":
+        backend_kwargs["source"] = args.path
+
+    def create_track():
+        backend = create_backend(args.source, logger, **backend_kwargs)
+        if not args.mix:
+            return CustomAudioTrack(logger, profile, backend=backend)
+        voice = SyntheticBackend(logger, profile.rate, profile.channels, frequency=220)
+        return MixedAudioTrack(logger, profile, sources=[MixSource("voice", voice, voice=True), MixSource(args.source, backend, gain=0.7)])
+
+    tracks = [create_track() for _ in range(args.streams)]
+
+    meter = None
+    if args.trace_alloc:
+        meter = AllocationMeter()
+        before = tracemalloc.take_snapshot()
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    results = await asyncio.gather(*(drive_stream(track, frames, meter) for track in tracks))
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    if args.trace_alloc:
+        meter.sample()
+        stats = tracemalloc.take_snapshot().compare_to(before, "filename")
+        tracemalloc.stop()
+        retained_bytes = sum(stat.size_diff for stat in stats)
+
+    for track in tracks:
+        track.stop()
+
+    print(f"source={args.source}{' + voice mixed' if args.mix else ''} profile={profile.name} streams={args.streams} frames/stream={frames} wall={wall:.2f}s")
+    print(f"CPU: {100 * cpu / wall:.2f}% total, {100 * cpu / wall / args.streams:.2f}% per stream, "
+          f"{1000 * cpu / (frames * args.streams):.3f} ms per frame")
+    if args.trace_alloc:
+        total_frames = frames * args.streams
+        print(f"Allocations: {meter.allocated / total_frames / 1024:.1f} KiB per frame (at least), "
+              f"{retained_bytes / total_frames:.1f} B per frame still live after the run")
+
+    for i, result in enumerate(results):
+        jitter = jitter_ms(result["arrivals"], frames_per_buffer / rate)
+        print(
+            f"stream {i}: jitter mean={jitter['mean']:.3f}ms p99={jitter['p99']:.3f}ms max={jitter['max']:.3f}ms "
+            f"underruns={result['underruns']} overruns={result['overruns']} "
+            f"opus={8 * result['bytes'] / (frames * frames_per_buffer / rate) / 1000:.1f}kbps"
+        )
+
+if __name__ == "__main__":
+    asyncio.run(main())
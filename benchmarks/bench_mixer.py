@@ -0,0 +1,77 @@
+"""
+Receive-side mixer: CPU per output frame as peers are added.
+
+Every peer gets one decoded 20 ms frame (48 kHz stereo, like aiortc's Opus decoder) per tick,
+then one frame is mixed. Decoding itself is aiortc's and not measured here, see --decode.
+
+    python benchmarks/bench_mixer.py --peers 1 2 4 8 16 32
+    python benchmarks/bench_mixer.py --decode
+"""
+import argparse
+import logging
+import sys, os
+import time
+
+import numpy as np
+from av import AudioFrame, CodecContext
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import SharedOpusEncoder
+from includes.AudioMixer import AudioMixer, MixerInput
+from includes.audio_sinks import NullSink
+
+logger = logging.getLogger(__name__)
+
+
+def make_frames(count:int, seed=1) -> list[AudioFrame]:
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        data = (rng.normal(0, 0.1, (1, 1920)) * 32767).astype(np.int16)
+        frame = AudioFrame.from_ndarray(data, format="s16", layout="stereo")
+        frame.sample_rate = 48000
+        frame.pts = i * 960
+        frames.append(frame)
+    return frames
+
+def run(peers:int, ticks:int, frames:list[AudioFrame], decode:bool) -> float:
+    mixer = AudioMixer(logger, NullSink(logger))
+    inputs = [mixer.inputs.setdefault(i, MixerInput(i, None, 2 * mixer.max_jitter_frames, mixer.channels)) for i in range(peers)]
+
+    packets = []
+    if decode:
+        encoder = SharedOpusEncoder()
+        packets = [packet for frame in frames for packet in encoder.encode(frame)]
+    decoders = [CodecContext.create("libopus", "r") for _ in range(peers)] if decode else []
+
+    cpu = time.process_time()
+    for tick in range(ticks):
+        for i, mixer_input in enumerate(inputs):
+            if decode:
+                for frame in decoders[i].decode(packets[tick % len(packets)]):
+                    mixer.push(mixer_input, frame)
+            else:
+                mixer.push(mixer_input, frames[tick % len(frames)])
+        mixer.sink.write(mixer.mix())
+    return (time.process_time() - cpu) / ticks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--peers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seconds", type=float, default=10, help="of audio per run")
+    parser.add_argument("--decode", action="store_true", help="also decode Opus per peer, like aiortc does")
+    args = parser.parse_args()
+
+    ticks = int(args.seconds * 50)
+    frames = make_frames(50)
+    print(f"ticks={ticks} (20 ms, 48 kHz stereo) decode={args.decode}")
+    for peers in args.peers:
+        per_tick = run(peers, ticks, frames, args.decode)
+        print(f"peers={peers:>3}: {1e6 * per_tick:8.1f} us/frame, {1e6 * per_tick / peers:6.1f} us/frame per peer, "
+              f"{100 * per_tick / 0.02:.2f}% of real time")
+
+if __name__ == "__main__":
+    main()
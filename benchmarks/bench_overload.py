@@ -0,0 +1,197 @@
+"""
+Reconnect storm against the signaling server, with and without admission control.
+
+Starts the signaling server (handlers of `servers.signaling_main`) in a separate process. Two
+clients negotiate throughout: one relays an OFFER to the other every --offer-interval seconds, the
+relay latency is measured. Meanwhile --storm clients (another process) connect at once, confirm
+their id and JOIN (every JOIN is rebroadcast to all connected clients). Rejected clients wait for
+Retry-After and retry.
+
+Reports the OFFER relay latency during the storm, how long the storm took to connect and the
+server's admission statistics (`AdmissionController.get_stats`).
+
+    python benchmarks/bench_overload.py --storm 1500
+    python benchmarks/bench_overload.py --storm 1500 --no-admission
+"""
+import argparse
+import asyncio
+import json
+import signal
+import socket
+import subprocess
+import sys, os
+import tempfile
+import time
+
+import numpy as np
+import websockets
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + "/..")
+
+SERVER = """
+import asyncio, json, logging, signal, sys
+from servers.admission import AdmissionController
+from servers.signaling_main import signaling_server, logger
+port, stats_path, admission = int(sys.argv[1]), sys.argv[2], sys.argv[3] == "1"
+signaling_server.host, signaling_server.port = "127.0.0.1", port
+signaling_server.logger.setLevel(logging.ERROR)
+logger.setLevel(logging.ERROR)
+if admission:
+    signaling_server.admission = AdmissionController(logger, retry_after=1, retry_jitter=2)
+
+async def main():
+    server = asyncio.create_task(signaling_server.start())
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    await stop.wait()
+    with open(stats_path, "w") as file:
+        json.dump(signaling_server.admission.get_stats() if admission else {}, file)
+    server.cancel()
+
+asyncio.run(main())
+"""
+
+
+async def connect(url: str, name: str, join=True):
+    """
+    :returns: the websocket and the confirmed id, None when the server rejected the connection
+    """
+    try:
+        websocket = await websockets.connect(url, open_timeout=120)
+    except websockets.exceptions.InvalidStatus as e:
+        return None, int(e.response.headers.get("Retry-After", 1))
+
+    await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": name}}))
+    user_id = json.loads(await websocket.recv())["payload"]["user"]["id"]
+    if join:
+        await websocket.send(json.dumps({"type": "JOIN", "payload": {}}))
+    return websocket, user_id
+
+async def drain(websocket):
+    try:
+        async for _ in websocket:
+            pass
+    except websockets.exceptions.ConnectionClosed:
+        pass
+
+async def storm_client(url: str, index: int, stats: dict, clients: list):
+    while True:
+        websocket, result = await connect(url, f"storm{index}")
+        if websocket is not None:
+            clients.append(websocket)
+            asyncio.create_task(drain(websocket))
+            return
+        stats["rejections"] += 1
+        await asyncio.sleep(result)
+
+async def run_storm(url: str, storm: int, concurrency=500) -> dict:
+    stats, clients = {"rejections": 0}, []
+    semaphore = asyncio.Semaphore(concurrency)
+    async def limited(index):
+        async with semaphore:
+            await storm_client(url, index, stats, clients)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(index) for index in range(storm)))
+    stats["seconds"] = time.perf_counter() - started
+    await asyncio.gather(*(websocket.close() for websocket in clients), return_exceptions=True)
+    return stats
+
+async def measure(storm=1500, admission=True, offer_interval=0.05, settle=1.0) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        stats_path = os.path.join(directory, "stats.json")
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        process = subprocess.Popen([sys.executable, "-c", SERVER, str(port), stats_path, "1" if admission else "0"], cwd=ROOT)
+        url = f"ws://127.0.0.1:{port}"
+        try:
+            for _ in range(300):
+                try:
+                    (await websockets.connect(url)).transport.close()
+                    break
+                except OSError:
+                    await asyncio.sleep(0.05)
+
+            caller, _ = await connect(url, "caller", join=False)
+            callee, callee_id = await connect(url, "callee", join=False)
+            latencies = []
+
+            async def receive_offers():
+                async for message in callee:
+                    message = json.loads(message)
+                    if message["type"] == "OFFER":
+                        latencies.append(time.perf_counter() - message["payload"]["sent"])
+
+            async def send_offers():
+                while True:
+                    await caller.send(json.dumps({"type": "OFFER", "target": {"id": callee_id}, "payload": {"sdp": "v=0", "sent": time.perf_counter()}}))
+                    await asyncio.sleep(offer_interval)
+
+            receiver, sender = asyncio.create_task(receive_offers()), asyncio.create_task(send_offers())
+            await asyncio.sleep(settle)
+            baseline = list(latencies)
+            latencies.clear()
+
+            # The storm clients get their own process, their CPU doesn't delay the measured pair
+            worker = await asyncio.create_subprocess_exec(sys.executable, __file__, "--storm", str(storm), "--worker", url, stdout=subprocess.PIPE)
+            storm_stats = json.loads((await worker.communicate())[0])
+            during = list(latencies)
+
+            sender.cancel()
+            receiver.cancel()
+            await asyncio.gather(caller.close(), callee.close(), return_exceptions=True)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+        with open(stats_path) as file:
+            server_stats = json.load(file)
+
+    return {
+        "storm": storm,
+        "admission": admission,
+        "offer_latency_idle": distribution(baseline),
+        "offer_latency_storm": distribution(during),
+        "storm_seconds": round(storm_stats["seconds"], 1),
+        "client_rejections": storm_stats["rejections"],
+        "server": server_stats,
+    }
+
+def distribution(values: list[float]) -> dict:
+    if not values:
+        return {"count": 0}
+    values = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p99_ms": round(float(np.percentile(values, 99)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storm", type=int, default=1500, help="clients connecting at once")
+    parser.add_argument("--no-admission", action="store_true")
+    parser.add_argument("--offer-interval", type=float, default=0.05)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(await run_storm(args.worker, args.storm)))
+        return
+
+    result = await measure(args.storm, not args.no_admission, args.offer_interval)
+    idle, storm = result["offer_latency_idle"], result["offer_latency_storm"]
+    print(f"storm of {result['storm']} clients, admission {'on' if result['admission'] else 'off'}: all connected in {result['storm_seconds']}s, "
+          f"{result['client_rejections']} rejections")
+    print(f"OFFER relay idle:  p50={idle.get('p50_ms')}ms p99={idle.get('p99_ms')}ms")
+    print(f"OFFER relay storm: p50={storm.get('p50_ms')}ms p99={storm.get('p99_ms')}ms max={storm.get('max_ms')}ms ({storm['count']} offers)")
+    if result["server"]:
+        print(f"server: {result['server']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Cold start of the entry points, each in a fresh interpreter (imports, cert, first connection).
+
+ - `import config`: paid by every server and client process
+ - server: `main.py`'s imports + signaling server start -> the port accepts connections
+ - client imports: `import win_client_main`, and `import aiortc` alone (it loads av and numpy)
+ - client: `win_client_main`'s imports + `SignalingClient` setup -> the server confirmed its id
+
+The client's media imports stay eager: the capture track and the broadcaster are built and the
+peer connection pool is warmed before CONFIRM_ID, so deferring them would not connect sooner.
+`client_imports` vs `media_imports` shows how much of the client start they are.
+
+Times are measured from the process spawn, interpreter startup included. The client uses a
+synthetic capture source and connects to a server started by the benchmark on 127.0.0.1.
+
+    python benchmarks/bench_startup.py --runs 5
+    python -X importtime -c "import main" 2> imports.txt    # where the time goes
+"""
+import argparse
+import socket
+import statistics
+import subprocess
+import sys, os
+import time
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + "/..")
+
+SERVER = """
+import asyncio, sys
+import main
+from servers import signaling_main
+signaling_main.SIGNALING_HOST, signaling_main.SIGNALING_PORT = "127.0.0.1", int(sys.argv[1])
+signaling_main.logger.setLevel("WARNING")
+asyncio.run(signaling_main.run_signaling_server())
+"""
+
+CLIENT = """
+import asyncio, logging, os, ssl, sys
+sys.path.insert(0, os.path.abspath("win_client"))
+from win_client_main import SignalingClient
+from includes.MediaController import MediaController
+from includes.WebSocketClient import WebSocketClient
+from includes.audio_backends import SyntheticBackend
+from includes.audio_tracks import CustomAudioTrack
+from includes.media_backends import FakeMediaBackend
+
+async def main():
+    logger = logging.getLogger("client")
+    ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    wsc = WebSocketClient(sys.argv[1], ssl_context, logger)
+    client = SignalingClient(name="startup", logger=logger, media_controller=MediaController(logger, FakeMediaBackend(logger)), wsc=wsc,
+                             audio_track=CustomAudioTrack(logger, "music", backend=SyntheticBackend(logger)), encode_once=True, pc_pool_size=2)
+    task = asyncio.create_task(client.run())
+    while client.id is None:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.001)
+    print("connected", flush=True)
+    os._exit(0)
+
+asyncio.run(main())
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def time_import(module: str, cwd=ROOT) -> float:
+    started = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=cwd, check=True)
+    return time.perf_counter() - started
+
+def start_server(port: int, timeout=30.0) -> tuple[subprocess.Popen, float]:
+    """
+    :returns: the server process, seconds until its port accepted a connection
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while time.perf_counter() - started < timeout:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process, time.perf_counter() - started
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.002)
+    process.kill()
+    raise TimeoutError("server did not start listening")
+
+def time_client(port: int) -> float:
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CLIENT, f"wss://127.0.0.1:{port}"], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    elapsed = time.perf_counter() - started
+    if "connected" not in result.stdout:
+        raise RuntimeError(f"client did not connect: {result.stderr[-2000:]}")
+    return elapsed
+
+def summarize(values: list[float]) -> dict:
+    return {"median_ms": round(1000 * statistics.median(values), 1), "min_ms": round(1000 * min(values), 1)}
+
+def measure(runs=5) -> dict:
+    config_times, client_import_times, media_import_times, server_times, client_times = [], [], [], [], []
+    for _ in range(runs):
+        config_times.append(time_import("config"))
+        client_import_times.append(time_import("win_client_main", cwd=os.path.join(ROOT, "win_client")))
+        media_import_times.append(time_import("aiortc"))
+
+        port = free_port()
+        server, listening = start_server(port)
+        server_times.append(listening)
+        try:
+            client_times.append(time_client(port))
+        finally:
+            server.kill()
+            server.wait()
+
+    return {
+        "runs": runs,
+        "import_config": summarize(config_times),
+        "client_imports": summarize(client_import_times),
+        "media_imports": summarize(media_import_times),
+        "server_listening": summarize(server_times),
+        "client_connected": summarize(client_times),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    result = measure(args.runs)
+    for name in ("import_config", "client_imports", "media_imports", "server_listening", "client_connected"):
+        print(f"{name:18} median={result[name]['median_ms']}ms min={result[name]['min_ms']}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Voice activity detection + DTX: CPU and bytes saved on a speech clip.
+
+The clip is encoded three times with the capture profile's Opus settings:
+every frame, every frame with libopus DTX, and VAD-gated (silent frames skipped
+before the encoder, one keepalive frame every 400 ms) with libopus DTX.
+
+Without --path a clip with talk spurts over quiet background noise is generated
+(about 40% speech, like one side of a conversation).
+
+    python benchmarks/bench_vad_dtx.py --seconds 60
+    python benchmarks/bench_vad_dtx.py --path recording.wav --profile voice_hd
+"""
+import argparse
+import dataclasses
+import fractions
+import sys, os
+import time
+import wave
+
+import numpy as np
+from av import AudioFrame
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import SharedOpusEncoder
+from servers.includes.opus import libopus_supports_dtx
+from includes.capture_profiles import CAPTURE_PROFILES, CaptureProfile
+from includes.classes.AudioConverter import AudioConverter
+from includes.classes.VoiceActivityDetector import DtxGate, VoiceActivityDetector
+
+
+def generate_clip(profile: CaptureProfile, seconds: float, seed=1) -> np.ndarray:
+    """
+    Voiced talk spurts (harmonics of a wandering pitch, syllable envelope) between pauses,
+    over background noise at about -60 dBFS
+    """
+    rng = np.random.default_rng(seed)
+    rate, frames = profile.rate, int(seconds * profile.rate)
+    t = np.arange(frames) / rate
+
+    talking = np.zeros(frames, dtype=bool)
+    position, speaking = 0, False
+    while position < frames:
+        duration = int(rng.exponential(1.2 if speaking else 1.8) * rate)
+        talking[position:position + duration] = speaking
+        position += duration
+        speaking = not speaking
+
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / rate
+    voice = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 8))
+    syllables = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    speech = 0.25 * voice * syllables * talking
+
+    noise = rng.normal(0, 0.001, frames)
+    samples = ((speech + noise) * 32767).clip(-32768, 32767).astype(np.int16)
+    return np.repeat(samples[:, None], profile.channels, axis=1)
+
+def load_clip(path: str, profile: CaptureProfile) -> np.ndarray:
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit PCM WAV files are supported: {path}")
+        data = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16).reshape(-1, wav.getnchannels())
+        converter = AudioConverter(wav.getframerate(), wav.getnchannels(), profile.rate, profile.channels, max_frames=len(data))
+        return converter.convert(data).copy()
+
+def encode(clip: np.ndarray, profile: CaptureProfile, dtx: bool, vad: bool) -> dict:
+    encoder_profile = dataclasses.replace(profile.encoder_profiles[0], dtx=dtx)
+    encoder = SharedOpusEncoder(encoder_profile)
+    detector = VoiceActivityDetector(threshold_db=profile.vad_threshold_db, hangover_frames=300 // profile.frame_duration,
+                                     noise_tracking=profile.vad_noise_tracking)
+    gate = DtxGate()
+    layout = "mono" if profile.channels == 1 else "stereo"
+    time_base = fractions.Fraction(1, profile.rate)
+    size = profile.frames_per_buffer
+
+    encoded_bytes = packets = 0
+    cpu = time.process_time()
+    for start in range(0, len(clip) - size + 1, size):
+        samples = clip[start:start + size]
+        if vad and not gate.should_send(not detector.process(samples)):
+            continue
+
+        frame = AudioFrame.from_ndarray(samples.reshape(1, -1), format="s16", layout=layout)
+        frame.sample_rate = profile.rate
+        frame.pts = start
+        frame.time_base = time_base
+        for packet in encoder.encode(frame):
+            encoded_bytes += packet.size
+            packets += 1
+    cpu = time.process_time() - cpu
+
+    return {"cpu": cpu, "bytes": encoded_bytes, "packets": packets, "skipped": gate.frames_skipped, "frames": len(clip) // size}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", help="16-bit WAV clip, default: generated")
+    parser.add_argument("--profile", default="voice", choices=list(CAPTURE_PROFILES))
+    parser.add_argument("--seconds", type=float, default=60)
+    args = parser.parse_args()
+
+    profile = CAPTURE_PROFILES[args.profile]
+    clip = load_clip(args.path, profile) if args.path else generate_clip(profile, args.seconds)
+    seconds = len(clip) / profile.rate
+    print(f"clip={args.path or 'generated'} profile={profile.name} ({profile.rate} Hz x{profile.channels}) length={seconds:.1f}s "
+          f"libopus DTX {'supported' if libopus_supports_dtx() else 'NOT supported by this FFmpeg'}")
+
+    baseline = None
+    for label, dtx, vad in (("every frame", False, False), ("libopus DTX", True, False), ("VAD + DTX", True, True)):
+        result = encode(clip, profile, dtx, vad)
+        baseline = baseline or result
+        print(
+            f"{label:>12}: cpu={1000 * result['cpu']:.0f}ms ({100 * result['cpu'] / seconds:.2f}% of real time) "
+            f"bytes={result['bytes']} ({8 * result['bytes'] / seconds / 1000:.1f}kbps) packets={result['packets']} "
+            f"skipped={result['skipped']}/{result['frames']} | "
+            f"saved cpu={100 * (1 - result['cpu'] / baseline['cpu']):.0f}% bytes={100 * (1 - result['bytes'] / baseline['bytes']):.0f}%"
+        )
+
+if __name__ == "__main__":
+    main()
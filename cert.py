@@ -1,13 +1,15 @@
 import os
 import ssl
-from cryptography import x509
-from cryptography.x509.oid import NameOID
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.primitives import serialization
 import datetime
 
 def gen_cert(out_server_key="server.key", out_server_cert="server.crt"):
+    # cryptography is slow to import and only needed the first time
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives import serialization
+
     key = rsa.generate_private_key(
         public_exponent=65537,
         key_size=2048,
@@ -51,7 +53,7 @@ def gen_cert(out_server_key="server.key", out_server_cert="server.crt"):
 def load_or_create(keyfile="server.key", certfile="server.crt") -> ssl.SSLContext:
     if not os.path.exists(certfile) or not os.path.exists(keyfile):
         print(f"Certificate or key file not found. Generating new ones...")
-        gen_cert(certfile=certfile, keyfile=keyfile)
+        gen_cert(out_server_key=keyfile, out_server_cert=certfile)
 
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     context.load_cert_chain(certfile=certfile, keyfile=keyfile)
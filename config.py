@@ -1,11 +1,37 @@
-from cert import load_or_create
+import functools
+
 SIGNALING_HOST = "192.168.0.176" 
 SIGNALING_PORT = 8765
 
 WEB_SERVER_PORT = 8080
 
-SIGNALING_SERVER = f"wss://{SIGNALING_HOST}:{SIGNALING_PORT}"
+# Single-port mode: one TLS listener on WEB_SERVER_PORT serves the web files
+# and upgrades SIGNALING_PATH to the signaling websocket
+UNIFIED_SERVER = False
+SIGNALING_PATH = "/ws"
+
+# SFU mode: every client uploads its audio once to the server, which forwards it
+# to the others (see servers/sfu.py). Needs aiortc on the server. Only the win clients
+# publish to it, browsers still send their audio peer to peer
+SFU_ENABLED = False
+
+if UNIFIED_SERVER:
+    SIGNALING_SERVER = f"wss://{SIGNALING_HOST}:{WEB_SERVER_PORT}{SIGNALING_PATH}"
+else:
+    SIGNALING_SERVER = f"wss://{SIGNALING_HOST}:{SIGNALING_PORT}"
 WEB_SERVER = f"https://{SIGNALING_HOST}:{WEB_SERVER_PORT}"
 
 
-SSL_CONTEXT = load_or_create(certfile="server.crt", keyfile="server.key")
\ No newline at end of file
+@functools.cache
+def get_ssl_context():
+    """
+    Server TLS context, loaded (the cert generated if missing) on first use: importing the config stays cheap
+    """
+    from cert import load_or_create
+    return load_or_create(certfile="server.crt", keyfile="server.key")
+
+def __getattr__(name):
+    # `from config import SSL_CONTEXT` still works, it just loads the context then
+    if name == "SSL_CONTEXT":
+        return get_ssl_context()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
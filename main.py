@@ -1,7 +1,8 @@
 import asyncio
 import logging
 from threading import Thread
-from servers.signaling_main import run_signaling_server
+from config import UNIFIED_SERVER
+from servers.signaling_main import run_signaling_server, run_unified_server
 from servers.web import run_web_server
 from cert import gen_cert
 
@@ -13,6 +14,11 @@ async def main():
     #logger.info("Generating cert....")
     #gen_cert() # Auto-generating cert
 
+    if UNIFIED_SERVER:
+        logger.info("Starting WEB + SIGNAL on a single port....")
+        await run_unified_server()
+        return
+
     logger.info("Starting WEB....")
     web_thread = Thread(target=run_web_server, daemon=True)
     web_thread.start()
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable
+
+from servers.includes.enums import MessageType
+
+
+LOW_PRIORITY_MESSAGES = {MessageType.JOIN, MessageType.CLIENTS}
+""" Deferred under load: a JOIN is rebroadcast to every client. OFFER/ANSWER/CANDIDATE are never held back """
+
+
+class AdmissionController:
+    """
+    Overload protection of the signaling server (see `SignalingServer.admission`).
+
+    The server is overloaded when the event loop lags behind (measured by a sleeping task), or when
+    too many sends wait for slow clients (`SignalingServer.pending_sends`). While it is:
+     - new websocket connections are rejected with 503 and a jittered Retry-After, before the handshake
+     - low-priority messages (`LOW_PRIORITY_MESSAGES`) are held back (`defer`), negotiation still goes through.
+       They are replayed in order once the load dropped, at most `replay_batch` per lag sample. Beyond
+       `max_deferred` waiting messages the oldest one is dropped
+    Connections beyond `max_connections` are rejected at any load.
+
+    Every decision is counted, see `get_stats`.
+    """
+    def __init__(self, logger: logging.Logger, max_connections=5000, max_loop_lag=0.05, max_pending_sends=512,
+                 retry_after=5, retry_jitter=10, lag_interval=0.025, lag_decay=0.9, max_deferred=1000, replay_batch=50):
+        """
+        :param max_loop_lag: seconds the loop may run late before the server counts as overloaded
+        :param max_pending_sends: sends waiting for the clients' write buffers to drain
+        :param retry_after: minimum Retry-After in seconds, `retry_jitter` more at random spreads the reconnects
+        :param lag_interval: lag sampling period in seconds
+        :param lag_decay: a lag spike decays by this factor per sample, so the state doesn't flap
+        :param max_deferred: messages held back while overloaded
+        :param replay_batch: deferred messages replayed per lag sample, so the replay doesn't overload the server again
+        """
+        self.logger = logger
+        self.max_connections = max_connections
+        self.max_loop_lag = max_loop_lag
+        self.max_pending_sends = max_pending_sends
+        self.retry_after_seconds = retry_after
+        self.retry_jitter = retry_jitter
+        self.lag_interval = lag_interval
+        self.lag_decay = lag_decay
+        self.max_deferred = max_deferred
+        self.replay_batch = replay_batch
+
+        self.loop_lag = 0.0
+        self.overloaded: str = None
+        """ Reason of the current overload, None if there is none """
+        self.rejected_connections: Counter[str] = Counter()
+        """ Per reason """
+        self.shed_messages: Counter[str] = Counter()
+        """ Per message type """
+        self.deferred: deque = deque()
+        self.dropped_messages = 0
+        """ Deferred messages dropped because `max_deferred` were waiting """
+        self.replay: Callable[[Any], Awaitable] = None
+        self.get_pending_sends: Callable[[], int] = lambda: 0
+        self._task: asyncio.Task = None
+
+    def start(self, replay: Callable[[Any], Awaitable] = None, get_pending_sends: Callable[[], int] = None):
+        """
+        :param replay: processes a deferred message once the load dropped. Without it deferred messages stay queued
+        :param get_pending_sends: returns the current `SignalingServer.pending_sends`
+        """
+        if replay is not None:
+            self.replay = replay
+        if get_pending_sends is not None:
+            self.get_pending_sends = get_pending_sends
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._monitor_loop_lag())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _monitor_loop_lag(self):
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            lag = time.monotonic() - started - self.lag_interval
+            self.loop_lag = max(lag, self.loop_lag * self.lag_decay)
+
+            if self.deferred and self.replay is not None:
+                try:
+                    await self._replay_deferred()
+                except Exception as e:
+                    self.logger.error(f"Replaying a deferred message failed: {e}")
+
+    async def _replay_deferred(self):
+        # A replayed message is checked again: deferred anew (at the end) if the load rose meanwhile
+        for _ in range(min(self.replay_batch, len(self.deferred))):
+            if self.check_load(self.get_pending_sends()) is not None:
+                return
+            await self.replay(self.deferred.popleft())
+
+    """
+    Decisions
+    """
+
+    def check_load(self, pending_sends: int) -> str:
+        """
+        :returns: why the server is overloaded, None if it isn't
+        """
+        if self.loop_lag > self.max_loop_lag:
+            reason = "loop_lag"
+        elif pending_sends > self.max_pending_sends:
+            reason = "send_queue"
+        else:
+            reason = None
+
+        if reason != self.overloaded:
+            if reason is not None:
+                self.logger.warning(f"Overloaded ({reason}: loop lag {self.loop_lag * 1000:.0f} ms, {pending_sends} pending sends), shedding load")
+            else:
+                self.logger.warning(f"Load back to normal. {self.get_stats()}")
+            self.overloaded = reason
+        return reason
+
+    def admit_connection(self, connections: int, pending_sends: int) -> bool:
+        reason = "connections" if connections >= self.max_connections else self.check_load(pending_sends)
+        if reason is None:
+            return True
+        self.rejected_connections[reason] += 1
+        return False
+
+    def admit_message(self, message_type: MessageType, pending_sends: int) -> bool:
+        if message_type not in LOW_PRIORITY_MESSAGES or self.check_load(pending_sends) is None:
+            return True
+        self.shed_messages[message_type.value] += 1
+        return False
+
+    def defer(self, message: Any):
+        """
+        Hold back a message `admit_message` refused, until `replay` gets it
+        """
+        if len(self.deferred) >= self.max_deferred:
+            self.deferred.popleft()
+            self.dropped_messages += 1
+        self.deferred.append(message)
+
+    def retry_after(self) -> int:
+        return self.retry_after_seconds + random.randint(0, self.retry_jitter)
+
+    def get_stats(self) -> dict:
+        return {
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "overloaded": self.overloaded,
+            "rejected_connections": dict(self.rejected_connections),
+            "shed_messages": dict(self.shed_messages),
+            "deferred_messages": len(self.deferred),
+            "dropped_messages": self.dropped_messages,
+        }
@@ -33,8 +33,12 @@ class ConfirmIdMessage(BaseMessage):
      - Server receives the User.name
      - Client receives the User.id
     """
-    def __init__(self, user:User):
-        super().__init__(type=MessageType.CONFIRM_ID, payload={"user": user.to_dict()})  # Can be different
+    def __init__(self, user:User, sfu_id:str=None):
+        payload = {"user": user.to_dict()}  # Can be different
+        if sfu_id is not None:
+            # The server runs an SFU: publish by sending the OFFER to this user
+            payload["sfu"] = sfu_id
+        super().__init__(type=MessageType.CONFIRM_ID, payload=payload)
 
 @dataclass
 class JoinMessage(BaseMessage):
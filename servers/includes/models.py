@@ -1,6 +1,9 @@
 from dataclasses import dataclass
 
 class User:
+    # Thousands of these live as long as their connections
+    __slots__ = ("websocket", "id", "name")
+
     def __init__(self, websocket, client_id, name=None):
         self.websocket = websocket
         self.id = client_id
@@ -0,0 +1,123 @@
+import fractions
+import logging
+from dataclasses import dataclass
+from functools import cache
+
+from av import AudioResampler, CodecContext
+
+
+OPUS_SAMPLE_RATE = 48000
+OPUS_TIME_BASE = fractions.Fraction(1, OPUS_SAMPLE_RATE)
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def libopus_supports_dtx() -> bool:
+    """
+    True if FFmpeg's libopus wrapper takes the `dtx` option. Options a codec doesn't know are left
+    in `options` after opening it. Checked (and warned about) once per process
+    """
+    codec = CodecContext.create("libopus", "w")
+    codec.sample_rate = OPUS_SAMPLE_RATE
+    codec.layout = "mono"
+    codec.format = "s16"
+    codec.options = {"dtx": "1"}
+    codec.open()
+    if "dtx" in codec.options:
+        logger.warning("This FFmpeg's libopus encoder ignores the dtx option: silent packets are not shrunk by the encoder")
+        return False
+    return True
+
+
+@dataclass(frozen=True)
+class EncoderProfile:
+    """
+    Opus settings for one network quality tier
+    """
+    name: str
+    bitrate: int
+    frame_duration: int
+    """ Packet time in ms """
+    fec: bool = False
+    packet_loss: int = 0
+    """ Expected loss in %, tells the encoder how much redundancy to spend on FEC """
+    channels: int = 2
+    dtx: bool = False
+    """ Ask libopus for DTX (tiny packets of silence). Only if this FFmpeg supports it, see `libopus_supports_dtx` """
+
+    @property
+    def samples_per_frame(self) -> int:
+        return OPUS_SAMPLE_RATE * self.frame_duration // 1000
+
+
+ENCODER_PROFILES = (
+    EncoderProfile("high", bitrate=96000, frame_duration=20),
+    EncoderProfile("medium", bitrate=48000, frame_duration=20, fec=True, packet_loss=10),
+    EncoderProfile("low", bitrate=24000, frame_duration=40, fec=True, packet_loss=25),
+)
+""" Best to worst. The first one matches aiortc's own `OpusEncoder` """
+
+VOICE_ENCODER_PROFILES = (
+    EncoderProfile("voice", bitrate=32000, frame_duration=20, fec=True, packet_loss=5, channels=1, dtx=True),
+    EncoderProfile("voice_medium", bitrate=20000, frame_duration=20, fec=True, packet_loss=10, channels=1, dtx=True),
+    EncoderProfile("voice_low", bitrate=12000, frame_duration=40, fec=True, packet_loss=25, channels=1, dtx=True),
+)
+""" Mono speech, best to worst. Silence is mostly saved before the encoder, by the VAD gate of `AudioBroadcaster` """
+
+
+class SharedOpusEncoder:
+    """
+    One Opus encoder for every sender in a codec group.
+    Same settings as aiortc's per-sender `OpusEncoder` (with the default profile), but returns
+    packets which `RTCRtpSender` only has to pack.
+
+    Packet timestamps follow the source frames, so a sender can move between encoders
+    without a jump in its RTP timeline. Skipped frames (DTX) leave a gap in that timeline.
+
+    `dtx` tells whether libopus DTX is on: the profile asks for it and this FFmpeg supports it.
+    """
+    def __init__(self, profile: EncoderProfile = ENCODER_PROFILES[0]):
+        self.profile = profile
+        self.codec = CodecContext.create("libopus", "w")
+        self.codec.bit_rate = profile.bitrate
+        self.codec.format = "s16"
+        self.codec.layout = "mono" if profile.channels == 1 else "stereo"
+        self.codec.options = {
+            "application": "voip",
+            "frame_duration": str(profile.frame_duration),
+            "fec": "1" if profile.fec else "0",
+            "packet_loss": str(profile.packet_loss),
+        }
+        self.dtx = profile.dtx and libopus_supports_dtx()
+        if self.dtx:
+            self.codec.options = {**self.codec.options, "dtx": "1"}
+        self.codec.sample_rate = OPUS_SAMPLE_RATE
+        self.codec.time_base = OPUS_TIME_BASE
+
+        self.resampler = self._create_resampler()
+        self._next_pts = None
+
+    def _create_resampler(self) -> AudioResampler:
+        return AudioResampler(
+            format="s16",
+            layout=self.codec.layout,
+            rate=OPUS_SAMPLE_RATE,
+            frame_size=self.profile.samples_per_frame,
+        )
+
+    def encode(self, frame) -> list:
+        if self._next_pts is not None and frame.pts != self._next_pts:
+            # Frames were skipped: samples still buffered belong to the old timeline
+            self.resampler = self._create_resampler()
+        self._next_pts = frame.pts + frame.samples
+
+        packets = []
+        for resampled in self.resampler.resample(frame):
+            for packet in self.codec.encode(resampled):
+                # One packet per frame. The encoder numbers its packets as if the input was
+                # contiguous, the frame's own pts stays right across skipped frames
+                packet.pts = resampled.pts
+                packet.time_base = OPUS_TIME_BASE
+                packets.append(packet)
+        return packets
@@ -0,0 +1,38 @@
+import time
+import uuid
+
+from servers.includes.enums import MessageType
+
+
+TRACED_MESSAGES = {MessageType.JOIN, MessageType.OFFER, MessageType.ANSWER}
+""" The negotiation: JOIN -> OFFER -> ANSWER (-> connected, stamped by the clients) """
+MAX_HOPS = 32
+""" Longer traces (e.g. sent by a misbehaving client) are ignored """
+
+
+def new_trace() -> dict:
+    """
+    Optional `trace` field of the message envelope: {"id": str, "hops": [[name, unix time], ...]}
+    """
+    return {"id": uuid.uuid4().hex[:16], "hops": []}
+
+def add_hop(trace: dict, name: str) -> dict:
+    """
+    :returns: a copy of `trace` with the hop `name` stamped now, the original is shared by other messages
+    """
+    return {"id": trace["id"], "hops": trace["hops"] + [[name, time.time()]]}
+
+def is_valid_trace(trace) -> bool:
+    return (
+        isinstance(trace, dict) and isinstance(trace.get("id"), str)
+        and isinstance(trace.get("hops"), list) and len(trace["hops"]) < MAX_HOPS
+    )
+
+def trace_segments(hops: list) -> list[dict]:
+    """
+    Time between consecutive hops. Hops of different machines are only comparable with synced clocks
+    """
+    return [
+        {"name": f"{previous[0]} -> {hop[0]}", "ms": round((hop[1] - previous[1]) * 1000, 2)}
+        for previous, hop in zip(hops, hops[1:])
+    ]
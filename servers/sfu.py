@@ -0,0 +1,312 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from aiortc import RTCPeerConnection, RTCRtpSender, RTCSessionDescription, MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+from aiortc.sdp import candidate_from_sdp
+
+from servers.includes.enums import MessageType
+from servers.includes.messages import BaseMessage, RTCMessage
+from servers.includes.models import User
+from servers.includes.opus import SharedOpusEncoder
+
+
+SFU_USER_ID = "sfu"
+""" Clients publish by sending their OFFER to this user """
+SUBSCRIPTION_PREFIX = "sfu:"
+""" `sfu:<publisher id>` offers the audio of one publisher """
+
+
+async def close_subscription(pc: RTCPeerConnection):
+    """
+    Closing a connection doesn't stop its tracks: without this the fan-out would keep feeding them
+    """
+    for transceiver in pc.getTransceivers():
+        if transceiver.sender.track is not None:
+            transceiver.sender.track.stop()
+    await pc.close()
+
+
+class SfuUser(User):
+    """
+    Virtual user the clients negotiate with. It has no websocket: messages to it are handled by the SFU
+    """
+    __slots__ = ()
+
+    def __init__(self, client_id: str, name: str):
+        super().__init__(None, client_id, name)
+
+
+class SubscriptionTrack(MediaStreamTrack):
+    """
+    Encoded packets of one `EncodedFanout` for one subscription. When the subscriber is too slow
+    the oldest packet is dropped
+    """
+    kind = "audio"
+
+    def __init__(self, fanout: "EncodedFanout", max_queue: int):
+        super().__init__()
+        self.fanout = fanout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+
+    def put(self, packet):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(packet)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+        packet = await self.queue.get()
+        if packet is None:
+            # The publication ended
+            self.stop()
+            raise MediaStreamError
+        return packet
+
+    def stop(self):
+        super().stop()
+        self.fanout.tracks.discard(self)
+
+
+class EncodedFanout:
+    """
+    One published track, decoded by its connection and encoded to Opus once for all subscriptions:
+    their senders only packetize the shared packets. The subscriptions only offer Opus (see `subscribe`).
+    """
+    def __init__(self, source: MediaStreamTrack, max_queue=5):
+        self.source = source
+        self.max_queue = max_queue
+        self.encoder = SharedOpusEncoder()
+        self.tracks: set[SubscriptionTrack] = set()
+        self.frames_encoded = 0
+        self._task: asyncio.Task = None
+
+    def subscribe(self) -> SubscriptionTrack:
+        track = SubscriptionTrack(self, self.max_queue)
+        self.tracks.add(track)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._pump())
+        return track
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+        while self.tracks:
+            try:
+                frame = await self.source.recv()
+            except MediaStreamError:
+                for track in list(self.tracks):
+                    track.put(None)
+                return
+            packets = await loop.run_in_executor(None, self.encoder.encode, frame)
+            self.frames_encoded += 1
+            for packet in packets:
+                for track in list(self.tracks):
+                    track.put(packet)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        for track in list(self.tracks):
+            track.stop()
+
+
+class Publication:
+    """
+    Upstream connection of one publisher and the downstream connections of its subscribers
+    """
+    def __init__(self, publisher: User, peer_connection: RTCPeerConnection):
+        self.publisher = publisher
+        self.peer_connection = peer_connection
+        self.tracks: list[MediaStreamTrack] = []
+        self.fanouts: list[EncodedFanout] = []
+        """ One per track, shared by the subscriptions """
+        self.virtual_user = SfuUser(SUBSCRIPTION_PREFIX + publisher.id, f"{publisher.name} (SFU)")
+        self.subscriptions: dict[str, RTCPeerConnection] = {}
+        """ Per subscriber id """
+
+
+class SelectiveForwardingUnit:
+    """
+    Optional SFU: every publisher uploads its audio once, the server forwards it to the other clients.
+
+    Negotiation goes through the normal OFFER/ANSWER/CANDIDATE messages with virtual users:
+     - A client publishes by sending an OFFER to `sfu` (`SFU_USER_ID`), answered by `sfu`
+     - For every publication each other client which joined gets an OFFER from
+       `sfu:<publisher id>`, and answers it like any peer. An OFFER to `sfu:<publisher id>`
+       (a client replacing its connection) is answered with a fresh subscription OFFER
+
+    aiortc has no RTP-level forwarding: each publication is decoded once and fanned out by an
+    `EncodedFanout`. The subscriptions share one Opus encoder per track, so a publication costs one
+    decode and one encode whatever the size of the room. The publisher's upload no longer grows with the room either.
+
+    Only the win clients publish: browsers ignore the `sfu` field of CONFIRM_ID and keep sending
+    their own audio peer to peer, they just receive the publications like any peer's OFFER.
+    """
+    def __init__(self, send: Callable[[User, BaseMessage], Awaitable], logger: logging.Logger):
+        """
+        :param send: delivers a message to a connected client (`SignalingServer.send_new_message`)
+        """
+        self.send = send
+        self.logger = logger
+
+        self.members: dict[str, User] = {}
+        """ Clients which joined, subscribers of new publications """
+
+        self.publications: dict[str, Publication] = {}
+        """ Per publisher id """
+        self.user = SfuUser(SFU_USER_ID, "SFU")
+
+    def get_user(self, user_id: str) -> SfuUser:
+        """
+        :returns: the virtual user with this id, None if there is none
+        """
+        if user_id == SFU_USER_ID:
+            return self.user
+        if isinstance(user_id, str) and user_id.startswith(SUBSCRIPTION_PREFIX):
+            publication = self.publications.get(user_id[len(SUBSCRIPTION_PREFIX):])
+            return publication.virtual_user if publication is not None else None
+        return None
+
+    def owns(self, user: User) -> bool:
+        return isinstance(user, SfuUser)
+
+    async def handle_rtc(self, user: User, target: SfuUser, message_type: MessageType, payload: dict):
+        match message_type:
+            case MessageType.OFFER if target is self.user:
+                await self.publish(user, payload["sdp"])
+            case MessageType.OFFER:
+                publication = self.publications.get(target.id[len(SUBSCRIPTION_PREFIX):])
+                if publication is None:
+                    # Unpublished since the target was resolved
+                    self.logger.warning(f"SFU: OFFER from {user.id} to the closed publication {target.id}")
+                    return
+                await self.subscribe(publication, user, replace=True)
+            case MessageType.ANSWER:
+                pc = self._find_connection(user, target)
+                if pc is not None:
+                    await pc.setRemoteDescription(RTCSessionDescription(sdp=payload["sdp"], type="answer"))
+            case MessageType.CANDIDATE:
+                await self._add_candidate(self._find_connection(user, target), payload.get("candidate") or {})
+            case _:
+                self.logger.warning(f"SFU: unexpected {message_type} from {user.id} to {target.id}")
+
+    def _find_connection(self, user: User, target: SfuUser) -> RTCPeerConnection:
+        if target is self.user:
+            publication = self.publications.get(user.id)
+            return publication.peer_connection if publication is not None else None
+
+        publication = self.publications.get(target.id[len(SUBSCRIPTION_PREFIX):])
+        return publication.subscriptions.get(user.id) if publication is not None else None
+
+    async def _add_candidate(self, pc: RTCPeerConnection, candidate: dict):
+        sdp = candidate.get("candidate", "")
+        if pc is None or not sdp:
+            # Unknown connection or end-of-candidates
+            return
+        rtc_candidate = candidate_from_sdp(sdp.split(":", 1)[1] if sdp.startswith("candidate:") else sdp)
+        rtc_candidate.sdpMid = candidate.get("sdpMid")
+        rtc_candidate.sdpMLineIndex = candidate.get("sdpMLineIndex")
+        await pc.addIceCandidate(rtc_candidate)
+
+    """
+    Publishing
+    """
+
+    async def publish(self, publisher: User, sdp: str):
+        # A new OFFER replaces the previous publication (e.g. a replaced connection)
+        await self.unpublish(publisher.id)
+
+        pc = RTCPeerConnection()
+        publication = self.publications[publisher.id] = Publication(publisher, pc)
+
+        @pc.on("track")
+        def on_track(track: MediaStreamTrack):
+            if track.kind == "audio":
+                publication.tracks.append(track)
+                publication.fanouts.append(EncodedFanout(track))
+
+        @pc.on("connectionstatechange")
+        async def on_connection_state_change():
+            if pc.connectionState == "failed" and self.publications.get(publisher.id) is publication:
+                await self.unpublish(publisher.id)
+
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=sdp, type="offer"))
+        await pc.setLocalDescription(await pc.createAnswer())
+        await self.send(publisher, RTCMessage(MessageType.ANSWER, self.user, {"sdp": pc.localDescription.sdp}))
+        self.logger.info(f"SFU: {publisher.name} ({publisher.id}) publishes {len(publication.tracks)} audio track(s)")
+
+        if publication.tracks:
+            await asyncio.gather(*(
+                self.subscribe(publication, member) for member in list(self.members.values()) if member.id != publisher.id
+            ), return_exceptions=True)
+
+    async def unpublish(self, publisher_id: str):
+        publication = self.publications.pop(publisher_id, None)
+        if publication is None:
+            return
+
+        for pc in publication.subscriptions.values():
+            await close_subscription(pc)
+        for fanout in publication.fanouts:
+            fanout.stop()
+        await publication.peer_connection.close()
+        self.logger.info(f"SFU: publication of {publisher_id} closed")
+
+    """
+    Subscribing
+    """
+
+    async def subscribe(self, publication: Publication, subscriber: User, replace=False):
+        """
+        :param replace: close an existing subscription and offer a new one. Otherwise an existing subscription
+            is kept: `publish` and `add_client` of a member joining during the publication both subscribe it
+        """
+        if subscriber.id in publication.subscriptions and not replace:
+            return
+        previous = publication.subscriptions.pop(subscriber.id, None)
+        if previous is not None:
+            await close_subscription(previous)
+
+        pc = publication.subscriptions[subscriber.id] = RTCPeerConnection()
+        opus = [codec for codec in RTCRtpSender.getCapabilities("audio").codecs if codec.mimeType.lower() == "audio/opus"]
+        for fanout in publication.fanouts:
+            # The shared packets are Opus: no other codec may be negotiated
+            pc.addTransceiver(fanout.subscribe(), direction="sendonly").setCodecPreferences(opus)
+
+        await pc.setLocalDescription(await pc.createOffer())
+        await self.send(subscriber, RTCMessage(MessageType.OFFER, publication.virtual_user, {"sdp": pc.localDescription.sdp}))
+
+    async def add_client(self, user: User):
+        """
+        A client joined: it gets every current publication
+        """
+        self.members[user.id] = user
+        await asyncio.gather(*(
+            self.subscribe(publication, user) for publication in list(self.publications.values())
+            if publication.publisher.id != user.id and publication.tracks
+        ), return_exceptions=True)
+
+    async def remove_client(self, user: User):
+        """
+        A client disconnected: its publication and subscriptions are closed
+        """
+        self.members.pop(user.id, None)
+        await self.unpublish(user.id)
+        for publication in list(self.publications.values()):
+            pc = publication.subscriptions.pop(user.id, None)
+            if pc is not None:
+                await close_subscription(pc)
+
+    async def close(self):
+        for publisher_id in list(self.publications):
+            await self.unpublish(publisher_id)
+
+    def get_stats(self) -> dict:
+        return {
+            "publications": len(self.publications),
+            "subscriptions": sum(len(publication.subscriptions) for publication in self.publications.values()),
+            "encoders": sum(len(publication.fanouts) for publication in self.publications.values()),
+            "frames_encoded": sum(fanout.frames_encoded for publication in self.publications.values() for fanout in publication.fanouts),
+        }
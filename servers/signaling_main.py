@@ -1,15 +1,20 @@
 import logging
-from config import SIGNALING_HOST, SIGNALING_PORT, SIGNALING_SERVER, SSL_CONTEXT
+from config import SIGNALING_HOST, SIGNALING_PORT, SIGNALING_SERVER, WEB_SERVER_PORT, SFU_ENABLED, get_ssl_context
 from servers.includes.models import User
 from servers.includes.enums import MessageType
 from servers.includes.messages import BaseMessage, JoinMessage, ConfirmIdMessage, RTCMessage
+from servers.admission import AdmissionController
 from servers.signaling_server import signaling_server, MessageHandlerSettings
+from servers.web import UnifiedWebHandler
 
 from servers.logging_config import get_logger
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
 
+sfu = None
+""" `SelectiveForwardingUnit` when SFU mode is on, see `enable_sfu` """
+
 """
 Handlers Section
 """
@@ -23,7 +28,7 @@ async def handle_confirm_id(user:User, payload:dict):
     user.name = payload.get("name")  # User name update
     signaling_server.logger.debug(f"Handshaking with user name `{user.name}`. Sending user ID `{user.id}` back.")
 
-    message = ConfirmIdMessage(user)
+    message = ConfirmIdMessage(user, sfu_id=sfu.user.id if sfu is not None else None)
     await signaling_server.send_new_message(send_to=user, message=message)
 
 @signaling_server.register_handler(MessageType.JOIN)
@@ -34,18 +39,46 @@ async def handle_join(user:User, payload:dict):
     message = JoinMessage(user)
     await signaling_server.broadcast_message(user, message, include_sender=False)
 
+    if sfu is not None:
+        await sfu.add_client(user)
+
 @signaling_server.register_handler(MessageType.OFFER)
 @signaling_server.register_handler(MessageType.ANSWER)
 @signaling_server.register_handler(MessageType.CANDIDATE)
 async def handle_rtc(user:User, target:User, payload:dict, message_type:MessageType):
     """
     Server doesn't modify anything in case of RTC requests, just broadcasts it to other clients.
+    Messages to the SFU's virtual users are negotiated by the SFU itself.
     """
+    if sfu is not None and sfu.owns(target):
+        await sfu.handle_rtc(user, target, message_type, payload)
+        return
+
     message = RTCMessage(message_type, user, payload)
     
     await signaling_server.send_new_message(target, message)
 
 
+def enable_sfu():
+    """
+    Turns SFU mode on. aiortc is only imported here: the mesh-only server doesn't need it
+    """
+    global sfu
+    from servers.sfu import SelectiveForwardingUnit
+
+    sfu = SelectiveForwardingUnit(signaling_server.send_new_message, logger)
+    signaling_server.resolve_virtual_user = sfu.get_user
+    signaling_server.on_disconnect = sfu.remove_client
+    return sfu
+
+async def disable_sfu():
+    global sfu
+    if sfu is not None:
+        await sfu.close()
+    sfu = None
+    signaling_server.resolve_virtual_user = None
+    signaling_server.on_disconnect = None
+
 async def run_signaling_server():
     """
     Main entry point. Sets up and starts the server
@@ -55,8 +88,30 @@ async def run_signaling_server():
     # Setting up the server
     signaling_server.host = SIGNALING_HOST
     signaling_server.port = SIGNALING_PORT
-    signaling_server.ssl_context = SSL_CONTEXT
+    signaling_server.ssl_context = get_ssl_context()
+
+    signaling_server.logger = logger
+    signaling_server.admission = AdmissionController(logger)
+    if SFU_ENABLED:
+        enable_sfu()
+
+    await signaling_server.start()
+
+async def run_unified_server():
+    """
+    Single-port entry point. One TLS listener on WEB_SERVER_PORT serves the web files
+    and upgrades SIGNALING_PATH to the signaling websocket.
+    """
+    logger.info(f"Starting unified web + signaling server on {SIGNALING_SERVER}\n")
+
+    signaling_server.host = SIGNALING_HOST
+    signaling_server.port = WEB_SERVER_PORT
+    signaling_server.ssl_context = get_ssl_context()
+    signaling_server.process_request = UnifiedWebHandler()
 
     signaling_server.logger = logger
+    signaling_server.admission = AdmissionController(logger)
+    if SFU_ENABLED:
+        enable_sfu()
 
     await signaling_server.start()
\ No newline at end of file
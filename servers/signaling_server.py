@@ -1,14 +1,23 @@
 import asyncio
+from contextvars import ContextVar
 from dataclasses import dataclass
+from http import HTTPStatus
 import inspect
 import logging
 from typing import Any, Callable
+from servers.admission import AdmissionController
 from servers.includes.enums import MessageType, RTC_MESSAGE_TYPES
 from servers.includes.models import User
 from servers.includes.messages import BaseMessage
+from servers.includes.tracing import add_hop, is_valid_trace
 from servers.logging_config import get_logger
 import json
 import websockets
+from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+
+current_trace: ContextVar[dict] = ContextVar("current_trace", default=None)
+""" Trace of the message being handled: the messages its handler sends continue it (see `servers.includes.tracing`)"""
 
 
 @dataclass
@@ -29,17 +38,69 @@ class MessageHandler:
     settings: MessageHandlerSettings
     required_args: list[str]
 
+def shrink_tls_read_buffer(transport: asyncio.Transport, size: int) -> bool:
+    """
+    Replace the read buffer of one TLS connection. asyncio allocates `SSLProtocol.max_size` (256 KiB) zeroed
+    per connection, so an idle connection keeps all of it resident, while a TLS record is at most 16 KiB.
+    Only this connection's protocol changes, other TLS connections of the process keep asyncio's size.
+
+    :returns: False for a plain connection, or if asyncio's internals are not the expected ones
+    """
+    protocol = getattr(transport, "_ssl_protocol", None)
+    if protocol is None or not isinstance(getattr(protocol, "_ssl_buffer", None), bytearray):
+        return False
+    protocol.max_size = size
+    protocol._ssl_buffer = bytearray(size)
+    protocol._ssl_buffer_view = memoryview(protocol._ssl_buffer)
+    return True
+
 class SignalingServer:
 
     SUPPORTED_HANDLER_ARGS = {"user", "target", "payload", "message_type"}
     """ A whitelist for locals(). All other vars will not be passed"""
 
-    def __init__(self, host=None, port=None, logger:logging.Logger=None, ssl_context=None):
+    def __init__(self, host=None, port=None, logger:logging.Logger=None, ssl_context=None, process_request:Callable=None,
+                 max_size=2**16, max_queue=4, write_limit=2**14, compression="deflate", compression_context_takeover=False,
+                 compression_window_bits=11, compression_mem_level=4, tls_read_buffer=2**14):
+        """
+        Per-connection limits (see `connection_options`). Signaling messages are small JSON, the `websockets`
+        defaults (1 MiB messages, 16 queued frames, 32 KiB write buffer, 4 KiB deflate windows) are sized for bulk data.
+
+        :param max_size: largest accepted message in bytes (SDP with candidates is a few KB)
+        :param max_queue: received frames buffered before reading from the socket pauses
+        :param write_limit: bytes buffered for sending before `send` waits
+        :param compression: "deflate" (negotiated per connection, when the client offers it) or None
+        :param compression_context_takeover: keep each connection's deflate contexts between messages. Without it
+            they only exist while a message is (de)compressed: idle connections hold no compression state
+        :param compression_window_bits: deflate window (2 ** bits bytes) of each direction
+        :param compression_mem_level: zlib memLevel of the server's compressor
+        :param tls_read_buffer: read buffer of each TLS connection, asyncio allocates 256 KiB. None keeps asyncio's.
+            Replaced per connection when its request arrives (see `shrink_tls_read_buffer`)
+        """
         self.host = host
         self.port = port
         self.ssl_context = ssl_context
+        self.process_request = process_request
+        """ Optional `websockets` hook for plain HTTP requests (see `servers.web.UnifiedWebHandler`)"""
+        self.resolve_virtual_user: Callable[[str], User] = None
+        """ Optional: RTC message targets which are not connected clients (e.g. the SFU, see `servers.sfu`)"""
+        self.on_disconnect: Callable[[User], Any] = None
+        """ Optional: awaited after a client disconnected """
+        self.admission: AdmissionController = None
+        """ Optional overload protection: rejects connections and defers low-priority messages """
+        self.pending_sends = 0
+        """ Sends waiting for a client's write buffer (see `write_limit`) """
         self.logger = logger if logger is not None else get_logger(__name__)
 
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_limit = write_limit
+        self.compression = compression
+        self.compression_context_takeover = compression_context_takeover
+        self.compression_window_bits = compression_window_bits
+        self.compression_mem_level = compression_mem_level
+        self.tls_read_buffer = tls_read_buffer
+
         
         self.message_handlers: dict[str, MessageHandler] = {}  # str: MessageType
         self.supported_message_types: set[str] = set()  # str: MessageType
@@ -54,8 +115,59 @@ class SignalingServer:
 
         self.log_registered_handlers()
 
-        async with websockets.serve(self.signaling_handler, self.host, self.port, ssl=self.ssl_context):
-            await asyncio.Future()
+        if self.admission is not None:
+            self.admission.start(replay=self.replay_deferred, get_pending_sends=lambda: self.pending_sends)
+        try:
+            async with websockets.serve(self.signaling_handler, self.host, self.port, ssl=self.ssl_context, process_request=self.handle_request,
+                                        **self.connection_options()):
+                await asyncio.Future()
+        finally:
+            if self.admission is not None:
+                await self.admission.stop()
+
+    def handle_request(self, connection, request):
+        """
+        `websockets` process_request hook: admission control of websocket upgrades, then `process_request`.
+        Plain HTTP requests (the web files in single-port mode) are not gated: they don't become clients
+        """
+        if self.tls_read_buffer is not None:
+            shrink_tls_read_buffer(connection.transport, self.tls_read_buffer)
+
+        upgrade = request.headers.get("Upgrade", "").lower() == "websocket"
+        if upgrade and self.admission is not None and not self.admission.admit_connection(len(self.connected_clients), self.pending_sends):
+            response = connection.respond(HTTPStatus.SERVICE_UNAVAILABLE, "Server overloaded, retry later\n")
+            response.headers["Retry-After"] = str(self.admission.retry_after())
+            return response
+
+        if self.process_request is not None:
+            return self.process_request(connection, request)
+        return None
+
+    def connection_options(self) -> dict:
+        """
+        `websockets.serve` keyword arguments applied to every connection
+        """
+        match self.compression:
+            case "deflate":
+                extensions = [ServerPerMessageDeflateFactory(
+                    server_no_context_takeover=not self.compression_context_takeover,
+                    client_no_context_takeover=not self.compression_context_takeover,
+                    server_max_window_bits=self.compression_window_bits,
+                    client_max_window_bits=self.compression_window_bits,
+                    compress_settings={"memLevel": self.compression_mem_level},
+                )]
+            case None:
+                extensions = []
+            case _:
+                raise ValueError(f"Unsupported compression: {self.compression}")
+
+        return {
+            "max_size": self.max_size,
+            "max_queue": self.max_queue,
+            "write_limit": self.write_limit,
+            "compression": None,
+            "extensions": extensions,
+        }
 
     def log_registered_handlers(self):
         """
@@ -86,6 +198,16 @@ class SignalingServer:
             self.logger.info(f"Client {client_id} disconnected")
         finally:
             del self.connected_clients[client_id]
+            if self.on_disconnect is not None:
+                await self.on_disconnect(user)
+
+    async def replay_deferred(self, deferred: tuple[User, dict]):
+        """
+        A message held back by `admission`, processed once the load dropped unless its client left meanwhile
+        """
+        user, message = deferred
+        if self.connected_clients.get(user.id) is user:
+            await self.process_message(user, message)
 
     async def process_message(self, user:User, message:dict):
         """
@@ -100,11 +222,20 @@ class SignalingServer:
             self.logger.error(e)
             return
         
+        if self.admission is not None and not self.admission.admit_message(message_type, self.pending_sends):
+            self.logger.debug(f"Deferred {message_type} from {user.id}")
+            self.admission.defer((user, message))
+            return
+
         handler_config = self.get_handler(message_type)
         if handler_config is None:
             self.logger.error(f"No handler for message type. How is it even possible?@!: {message_type}")
             return
-        
+
+        # Optional trace: the messages sent by the handler continue it
+        trace = message.get("trace")
+        trace_token = current_trace.set(add_hop(trace, f"{message_type.value} server_recv") if is_valid_trace(trace) else None)
+
         try:
             func:Callable = handler_config.func
             settings:MessageHandlerSettings = handler_config.settings
@@ -113,13 +244,16 @@ class SignalingServer:
             self.logger.info(f"Executing handler `{func.__name__}` for user {user.name}, message type: {message_type}")
 
             # Dynamic args building based on required_args for current handler
-            # Retreive locals for each name
-            args:dict[str, Any] = {key: locals().get(key) for key in handler_config.required_args}
+            # Retreive locals for each name. Captured outside the comprehension: before Python 3.12 it has its own locals()
+            handler_locals = locals()
+            args:dict[str, Any] = {key: handler_locals.get(key) for key in handler_config.required_args}
 
             await func(**args)
             self.logger.info(f"Message {message_type} handled successfully for user {user.name} ({user.id})")
         except Exception as e:
             self.logger.error(f"Error in handler `{func.__name__}` for message type {message_type}: {e}")
+        finally:
+            current_trace.reset(trace_token)
 
     """
     Message registrars. Are used to map MessageType -> Handler. 1:1
@@ -159,7 +293,19 @@ class SignalingServer:
         {type: MessageType, message:{...}}
         """
         self.logger.debug(f"Sending message to {send_to.name} ({send_to.id}): {message.to_json()}")
-        await send_to.websocket.send(message.to_json())
+        trace = current_trace.get()
+        if trace is not None:
+            data = message.to_dict()
+            data["trace"] = add_hop(trace, f"{message.type.value} server_send")
+            message_json = json.dumps(data)
+        else:
+            message_json = message.to_json()
+
+        self.pending_sends += 1
+        try:
+            await send_to.websocket.send(message_json)
+        finally:
+            self.pending_sends -= 1
 
     async def broadcast_message(self, sender:any, message:BaseMessage, include_sender=False, from_server=False):
         """
@@ -237,7 +383,12 @@ class SignalingServer:
                 target = extra.get("target", None)
                 if message_type in RTC_MESSAGE_TYPES:
                     try:
-                        target = self.connected_clients[target["id"]]
+                        target_id = target["id"]
+                        target = self.connected_clients.get(target_id)
+                        if target is None and self.resolve_virtual_user is not None:
+                            target = self.resolve_virtual_user(target_id)
+                        if target is None:
+                            raise KeyError(target_id)
                     except:
                         raise ValueError(f"Message type {message_type} is within RTC_MESSAGE_TYPES. Could not extract target. Given Message: {message}")
                 
@@ -1,16 +1,67 @@
+from http import HTTPStatus
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 from logging import Logger
 from socketserver import TCPServer
 import json
+import mimetypes
 import os
-import ssl
-from config import SIGNALING_SERVER, SIGNALING_HOST, WEB_SERVER_PORT, WEB_SERVER
+from config import SIGNALING_SERVER, SIGNALING_HOST, SIGNALING_PATH, WEB_SERVER_PORT, WEB_SERVER, get_ssl_context
+
+
+CONFIG_PLACEHOLDER = "<!-- APP_CONFIG -->"
+""" Marker in index.html which is replaced with the inlined client config"""
+
+
+def get_client_config() -> dict:
+    """
+    Config the browser needs before connecting. Served inline and via `/config`
+    """
+    return {
+        "websocket_host": SIGNALING_SERVER
+    }
+
+def render_index(base_dir:str) -> bytes:
+    """
+    Render index.html with the client config inlined, so the browser can connect
+    without fetching `/config` first.
+
+    :returns: rendered page or None if index.html is missing
+    """
+    index_path = os.path.join(base_dir, 'index.html')
+    if not os.path.isfile(index_path):
+        return None
+
+    with open(index_path, 'r', encoding='utf-8') as file:
+        html = file.read()
+
+    # `</` is escaped so the config can never close the script tag
+    config_json = json.dumps(get_client_config()).replace("</", "<\\/")
+    script = f"<script>window.APP_CONFIG = {config_json};</script>"
+    return html.replace(CONFIG_PLACEHOLDER, script, 1).encode('utf-8')
+
+def load_static_file(base_dir:str, path:str) -> tuple[str, bytes]:
+    """
+    Read a file from the web directory.
+
+    :returns: (content type, body) or None if the file does not exist or is outside base_dir
+    """
+    path = path.split('?', 1)[0]
+    file_path = os.path.normpath(os.path.join(base_dir, path.lstrip('/')))
+    if os.path.commonpath([file_path, base_dir]) != base_dir or not os.path.isfile(file_path):
+        return None
+
+    content_type = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    with open(file_path, 'rb') as file:
+        return content_type, file.read()
 
 
 class WebServerHandler(SimpleHTTPRequestHandler):
     """
     Just a dummy server for files loading
     """
+    rendered_index: bytes = None
+    """ Cached index.html with inlined config. Rendered once by `run_web_server`"""
+
     def __init__(self, *args, **kwargs):
         self.base_dir = os.path.join(os.getcwd(), 'web')
         super().__init__(*args, **kwargs)
@@ -19,44 +70,93 @@ class WebServerHandler(SimpleHTTPRequestHandler):
         if self.path == '/config':
             return self.handle_config()
 
-        if self.path == '/':
+        if self.path in ('/', '/index.html'):
             return self.handle_root()
 
         return self.handle_static_files()
 
     def handle_config(self):
+        """
+        Fallback for pages served without the inlined config
+        """
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.end_headers()
-        config_data = {
-            "websocket_host": SIGNALING_SERVER
-        }
-        self.wfile.write(json.dumps(config_data).encode('utf-8'))
+        self.wfile.write(json.dumps(get_client_config()).encode('utf-8'))
 
     def handle_root(self):
+        if self.rendered_index is not None:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(self.rendered_index)))
+            self.end_headers()
+            self.wfile.write(self.rendered_index)
+            return
+
         self.path = '/index.html'
         return self.handle_static_files()
 
     def handle_static_files(self):
-        file_path = os.path.join(self.base_dir, self.path.lstrip('/'))
-        print(f"{file_path=}")
-
-        if os.path.isfile(file_path):
-            with open(file_path, 'rb') as file:
-                self.send_response(200)
-                self.send_header('Content-Type', self.guess_type(file_path))
-                self.end_headers()
-                self.wfile.write(file.read())
+        static_file = load_static_file(self.base_dir, self.path)
+
+        if static_file is not None:
+            content_type, body = static_file
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.end_headers()
+            self.wfile.write(body)
             return
 
         self.send_error(404, "File not found")
 
+
+class UnifiedWebHandler:
+    """
+    Serves the web files from the signaling listener (single-port mode).
+
+    Passed to `SignalingServer.process_request`: plain HTTP requests are answered here,
+    requests to SIGNALING_PATH continue with the websocket handshake.
+    Responses close the connection, but the browser resumes the TLS session for the next one.
+    """
+    def __init__(self, base_dir:str = None):
+        self.base_dir = base_dir if base_dir is not None else os.path.join(os.getcwd(), 'web')
+        self.rendered_index = render_index(self.base_dir)
+
+    def __call__(self, connection, request):
+        path = request.path.split('?', 1)[0]
+        if path == SIGNALING_PATH:
+            return None  # Websocket handshake
+
+        if path == '/config':
+            return self.respond(connection, HTTPStatus.OK, 'application/json', json.dumps(get_client_config()).encode('utf-8'))
+
+        if path in ('/', '/index.html') and self.rendered_index is not None:
+            return self.respond(connection, HTTPStatus.OK, 'text/html', self.rendered_index)
+
+        static_file = load_static_file(self.base_dir, path)
+        if static_file is None:
+            return connection.respond(HTTPStatus.NOT_FOUND, "File not found\n")
+
+        content_type, body = static_file
+        return self.respond(connection, HTTPStatus.OK, content_type, body)
+
+    @staticmethod
+    def respond(connection, status:HTTPStatus, content_type:str, body:bytes):
+        response = connection.respond(status, "")
+        del response.headers['Content-Type']
+        del response.headers['Content-Length']
+        response.headers['Content-Type'] = content_type
+        response.headers['Content-Length'] = str(len(body))
+        response.body = body
+        return response
+
 def run_web_server():
+    # SIGNALING_SERVER is static per process, so the page is rendered only once
+    WebServerHandler.rendered_index = render_index(os.path.join(os.getcwd(), 'web'))
+
     httpd = HTTPServer((SIGNALING_HOST, WEB_SERVER_PORT), WebServerHandler)
 
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(certfile="server.crt", keyfile="server.key")
-    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    httpd.socket = get_ssl_context().wrap_socket(httpd.socket, server_side=True)
 
     print(f"Starting HTTPS server on {WEB_SERVER}")
     httpd.serve_forever()
\ No newline at end of file
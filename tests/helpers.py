@@ -0,0 +1,22 @@
+import asyncio
+
+from aiortc import RTCPeerConnection
+
+RECV_TIMEOUT = 5
+""" Seconds a live-server test waits for a message: a handler which never answers fails the test instead of hanging it """
+
+
+async def recv(websocket):
+    """
+    Next message of a websocket, within `RECV_TIMEOUT`
+    """
+    return await asyncio.wait_for(websocket.recv(), RECV_TIMEOUT)
+
+async def negotiate(sender: RTCPeerConnection, receiver: RTCPeerConnection):
+    """
+    Offer/answer between two local peer connections, `sender` offers
+    """
+    await sender.setLocalDescription(await sender.createOffer())
+    await receiver.setRemoteDescription(sender.localDescription)
+    await receiver.setLocalDescription(await receiver.createAnswer())
+    await sender.setRemoteDescription(receiver.localDescription)
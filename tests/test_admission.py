@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import sys, os
+import time
+from http import HTTPStatus
+
+import pytest
+import websockets
+
+# Adding root reference
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from servers.admission import AdmissionController
+from servers.includes.enums import MessageType
+from servers.signaling_main import signaling_server
+from helpers import RECV_TIMEOUT, recv
+
+logger = logging.getLogger(__name__)
+
+
+def test__overload_sheds_low_priority_messages_first():
+    admission = AdmissionController(logger, max_connections=10, max_loop_lag=0.05, max_pending_sends=100)
+    assert admission.admit_message(MessageType.JOIN, pending_sends=0)
+    assert admission.admit_connection(connections=9, pending_sends=0)
+    assert not admission.admit_connection(connections=10, pending_sends=0)
+
+    admission.loop_lag = 0.2
+    assert not admission.admit_message(MessageType.JOIN, pending_sends=0)
+    assert admission.admit_message(MessageType.OFFER, pending_sends=0)
+    assert admission.admit_message(MessageType.ANSWER, pending_sends=0)
+    assert not admission.admit_connection(connections=0, pending_sends=0)
+
+    admission.loop_lag = 0
+    assert not admission.admit_message(MessageType.JOIN, pending_sends=101)
+
+    assert admission.get_stats()["rejected_connections"] == {"connections": 1, "loop_lag": 1}
+    assert admission.get_stats()["shed_messages"] == {"JOIN": 2}
+    assert admission.overloaded == "send_queue"
+    assert 5 <= admission.retry_after() <= 15
+
+def test__loop_lag_is_measured():
+    async def run():
+        admission = AdmissionController(logger)
+        admission.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # Blocks the loop
+        await asyncio.sleep(0.05)
+        await admission.stop()
+        return admission.loop_lag
+
+    assert asyncio.run(run()) > 0.1
+
+async def http_status(port: int, path: str) -> int:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+    status_line = await asyncio.wait_for(reader.readline(), RECV_TIMEOUT)
+    writer.close()
+    return int(status_line.split()[1])
+
+async def run_rejection_checks():
+    signaling_server.admission = AdmissionController(logger, max_connections=1)
+    # Single-port mode: plain requests are answered by the web handler
+    signaling_server.process_request = lambda connection, request: (
+        None if request.headers.get("Upgrade") else connection.respond(HTTPStatus.OK, "index\n"))
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0, process_request=signaling_server.handle_request)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    try:
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": "Admitted"}}))
+            await recv(websocket)
+
+            with pytest.raises(websockets.exceptions.InvalidStatus) as rejected:
+                await websockets.connect(url)
+            assert rejected.value.response.status_code == 503
+            assert int(rejected.value.response.headers["Retry-After"]) >= 5
+
+            # The web files are still served
+            assert await http_status(server.sockets[0].getsockname()[1], "/index.html") == 200
+    finally:
+        signaling_server.admission = None
+        signaling_server.process_request = None
+        server.close()
+        await server.wait_closed()
+
+def test__rejected_connections_get_retry_after():
+    asyncio.run(run_rejection_checks())
+
+def test__deferred_messages_are_replayed_once_the_load_dropped():
+    async def run():
+        admission = AdmissionController(logger, max_deferred=2)
+        replayed = []
+        async def replay(message):
+            replayed.append(message)
+
+        admission.loop_lag = 0.2
+        for index in range(3):
+            assert not admission.admit_message(MessageType.JOIN, pending_sends=0)
+            admission.defer(index)
+        admission.start(replay=replay)
+        await asyncio.sleep(0.6)  # The lag decays
+        await admission.stop()
+        return replayed, admission.get_stats()
+
+    replayed, stats = asyncio.run(run())
+
+    # In order, the oldest one dropped
+    assert replayed == [1, 2]
+    assert stats["deferred_messages"] == 0 and stats["dropped_messages"] == 1
+
+async def run_deferred_join_checks():
+    admission = signaling_server.admission = AdmissionController(logger, max_pending_sends=-1)  # Overloaded
+    admission.start(replay=signaling_server.replay_deferred)
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    try:
+        async with websockets.connect(url) as present, websockets.connect(url) as joining:
+            for websocket, name in ((present, "Present"), (joining, "Joining")):
+                await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": name}}))
+                await recv(websocket)
+
+            await joining.send(json.dumps({"type": "JOIN", "payload": {}}))
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(present.recv(), 0.2)
+
+            admission.max_pending_sends = 512
+            join = json.loads(await recv(present))
+            assert join["type"] == "JOIN" and join["payload"]["user"]["name"] == "Joining"
+    finally:
+        signaling_server.admission = None
+        await admission.stop()
+        server.close()
+        await server.wait_closed()
+
+def test__join_shed_under_load_is_delivered_later():
+    asyncio.run(run_deferred_join_checks())
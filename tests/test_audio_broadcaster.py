@@ -0,0 +1,133 @@
+import asyncio
+import fractions
+import logging
+import sys, os
+
+from av import AudioFrame
+from aiortc import MediaStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import AudioBroadcaster, SharedOpusEncoder, VOICE_ENCODER_PROFILES
+from servers.includes.opus import libopus_supports_dtx
+from helpers import negotiate
+
+logger = logging.getLogger(__name__)
+
+
+class CountingTrack(MediaStreamTrack):
+    kind = "audio"
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def recv(self):
+        await asyncio.sleep(0.001)
+        frame = AudioFrame(format="s16", layout="mono", samples=960)
+        frame.pts = self.calls * 960
+        frame.time_base = fractions.Fraction(1, 48000)
+        self.calls += 1
+        return frame
+
+
+def test__capture_once_fan_out():
+    async def run():
+        source = CountingTrack()
+        broadcaster = AudioBroadcaster(logger, source, max_queue=100)
+        tracks = [broadcaster.subscribe() for _ in range(3)]
+
+        received = [[(await track.recv()).pts for _ in range(20)] for track in tracks]
+        broadcaster.stop()
+        return source, received
+
+    source, received = asyncio.run(run())
+
+    # Each peer sees the same continuous stream...
+    assert received[0] == received[1] == received[2] == [i * 960 for i in range(20)]
+    # ...while the source was read only once per frame
+    assert source.calls <= 21
+
+def test__slow_subscriber_drops_instead_of_stalling():
+    async def run():
+        source = CountingTrack()
+        broadcaster = AudioBroadcaster(logger, source, max_queue=2)
+        fast = broadcaster.subscribe()
+        slow = broadcaster.subscribe()
+
+        fast_pts = [(await fast.recv()).pts for _ in range(10)]
+        slow_pts = [(await slow.recv()).pts for _ in range(2)]
+        broadcaster.stop()
+        return fast_pts, slow_pts, slow.dropped_frames
+
+    fast_pts, slow_pts, dropped = asyncio.run(run())
+
+    assert fast_pts == [i * 960 for i in range(10)]
+    assert dropped >= 7
+    # The slow peer gets the freshest frames
+    assert slow_pts[0] >= 8 * 960
+
+def test__encode_once_shared_between_peers():
+    from aiortc import RTCPeerConnection
+    from aiortc.mediastreams import AudioStreamTrack
+
+    async def run():
+        broadcaster = AudioBroadcaster(logger, AudioStreamTrack(), encode_once=True)
+        pairs, received = [], []
+
+        for _ in range(2):
+            sender, receiver = RTCPeerConnection(), RTCPeerConnection()
+            sender.addTrack(broadcaster.subscribe(sender))
+            receiver.on("track", lambda track: received.append(track))
+            await negotiate(sender, receiver)
+            pairs.append((sender, receiver))
+
+        frames = [[await track.recv() for _ in range(10)] for track in received]
+        stats = broadcaster.get_stats()
+        encoded = sum(group.frames_encoded for group in broadcaster.groups.values())
+
+        broadcaster.stop()
+        for sender, receiver in pairs:
+            await sender.close()
+            await receiver.close()
+        return frames, stats, encoded
+
+    frames, stats, encoded = asyncio.run(run())
+
+    assert all(len(peer_frames) == 10 for peer_frames in frames)
+    assert stats["raw_subscribers"] == 0
+    assert list(stats["encoder_groups"].values()) == [2]
+    assert encoded > 0
+
+def test__silent_frames_are_skipped_by_shared_encoders():
+    from aiortc import RTCRtpCodecParameters
+
+    class SilentTrack(CountingTrack):
+        async def recv(self):
+            frame = await super().recv()
+            frame.sample_rate = 48000
+            frame.opaque = {"silent": self.calls > 5}
+            return frame
+
+    async def run():
+        broadcaster = AudioBroadcaster(logger, SilentTrack(), max_queue=100, encode_once=True)
+        codec = RTCRtpCodecParameters(mimeType="audio/opus", clockRate=48000, channels=2, payloadType=96)
+        track = broadcaster.subscribe(codec=codec)
+        packets = [await track.recv() for _ in range(7)]
+        stats = broadcaster.get_stats()
+        broadcaster.stop()
+        return packets, stats
+
+    packets, stats = asyncio.run(run())
+
+    # 5 frames of sound, then silence: only one keepalive frame per 20
+    assert [packet.pts for packet in packets][5:] == [i * 960 for i in (24, 44)]
+    assert stats["dtx_skipped_frames"] >= 38
+
+def test__dtx_is_only_requested_when_libopus_supports_it():
+    encoder = SharedOpusEncoder(VOICE_ENCODER_PROFILES[0])
+
+    assert encoder.dtx == libopus_supports_dtx()
+    assert ("dtx" in encoder.codec.options) == encoder.dtx
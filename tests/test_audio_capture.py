@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import sys, os
+import time
+
+import numpy as np
+import pytest
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.classes.RingBuffer import AudioRingBuffer
+from includes.audio_backends import CaptureBackend, SyntheticBackend
+from includes.audio_tracks import CustomAudioTrack
+
+logger = logging.getLogger(__name__)
+
+
+def test__ring_buffer_wraps():
+    ring = AudioRingBuffer(capacity_frames=8, channels=2)
+    out = np.zeros((3, 2), dtype=np.int16)
+
+    for i in range(10):
+        chunk = np.full((3, 2), i, dtype=np.int16)
+        assert ring.write(chunk)
+        assert ring.read_into(out)
+        assert (out == i).all()
+
+    assert ring.stats()["overruns"] == 0 and ring.stats()["underruns"] == 0
+
+def test__ring_buffer_overrun_underrun_trim():
+    ring = AudioRingBuffer(capacity_frames=4, channels=1)
+    out = np.zeros((2, 1), dtype=np.int16)
+
+    assert not ring.read_into(out)
+    assert ring.write(np.arange(4, dtype=np.int16).reshape(-1, 1))
+    assert not ring.write(np.zeros((1, 1), dtype=np.int16))
+
+    assert ring.trim(2) == 2
+    assert ring.read_into(out)
+    assert out[:, 0].tolist() == [2, 3]
+    assert ring.stats() == {"buffered": 0, "overruns": 1, "underruns": 1, "trimmed_frames": 2}
+
+def test__capture_backend_requires_read():
+    class Incomplete(CaptureBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(logger)
+
+def test__track_with_synthetic_backend():
+    async def run():
+        backend = SyntheticBackend(logger, rate=48000, channels=2, frames_per_buffer=960)
+        track = CustomAudioTrack(logger, backend=backend)
+        try:
+            frames = [await track.recv() for _ in range(10)]
+        finally:
+            track.stop()
+        return frames, track.get_stats()
+
+    frames, stats = asyncio.run(run())
+
+    assert [frame.pts for frame in frames] == [i * 960 for i in range(10)]
+    assert all(frame.samples == 960 and frame.sample_rate == 48000 for frame in frames)
+    # Only the very first frame may be silence while the capture thread spins up
+    assert stats["underruns"] <= 2
+    assert np.abs(frames[-1].to_ndarray()).max() > 0
+
+def test__wav_and_pipe_backends(tmp_path):
+    import io
+    import wave
+    from includes.audio_backends import create_backend
+
+    mono = np.arange(1000, dtype=np.int16)
+    path = str(tmp_path / "clip.wav")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(48000)
+        wav.writeframes(mono.tobytes())
+
+    backend = create_backend("wav", logger, path=path, realtime=False)
+    backend.open()
+    chunk = backend.read(960)
+    looped = backend.read(960)
+    assert chunk.shape == (960, 2) and (chunk[:, 0] == chunk[:, 1]).all()
+    assert looped[40, 0] == 0  # 960 + 40 wraps to the start of the file
+
+    pipe = create_backend("pipe", logger, source=io.BytesIO(np.ones((960, 2), dtype=np.int16).tobytes()))
+    pipe.open()
+    assert (pipe.read(960) == 1).all()
+
+def test__capture_ends_with_its_pipe():
+    import io
+    from includes.audio_backends import PcmPipeBackend
+
+    async def run():
+        source = io.BytesIO(np.ones((960 * 3, 2), dtype=np.int16).tobytes())
+        track = CustomAudioTrack(logger, "music", backend=PcmPipeBackend(logger, source))
+        try:
+            frames = [await track.recv() for _ in range(6)]
+            return frames, track.source
+        finally:
+            track.stop()
+
+    frames, capture = asyncio.run(run())
+    assert capture.ended and capture.capture_errors == 0
+    assert len(frames) == 6  # Silence after the end of the stream
+
+def test__converter_resamples_and_downmixes_continuously():
+    from includes.classes.AudioConverter import AudioConverter
+
+    def tone(rate, frames, channels):
+        samples = (np.sin(2 * np.pi * 440 * np.arange(frames) / rate) * 10000).astype(np.int16)
+        return np.repeat(samples[:, None], channels, axis=1)
+
+    # 44.1 kHz stereo device for a 48 kHz profile, in device-sized blocks
+    converter = AudioConverter(44100, 2, 48000, 2)
+    source = tone(44100, 882 * 20, 2)
+    out = np.concatenate([converter.convert(source[i:i + 882]).copy() for i in range(0, len(source), 882)])
+    assert abs(len(out) - 960 * 20) <= 1
+    assert np.abs(out.astype(int) - tone(48000, len(out), 2)).max() < 50
+
+    # 48 kHz stereo to the 24 kHz mono voice profile
+    converter = AudioConverter(48000, 2, 24000, 1)
+    out = converter.convert(tone(48000, 960, 2))
+    assert out.shape == (480, 1)
+    assert out.base is not None  # a view of the preallocated buffer
+
+def test__voice_profile_track_converts_device_format():
+    async def run():
+        backend = SyntheticBackend(logger, rate=44100, channels=2, frames_per_buffer=882)
+        track = CustomAudioTrack(logger, profile="voice", backend=backend)
+        try:
+            frames = [await track.recv() for _ in range(10)]
+        finally:
+            track.stop()
+        return frames
+
+    frames = asyncio.run(run())
+
+    assert all(frame.samples == 480 and frame.sample_rate == 24000 and frame.layout.name == "mono" for frame in frames)
+    assert np.abs(frames[-1].to_ndarray()).max() > 0
+
+def test__vad_hangover_and_noise_floor():
+    from includes.classes.VoiceActivityDetector import VoiceActivityDetector
+
+    rng = np.random.default_rng(0)
+    noise = lambda level: (rng.normal(0, level, (480, 1)) * 32767).astype(np.int16)
+    vad = VoiceActivityDetector(threshold_db=-45, hangover_frames=3)
+
+    # A steady noisy room (about -35 dBFS) is learned as noise, not speech
+    assert [vad.process(noise(0.02)) for _ in range(5)][1:] == [False] * 4
+    # Speech onset is detected in its first frame...
+    assert vad.process(noise(0.3))
+    # ...and held for the hangover after it
+    assert [vad.process(noise(0.02)) for _ in range(5)] == [True, True, True, False, False]
+    assert vad.stats()["silent_frames"] == 7
+
+def test__mixed_track_aligns_and_ducks_music_under_voice():
+    from includes.audio_tracks import MixedAudioTrack, MixSource
+
+    track = MixedAudioTrack(logger, "music", sources=[
+        MixSource("microphone", SyntheticBackend(logger), voice=True),
+        MixSource("loopback", SyntheticBackend(logger), gain=0.5),
+    ], ducking_db=-12)
+    microphone, loopback = track.captures
+    constant = lambda value, frames=960: np.full((frames, 2), value, dtype=np.int16)
+
+    # The loopback device started 4 frames earlier: its oldest audio is trimmed away
+    microphone.ring.write(np.concatenate([constant(0), constant(8000, 1920)]))
+    loopback.ring.write(np.concatenate([constant(1), constant(1, 960 * 3), constant(10000, 960 * 3)]))
+    microphone.last_write = loopback.last_write = time.perf_counter()
+    out = np.zeros((960, 2), dtype=np.int16)
+
+    assert track.read_frame(out)
+    assert track.aligned_frames == 3840
+    assert (out == 5000).all()
+
+    # Speech: the music ramps down by 12 dB over one frame, then stays there
+    assert track.read_frame(out)
+    assert out[0, 0] > 12900 and out[-1, 0] == 8000 + round(10000 * 0.5 * 10 ** (-12 / 20))
+    assert track.read_frame(out)
+    assert (out == 8000 + round(10000 * 0.5 * 10 ** (-12 / 20))).all()
+    assert track.get_stats()["ducked_frames"] == 2
+
+    # Nothing captured at all: silence, as for a single device
+    assert not track.read_frame(out)
+
+def test__mixed_track_captures_both_sources_as_one_stream():
+    from includes.audio_tracks import MixedAudioTrack, MixSource
+
+    async def run():
+        track = MixedAudioTrack(logger, "voice", sources=[
+            MixSource("microphone", SyntheticBackend(logger, rate=48000, channels=1, frequency=300, amplitude=0.2), voice=True),
+            MixSource("loopback", SyntheticBackend(logger, rate=44100, channels=2, frequency=1000, amplitude=0.2)),
+        ])
+        try:
+            frames = [await track.recv() for _ in range(15)]
+        finally:
+            track.stop()
+        return frames, track.get_stats()
+
+    frames, stats = asyncio.run(run())
+
+    assert all(frame.samples == 480 and frame.sample_rate == 24000 and frame.layout.name == "mono" for frame in frames)
+    assert set(stats["sources"]) == {"microphone", "loopback"}
+    # Both tones are in the single stream
+    spectrum = np.abs(np.fft.rfft(np.concatenate([frame.to_ndarray()[0] for frame in frames[-10:]])))
+    frequencies = np.fft.rfftfreq(4800, 1 / 24000)
+    assert spectrum[frequencies == 300] > 100 * np.median(spectrum)
+    assert spectrum[frequencies == 1000] > 100 * np.median(spectrum)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import sys, os
+import tempfile
+import wave
+
+import numpy as np
+from av import AudioFrame
+from aiortc import RTCPeerConnection
+from aiortc.mediastreams import AudioStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioMixer import AudioMixer, MixerInput
+from includes.audio_backends import SyntheticBackend
+from includes.audio_sinks import NullSink, create_sink
+from includes.audio_tracks import CustomAudioTrack
+
+logger = logging.getLogger(__name__)
+
+
+def make_frame(value:int, rate=48000, channels=2, samples=960) -> AudioFrame:
+    data = np.full((1, samples * channels), value, dtype=np.int16)
+    frame = AudioFrame.from_ndarray(data, format="s16", layout="mono" if channels == 1 else "stereo")
+    frame.sample_rate = rate
+    return frame
+
+def add_input(mixer: AudioMixer, user_id) -> MixerInput:
+    mixer_input = mixer.inputs[user_id] = MixerInput(user_id, None, 2 * mixer.max_jitter_frames, mixer.channels)
+    return mixer_input
+
+def test__mix_sums_clips_and_waits_for_jitter_buffers():
+    mixer = AudioMixer(logger, NullSink(logger), jitter_frames=2, max_jitter_frames=4, max_peers=1)
+    a, b, c = add_input(mixer, "a"), add_input(mixer, "b"), add_input(mixer, "c")
+
+    mixer.push(a, make_frame(1000))
+    mixer.push(b, make_frame(2000))
+    # Nobody has the target depth yet
+    assert not mixer.mix().any()
+
+    mixer.push(a, make_frame(1000))
+    mixer.push(b, make_frame(2000))
+    for _ in range(2):
+        mixer.push(c, make_frame(30000))
+    # The stack grew past max_peers, the sum is clipped
+    assert (mixer.mix() == 32767).all()
+    assert (mixer.mix() == 32767).all()
+
+    # All ran dry: left out until refilled
+    assert not mixer.mix().any()
+    assert a.rebuffers == b.rebuffers == c.rebuffers == 1
+
+    # A PCMU peer (8 kHz mono) is converted to the mixer format
+    for _ in range(3):
+        mixer.push(a, make_frame(-500, rate=8000, channels=1, samples=160))
+    mixed = mixer.mix()
+    assert mixed.shape == (960, 2) and (mixed == -500).all()
+
+def test__remote_tracks_are_decoded_and_mixed_into_a_sink():
+    async def run(path):
+        sender, receiver = RTCPeerConnection(), RTCPeerConnection()
+        tone = CustomAudioTrack(logger, "music", backend=SyntheticBackend(logger, amplitude=0.25))
+        sender.addTrack(tone)
+        sender.addTrack(AudioStreamTrack())
+
+        mixer = AudioMixer(logger, create_sink("wav", logger, path=path))
+        receiver.on("track", lambda track: mixer.add_track(f"peer{len(mixer.inputs)}", track))
+
+        await sender.setLocalDescription(await sender.createOffer())
+        await receiver.setRemoteDescription(sender.localDescription)
+        await receiver.setLocalDescription(await receiver.createAnswer())
+        await sender.setRemoteDescription(receiver.localDescription)
+
+        await asyncio.sleep(2)
+        stats = mixer.get_stats()
+        await sender.close()
+        await asyncio.sleep(0.1)
+        peers_after_close = len(mixer.inputs)
+        await receiver.close()
+        await mixer.stop()
+        tone.stop()
+        return stats, peers_after_close
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "received.wav")
+        stats, peers_after_close = asyncio.run(run(path))
+        with wave.open(path, "rb") as wav:
+            assert (wav.getframerate(), wav.getnchannels()) == (48000, 2)
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+    assert stats["peers"] == 2
+    assert all(peer["frames_received"] > 50 for peer in stats["inputs"].values())
+    # Fixed cadence: ~2 s of output, whatever the peers delivered
+    assert 1.7 * 48000 < stats["frames_written"] <= 2.2 * 48000
+    # The tone came through (the other peer sends silence)
+    rms = np.sqrt(np.mean(samples[-48000:].astype(np.float64) ** 2)) / 32768
+    assert 0.1 < rms < 0.25
+    # Ended tracks leave the mix
+    assert peers_after_close == 0
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import random
+import sys, os
+
+from aiortc import RTCPeerConnection
+from aiortc.mediastreams import AudioStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import AudioBroadcaster, ENCODER_PROFILES
+from includes.BitrateController import BitrateController, PeerQuality
+from helpers import negotiate
+
+logger = logging.getLogger(__name__)
+
+
+def test__downgrades_at_once_and_upgrades_step_by_step():
+    broadcaster = AudioBroadcaster(logger, AudioStreamTrack(), encode_once=True)
+    track = broadcaster.subscribe(active=False)
+    controller = BitrateController(logger, broadcaster, upgrade_after=2)
+
+    controller.adapt(track, PeerQuality(loss=0.15))
+    assert track.profile == ENCODER_PROFILES[-1]
+
+    good = PeerQuality(loss=0.0, rtt=0.02)
+    controller.adapt(track, good)
+    assert track.profile == ENCODER_PROFILES[-1]
+    controller.adapt(track, good)
+    assert track.profile == ENCODER_PROFILES[-2]
+
+    # High RTT alone is enough to step down
+    controller.adapt(track, PeerQuality(loss=0.0, rtt=0.3))
+    assert track.profile == ENCODER_PROFILES[-2]
+    assert controller.switches == 2
+
+def test__simulated_loss_on_loopback_lowers_the_profile():
+    async def run():
+        broadcaster = AudioBroadcaster(logger, AudioStreamTrack(), encode_once=True)
+        controller = BitrateController(logger, broadcaster, interval=0.25)
+
+        sender, receiver = RTCPeerConnection(), RTCPeerConnection()
+        track = broadcaster.subscribe(sender)
+        sender.addTrack(track)
+        await negotiate(sender, receiver)
+
+        # Drop a third of the RTP packets before the receiver sees them
+        rtp_receiver = receiver.getReceivers()[0]
+        handle_rtp_packet = rtp_receiver._handle_rtp_packet
+        rng = random.Random(1)
+        async def lossy_handle_rtp_packet(packet, arrival_time_ms):
+            if rng.random() > 0.33:
+                await handle_rtp_packet(packet, arrival_time_ms)
+        rtp_receiver._handle_rtp_packet = lossy_handle_rtp_packet
+
+        controller.start()
+        for _ in range(40):
+            await asyncio.sleep(0.25)
+            if track.profile == ENCODER_PROFILES[-1]:
+                break
+        stats = controller.get_stats()
+        group_profile = track.group.profile
+
+        await controller.stop()
+        broadcaster.stop()
+        await sender.close()
+        await receiver.close()
+        return track, group_profile, stats
+
+    track, group_profile, stats = asyncio.run(run())
+
+    assert track.profile == ENCODER_PROFILES[-1]
+    # The peer now gets packets from the encoder of that profile
+    assert group_profile == ENCODER_PROFILES[-1]
+    assert stats["peers"][0]["loss"] > 0.08
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import sys, os
+
+import pytest
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from benchmarks.bench_bulk_transfer import connect_pair
+from includes.BulkTransfer import BulkTransfer, IncomingTransfer, file_sha256
+
+logger = logging.getLogger(__name__)
+
+
+def write_file(path, size) -> bytes:
+    data = os.urandom(size)
+    with open(path, "wb") as file:
+        file.write(data)
+    return data
+
+async def transfer(sender: BulkTransfer, receiver: BulkTransfer, paths: list[str]) -> list[dict]:
+    sender_pc, receiver_pc = await connect_pair()
+    receiver_pc.on("datachannel", receiver.accept_channel)
+    try:
+        return [await sender.send_file(sender_pc, path) for path in paths]
+    finally:
+        await sender_pc.close()
+        await receiver_pc.close()
+
+def test__playlist_is_sent_over_parallel_channels(tmp_path):
+    tracks = [write_file(tmp_path / f"track{i}.flac", 300_000 + i) for i in range(2)]
+    sender = BulkTransfer(logger, channels=3, chunk_size=8 * 1024, high_water=32 * 1024, low_water=8 * 1024)
+    receiver = BulkTransfer(logger, directory=str(tmp_path / "received"))
+
+    stats = asyncio.run(transfer(sender, receiver, [str(tmp_path / f"track{i}.flac") for i in range(2)]))
+
+    for i, data in enumerate(tracks):
+        assert (tmp_path / "received" / f"track{i}.flac").read_bytes() == data
+    assert [s["resumed_from"] for s in stats] == [0, 0]
+    assert stats[0]["channels"] == 3
+    assert stats[0]["stalls"] > 0  # The flow control kicked in
+    assert not list((tmp_path / "received").glob("*.part"))
+
+def test__interrupted_transfer_resumes_at_the_received_prefix(tmp_path):
+    data = write_file(tmp_path / "track.flac", 200_000)
+    (tmp_path / "received").mkdir()
+    (tmp_path / "received" / f"track.flac.{file_sha256(tmp_path / 'track.flac')[:16]}.part").write_bytes(data[:123_456])
+    receiver = BulkTransfer(logger, directory=str(tmp_path / "received"))
+
+    stats = asyncio.run(transfer(BulkTransfer(logger), receiver, [str(tmp_path / "track.flac")]))
+
+    assert stats[0]["resumed_from"] == 123_456
+    assert (tmp_path / "received" / "track.flac").read_bytes() == data
+
+def test__other_content_neither_resumes_nor_replaces_a_file(tmp_path):
+    (tmp_path / "received").mkdir()
+    old = write_file(tmp_path / "received" / "track.flac", 1000)
+    # Part of an earlier version of the track
+    (tmp_path / "received" / f"track.flac.{'0' * 16}.part").write_bytes(b"x" * 500)
+    data = write_file(tmp_path / "track.flac", 2000)
+    receiver = BulkTransfer(logger, directory=str(tmp_path / "received"))
+
+    stats = asyncio.run(transfer(BulkTransfer(logger), receiver, [str(tmp_path / "track.flac")]))
+
+    assert stats[0]["resumed_from"] == 0
+    assert (tmp_path / "received" / "track.flac").read_bytes() == old
+    assert (tmp_path / "received" / "track (1).flac").read_bytes() == data
+    assert receiver.received[0]["path"].endswith("track (1).flac")
+
+def test__out_of_order_chunks_are_written_in_order(tmp_path):
+    transfer = IncomingTransfer(1, str(tmp_path / "track.flac"), 9, control=None)
+    transfer.receive(6, b"ghi")
+    transfer.receive(3, b"def")
+    assert transfer.offset == 0 and len(transfer.pending) == 2
+    transfer.receive(0, b"abc")
+    transfer.receive(3, b"def")  # Duplicate
+    transfer.file.close()
+
+    assert transfer.done
+    assert (tmp_path / "track.flac.part").read_bytes() == b"abcdefghi"
+
+def test__offers_are_rejected_without_a_directory(tmp_path):
+    write_file(tmp_path / "track.flac", 1000)
+    with pytest.raises(ConnectionError, match="not receiving files"):
+        asyncio.run(transfer(BulkTransfer(logger), BulkTransfer(logger), [str(tmp_path / "track.flac")]))
+
+def test__chunks_outside_the_window_are_dropped(tmp_path):
+    transfer = IncomingTransfer(1, str(tmp_path / "track.flac"), 100, control=None, window=10)
+    transfer.receive(8, b"xyz")  # Beyond offset + window
+    transfer.receive(98, b"xyz")  # Beyond the file
+    transfer.receive(3, b"def")
+    transfer.receive(4, b"efghij")  # Overlapping, still within the window
+    transfer.receive(5, b"fghij")  # Would hold more than the window
+    transfer.file.close()
+
+    assert transfer.dropped_chunks == 3
+    assert list(transfer.pending) == [3, 4] and transfer.pending_bytes == 9
+
+def test__offers_above_the_maximum_size_are_rejected(tmp_path):
+    write_file(tmp_path / "track.flac", 1000)
+    receiver = BulkTransfer(logger, directory=str(tmp_path / "received"), max_file_size=999)
+    with pytest.raises(ConnectionError, match="file too large"):
+        asyncio.run(transfer(BulkTransfer(logger), receiver, [str(tmp_path / "track.flac")]))
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import logging
+import sys, os
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.ChannelMessenger import ChannelMessenger
+from includes.classes.clients import RemoteClient
+
+logger = logging.getLogger(__name__)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.readyState = "open"
+        self.bufferedAmount = 0
+        self.bufferedAmountLowThreshold = 0
+        self.sent = []
+        self.handlers = {}
+
+    def on(self, event, handler):
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event):
+        for handler in self.handlers.get(event, []):
+            handler()
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def make_peers(count):
+    peers = {}
+    for i in range(count):
+        peers[i] = RemoteClient(name=f"peer{i}", id=i, data_channel=FakeChannel())
+    return peers
+
+def test__batched_and_serialized_once():
+    peers = make_peers(3)
+
+    async def run():
+        messenger = ChannelMessenger(logger, peers, batch_delay=0.01)
+        messenger.broadcast({"message": "np", "payload": {"title": "A"}}, key="now_playing")
+        messenger.broadcast("hello")
+        await asyncio.sleep(0.05)
+        return messenger
+
+    messenger = asyncio.run(run())
+
+    frames = [peer.data_channel.sent for peer in peers.values()]
+    assert all(len(sent) == 1 for sent in frames)
+    assert json.loads(frames[0][0]) == {"batch": [{"message": "np", "payload": {"title": "A"}}, "hello"]}
+    assert frames[0][0] == frames[1][0] == frames[2][0]
+
+def test__slow_peer_gets_merged_updates():
+    peers = make_peers(2)
+    slow = peers[1].data_channel
+    slow.bufferedAmount = 10 ** 6
+
+    async def run():
+        messenger = ChannelMessenger(logger, peers, batch_delay=0.01, max_pending=3)
+        for i in range(5):
+            messenger.broadcast({"title": i}, key="now_playing")
+            messenger.broadcast(f"chat {i}")
+            await asyncio.sleep(0.02)
+
+        assert slow.sent == []
+        slow.bufferedAmount = 0
+        slow.emit("bufferedamountlow")
+        return messenger.get_stats()
+
+    stats = asyncio.run(run())
+
+    assert json.loads(slow.sent[0]) == {"batch": ["chat 3", {"title": 4}, "chat 4"]}
+    assert stats[1]["merged"] == 4 and stats[1]["dropped"] == 3
+    # The fast peer was never held back
+    assert len(peers[0].data_channel.sent) == 5
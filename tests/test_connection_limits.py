@@ -0,0 +1,79 @@
+import asyncio
+import asyncio.sslproto
+import json
+import ssl
+import sys, os
+
+import pytest
+import websockets
+
+# Adding root reference
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from servers.includes.models import User
+from servers.signaling_server import SignalingServer
+from servers.signaling_main import signaling_server
+from helpers import recv
+
+
+async def run_limit_checks():
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0, **signaling_server.connection_options())
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    try:
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": "Limits"}}))
+            assert json.loads(await recv(websocket))["type"] == "CONFIRM_ID"
+
+            # Negotiated per connection, without context takeover: no deflate state between messages
+            extension, = websocket.protocol.extensions
+            assert extension.local_no_context_takeover and extension.remote_no_context_takeover
+
+        async with websockets.connect(url) as websocket:
+            await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": "x" * signaling_server.max_size}}))
+            with pytest.raises(websockets.exceptions.ConnectionClosed) as closed:
+                await recv(websocket)
+            assert closed.value.rcvd.code == 1009  # Message too big
+    finally:
+        server.close()
+        await server.wait_closed()
+
+def test__connection_limits():
+    asyncio.run(run_limit_checks())
+
+def test__connection_options():
+    options = SignalingServer(compression=None).connection_options()
+    assert options["compression"] is None and options["extensions"] == []
+
+    with pytest.raises(ValueError):
+        SignalingServer(compression="brotli").connection_options()
+
+    # No per-instance dict
+    assert not hasattr(User(None, "1"), "__dict__")
+
+async def run_tls_buffer_check() -> tuple[int, int]:
+    root = os.path.abspath(os.path.dirname(__file__) + "/..")
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(os.path.join(root, "server.crt"), os.path.join(root, "server.key"))
+    client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    client_context.check_hostname = False
+    client_context.verify_mode = ssl.CERT_NONE
+
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0, ssl=server_context,
+                                    process_request=signaling_server.handle_request, **signaling_server.connection_options())
+    try:
+        async with websockets.connect(f"wss://127.0.0.1:{server.sockets[0].getsockname()[1]}", ssl=client_context) as websocket:
+            await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": "Tls"}}))
+            await recv(websocket)
+            connection, = server.connections
+            return connection.transport._ssl_protocol.max_size, websocket.transport._ssl_protocol.max_size
+    finally:
+        server.close()
+        await server.wait_closed()
+
+def test__tls_read_buffer_is_set_per_connection():
+    server_buffer, client_buffer = asyncio.run(run_tls_buffer_check())
+
+    assert server_buffer == signaling_server.tls_read_buffer
+    # asyncio's own default is left alone: other TLS connections of the process keep it
+    assert client_buffer == asyncio.sslproto.SSLProtocol.max_size == 256 * 1024
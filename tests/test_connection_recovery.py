@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+import sys, os
+
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import AudioStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from servers.includes.enums import MessageType
+from includes.AudioBroadcaster import AudioBroadcaster
+from includes.ConnectionMonitor import ConnectionMonitor
+from includes.PeerConnectionManager import PeerConnectionManager
+from includes.SignalingHandler import SignalingHandler
+from includes.classes.clients import LocalClient
+
+logger = logging.getLogger(__name__)
+
+
+class LoopbackBrowser:
+    """
+    Stands in for the WebSocketClient: answers every OFFER with a local aiortc peer which
+    also sends audio, like a browser in a call
+    """
+    def __init__(self):
+        self.handler: SignalingHandler = None
+        self.peers: list[RTCPeerConnection] = []
+
+    async def send_to(self, target, message_type: MessageType, payload: dict):
+        if message_type != MessageType.OFFER:
+            return
+
+        pc = RTCPeerConnection()
+        self.peers.append(pc)
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=payload["sdp"], type="offer"))
+        pc.getTransceivers()[0].sender.replaceTrack(AudioStreamTrack())
+        pc.getTransceivers()[0].direction = "sendrecv"
+        await pc.setLocalDescription(await pc.createAnswer())
+        asyncio.create_task(self.handler.handle_answer({"user": {"id": target.id}, "sdp": pc.localDescription.sdp}))
+
+async def noop(*args):
+    pass
+
+async def lose_connection(local_id: str, handler_options: dict, monitor_options: dict):
+    """
+    Connects a win client to a loopback browser, cuts the browser's packets and waits for the replacement.
+    Returns the seconds from the cut to the new connection being `connected`, None if it never was.
+    """
+    browser = LoopbackBrowser()
+    local_client = LocalClient("win", id=local_id)
+    broadcaster = AudioBroadcaster(logger, AudioStreamTrack())
+    manager = PeerConnectionManager(logger, noop, noop, noop, pool_size=1)
+    handler = browser.handler = SignalingHandler(browser, local_client, manager, logger, **handler_options)
+
+    lost = []
+    def on_lost(remote_user, peer_connection):
+        lost.append(peer_connection)
+        asyncio.create_task(handler.replace_peer({"user": {"id": remote_user.id}, "peer_connection": peer_connection}, broadcaster))
+    monitor = ConnectionMonitor(logger, local_client, on_lost, **monitor_options)
+
+    manager.start_pool(broadcaster)
+    await handler.handle_join({"user": {"id": "browser", "name": "browser"}}, broadcaster)
+    remote_user = local_client.remotePeers["browser"]
+    first_pc = remote_user.peerConnection
+    while first_pc.connectionState != "connected":
+        await asyncio.sleep(0.02)
+
+    monitor.start()
+    await asyncio.sleep(0.5)
+    assert not lost
+
+    # The network path dies: the browser's packets no longer arrive
+    browser.peers[0].getTransceivers()[0].receiver.transport.transport._send = noop
+    cut_at = time.perf_counter()
+    gap = None
+    for _ in range(500):
+        await asyncio.sleep(0.01)
+        if remote_user.peerConnection is not first_pc and remote_user.peerConnection.connectionState == "connected":
+            gap = time.perf_counter() - cut_at
+            break
+
+    result = (lost, first_pc, remote_user, gap, dict(handler.replacement_latencies), handler.get_stats()["replacements"])
+    await monitor.stop()
+    await manager.close_pool()
+    await remote_user.peerConnection.close()
+    for pc in browser.peers:
+        await pc.close()
+    broadcaster.stop()
+    return local_client, result
+
+def test__lost_connection_is_replaced_without_rejoin():
+    # "local" > "browser": the win client waits for the browser to replace it first, which it never does
+    local_client, (lost, first_pc, remote_user, gap, replacement_latencies, replacements) = asyncio.run(
+        lose_connection("local", {"replace_wait": 0.2}, {"interval": 0.05, "silence_timeout": 0.3}))
+
+    assert lost == [first_pc]
+    assert replacements == 1
+    # Same remote user, new connection
+    assert local_client.remotePeers["browser"] is remote_user
+    assert remote_user.peerConnection is not first_pc
+    assert first_pc.connectionState == "closed"
+    assert replacement_latencies["browser"] < 1.0
+
+def test__audio_gap_of_a_replacement_is_under_a_second():
+    # Default timings, "a-local" < "browser": the win client replaces at once. The gap is the
+    # detection (at most 0.7 s after the last packet) plus the new connection's setup
+    local_client, (lost, first_pc, remote_user, gap, replacement_latencies, replacements) = asyncio.run(
+        lose_connection("a-local", {}, {}))
+
+    assert lost == [first_pc]
+    assert gap is not None and gap < 1.0, gap
@@ -0,0 +1,58 @@
+import asyncio
+import sys, os
+
+import pytest
+import websockets
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from benchmarks.bench_e2e_latency import CustomAudioTrack, MarkerBackend, SignalingClient, create_client, get_ssl_context, logger, match_markers, measure
+from servers.signaling_main import signaling_server
+
+
+def test__markers_are_matched_to_the_latest_earlier_capture():
+    latencies, unmatched = match_markers([1.0, 1.5, 2.0], [1.12, 1.61, 1.7, 3.0], interval=0.5)
+
+    assert [round(latency, 2) for latency in latencies] == [0.12, 0.11, 0.2]
+    assert unmatched == 1
+
+def test__two_win_clients_over_loopback():
+    result = asyncio.run(measure(seconds=4))
+
+    # Both peers only exchange SDP: the offer/answer must carry the candidates
+    assert result["setup"]["connected_ms"] is not None and result["setup"]["connected_ms"] < 2000
+    assert result["markers_detected"] >= result["markers_sent"] - 2 > 0
+    assert result["unmatched_detections"] == 0
+    # Capture ring + encoder + RTP jitter buffer + 60 ms mixer jitter buffer, on an idle machine ~160 ms
+    assert result["latency"]["p50_ms"] < 400
+
+async def run_dropped_connection() -> SignalingClient:
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0, ssl=get_ssl_context())
+    url = f"wss://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    client = create_client("dropped", url, CustomAudioTrack(logger, "music", backend=MarkerBackend(logger, amplitude=0)))
+    task = asyncio.create_task(client.run())
+    try:
+        for _ in range(500):
+            if client.connection_monitor._task is not None:
+                break
+            await asyncio.sleep(0.01)
+        for user in list(signaling_server.connected_clients.values()):
+            if user.name == "dropped":
+                user.websocket.transport.abort()
+
+        with pytest.raises(websockets.exceptions.ConnectionClosedError):
+            await asyncio.wait_for(task, 5)
+    finally:
+        client.audio_broadcaster.stop()
+        client.audio_track.stop()
+        server.close()
+        await server.wait_closed()
+    return client
+
+def test__dropped_signaling_connection_stops_the_background_tasks():
+    client = asyncio.run(run_dropped_connection())
+
+    assert client.connection_monitor._task is None
+    assert client.dispatcher.workers == {}
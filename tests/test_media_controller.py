@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import sys, os
+
+import pytest
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.MediaController import MediaController
+from includes.media_backends import FakeMediaBackend, MediaSessionBackend, WinsdkMediaBackend
+from includes.enums.MediaAction import MediaAction
+
+logger = logging.getLogger(__name__)
+
+
+async def collect_updates(backend: FakeMediaBackend, changes: list[dict], **kwargs) -> list[dict]:
+    controller = MediaController(logger, backend)
+    await controller.initialize()
+
+    updates = []
+    task = asyncio.create_task(controller.on_np_update(updates.append, **kwargs))
+    await asyncio.sleep(0.05)
+
+    for change in changes:
+        backend.set_now_playing(change)
+    await asyncio.sleep(0.3)
+
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return updates
+
+def test__event_driven_updates_are_coalesced():
+    backend = FakeMediaBackend(logger, {"title": "A"})
+    burst = [{"title": "B"}, {"title": "B", "artist": "X"}, {"title": "C", "artist": "X"}]
+
+    updates = asyncio.run(collect_updates(backend, burst, coalesce_delay=0.05))
+
+    assert updates == [{"title": "C", "artist": "X"}]
+    # initial fetch + one fetch for the whole burst, no busy polling
+    assert backend.properties_requests == 2
+
+def test__polling_fallback_backs_off():
+    backend = FakeMediaBackend(logger, {"title": "A"}, supports_events=False)
+
+    updates = asyncio.run(collect_updates(backend, [{"title": "B"}], min_poll_interval=0.02, max_poll_interval=0.2))
+
+    assert updates == [{"title": "B"}]
+    assert backend.properties_requests < 15
+
+def test__actions_go_to_backend():
+    backend = FakeMediaBackend(logger, {"title": "A"})
+    controller = MediaController(logger, backend)
+
+    async def run():
+        await controller.play()
+        await controller.next_track()
+        return await controller._perform_action_async(MediaAction.NOW_PLAYING)
+
+    assert asyncio.run(run()) == {"title": "A"}
+    assert backend.actions == ["play", "next"]
+
+def test__backends_implement_the_whole_session_interface():
+    with pytest.raises(TypeError):
+        MediaSessionBackend(logger)
+
+    # A WinRT notification which arrives after unsubscribe is ignored
+    backend = WinsdkMediaBackend(logger)
+    backend.unsubscribe()
+    backend._notify(None, None)
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+import sys, os
+
+from aiortc.mediastreams import AudioStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.AudioBroadcaster import AudioBroadcaster
+from includes.PeerConnectionManager import PeerConnectionManager
+from includes.classes.clients import RemoteClient
+
+logger = logging.getLogger(__name__)
+
+
+async def noop(*args):
+    pass
+
+def test__pool_is_pre_gathered_and_refilled():
+    async def run():
+        broadcaster = AudioBroadcaster(logger, AudioStreamTrack())
+        manager = PeerConnectionManager(logger, noop, noop, noop, pool_size=2)
+        manager.start_pool(broadcaster)
+        await manager._refill_task
+
+        pooled = manager.pool[0]
+        gatherer = pooled.pc.getTransceivers()[0].sender.transport.transport.iceGatherer
+        assert gatherer.state == "completed"
+        # Idle pool entries don't make the broadcaster capture
+        assert not broadcaster.subscribers and len(broadcaster.idle_subscribers) == 2
+
+        pc, data_channel = await manager.create_pc(RemoteClient(name="peer", id=1), broadcaster)
+        assert pc is pooled.pc and data_channel is pooled.data_channel
+        assert pooled.audio_track in broadcaster.subscribers
+
+        await manager._refill_task
+        assert len(manager.pool) == 2
+
+        await manager.close_pool()
+        await pc.close()
+        broadcaster.stop()
+        return broadcaster
+
+    broadcaster = asyncio.run(run())
+    assert not broadcaster.idle_subscribers
+
+def test__pool_entries_are_replaced_before_they_go_stale():
+    async def run():
+        broadcaster = AudioBroadcaster(logger, AudioStreamTrack())
+        manager = PeerConnectionManager(logger, noop, noop, noop, pool_size=2, pool_max_age=0.8)
+        manager.start_pool(broadcaster)
+        await manager._refill_task
+        first = list(manager.pool)
+
+        await asyncio.sleep(1.0)
+        await manager._refill_task
+        replaced = list(manager.pool)
+
+        await manager.close_pool()
+        broadcaster.stop()
+        return first, replaced
+
+    first, replaced = asyncio.run(run())
+    assert len(replaced) == 2
+    assert not set(map(id, first)) & set(map(id, replaced))
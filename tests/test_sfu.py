@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import sys, os
+
+from aiortc import RTCPeerConnection
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from benchmarks.bench_e2e_latency import measure
+from servers import signaling_main
+from servers.includes.enums import MessageType
+from servers.includes.models import User
+from servers.sfu import Publication, SelectiveForwardingUnit
+
+logger = logging.getLogger(__name__)
+
+
+def test__sender_uploads_once_through_the_sfu():
+    result = asyncio.run(measure(seconds=4, listeners=2, sfu=True))
+
+    assert signaling_main.sfu is None
+    assert result["sender"]["audio_uploads"] == 1
+    # Every client publishes to the two others, each publication is encoded once for both
+    assert result["sfu"]["publications"] == 3
+    assert result["sfu"]["subscriptions"] == 6
+    assert result["sfu"]["encoders"] == 3
+    assert result["sfu"]["frames_encoded"] > 0
+    assert result["setup"]["connected_ms"] is not None
+    # Every listener gets the audio: one marker per listener
+    assert result["markers_detected"] >= result["markers_sent"] - 4 > 0
+    assert result["unmatched_detections"] == 0
+
+def test__mesh_uploads_once_per_listener():
+    result = asyncio.run(measure(seconds=3, listeners=2))
+
+    assert result["sender"]["audio_uploads"] == 2
+    assert result["markers_detected"] > 0
+
+def test__offer_to_a_closed_publication_is_ignored():
+    sent = []
+
+    async def send(user, message):
+        sent.append(message)
+
+    async def run():
+        sfu = SelectiveForwardingUnit(send, logger)
+        publisher, subscriber = User(None, "1", "publisher"), User(None, "2", "subscriber")
+        sfu.publications[publisher.id] = Publication(publisher, RTCPeerConnection())
+        target = sfu.get_user("sfu:1")
+
+        # The publisher leaves while the subscriber's OFFER is on its way
+        await sfu.unpublish(publisher.id)
+        await sfu.handle_rtc(subscriber, target, MessageType.OFFER, {"sdp": ""})
+
+    asyncio.run(run())
+
+    assert sent == []
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import sys, os
+
+import pytest
+from aiortc import RTCPeerConnection
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from servers.includes.enums import MessageType
+from includes.PeerConnectionManager import PeerConnectionManager
+from includes.PeerMessageDispatcher import PeerMessageDispatcher
+from includes.SignalingHandler import SignalingHandler
+from includes.classes.clients import LocalClient
+from includes.ice_candidates import parse_candidate
+
+logger = logging.getLogger(__name__)
+
+
+def test__dispatch_is_ordered_per_peer_and_concurrent_across_peers():
+    handled = []
+
+    async def handle(message_type: MessageType, payload: dict):
+        if message_type == MessageType.OFFER and payload["user"]["id"] == "slow":
+            await asyncio.sleep(0.2)
+        handled.append((payload["user"]["id"], message_type))
+
+    async def run():
+        dispatcher = PeerMessageDispatcher(logger, handle, idle_timeout=0.05)
+        dispatcher.dispatch(MessageType.OFFER, {"user": {"id": "slow"}})
+        dispatcher.dispatch(MessageType.CANDIDATE, {"user": {"id": "slow"}})
+        dispatcher.dispatch(MessageType.JOIN, {"user": {"id": "fast"}})
+        dispatcher.dispatch(MessageType.CANDIDATE, {"user": {"id": "fast"}})
+
+        await asyncio.sleep(0.1)
+        # The slow OFFER does not hold back the other peer
+        assert handled == [("fast", MessageType.JOIN), ("fast", MessageType.CANDIDATE)]
+
+        await asyncio.sleep(0.3)
+        # Idle workers are gone
+        assert not dispatcher.workers
+        await dispatcher.close()
+
+    asyncio.run(run())
+
+    assert handled[2:] == [("slow", MessageType.OFFER), ("slow", MessageType.CANDIDATE)]
+
+
+def test__parse_candidate_reads_every_attribute():
+    rtc_candidate = parse_candidate(
+        "candidate:842163049 2 UDP 1677729535 203.0.113.7 61665 typ srflx raddr 192.168.1.10 rport 61665 "
+        "generation 0 ufrag EsAw network-cost 999",
+        sdpMid="0",
+        sdpMLineIndex=0,
+    )
+
+    assert rtc_candidate.foundation == "842163049"
+    assert rtc_candidate.component == 2
+    assert rtc_candidate.protocol == "udp"
+    assert rtc_candidate.priority == 1677729535
+    assert (rtc_candidate.ip, rtc_candidate.port) == ("203.0.113.7", 61665)
+    assert rtc_candidate.type == "srflx"
+    assert (rtc_candidate.relatedAddress, rtc_candidate.relatedPort) == ("192.168.1.10", 61665)
+    assert rtc_candidate.sdpMid == "0"
+
+    tcp_candidate = parse_candidate("candidate:1 1 tcp 1518280447 192.168.1.10 9 typ host tcptype active")
+    assert tcp_candidate.tcpType == "active"
+
+    assert parse_candidate("") is None
+    with pytest.raises(ValueError):
+        parse_candidate("candidate:1 1 udp 2122260223 192.168.1.10")
+
+
+def test__candidates_for_unknown_peer_are_kept_until_it_exists():
+    candidate = {"candidate": "candidate:1 1 udp 2122260223 192.168.1.10 50000 typ host", "sdpMid": "0", "sdpMLineIndex": 0}
+
+    async def run():
+        handler = SignalingHandler(None, LocalClient(name="local"), None, logger, max_pending_candidates=2)
+        for _ in range(3):
+            await handler.handle_candidate({"user": {"id": "late"}, "candidate": candidate})
+        await handler.handle_candidate({"user": {"id": "late"}, "candidate": {"candidate": "garbage"}})
+        return handler
+
+    handler = asyncio.run(run())
+
+    assert len(handler.pending_candidates["late"]) == 2
+    stats = handler.get_stats()
+    assert stats["candidates_parsed"] == 3
+    assert stats["candidates_invalid"] == 1
+    assert stats["candidates_buffered"] == 3
+    assert stats["candidates_dropped"] == 1
+    assert stats["candidates_pending"] == 2
+
+def test__candidates_of_an_earlier_negotiation_expire():
+    candidate = {"candidate": "candidate:1 1 udp 2122260223 192.168.1.10 50000 typ host", "sdpMid": "0", "sdpMLineIndex": 0}
+
+    async def run():
+        handler = SignalingHandler(None, LocalClient(name="local"), None, logger, pending_candidates_max_age=0.05)
+        await handler.handle_candidate({"user": {"id": "old"}, "candidate": candidate})
+        await handler.handle_candidate({"user": {"id": "gone"}, "candidate": candidate})
+        await asyncio.sleep(0.1)
+        await handler.handle_candidate({"user": {"id": "new"}, "candidate": candidate})
+        return handler
+
+    handler = asyncio.run(run())
+
+    # Expired when the next candidate is buffered, or when the connection is created
+    assert list(handler.pending_candidates) == ["new"]
+    assert handler.take_pending_candidates("new") and handler.take_pending_candidates("old") == []
+    assert handler.get_stats()["candidates_dropped"] == 2
+
+class RecordingSignaling:
+    def __init__(self):
+        self.sent = []
+
+    async def send_to(self, target, message_type: MessageType, payload: dict):
+        self.sent.append((target.id, message_type))
+
+async def noop(*args):
+    pass
+
+def test__only_the_lower_id_replaces_a_lost_connection():
+    async def run():
+        results = {}
+        for local_id in ("a", "c"):
+            signaling = RecordingSignaling()
+            manager = PeerConnectionManager(logger, noop, noop, noop)
+            handler = SignalingHandler(signaling, LocalClient(name="local", id=local_id), manager, logger, replace_wait=0.1)
+            await handler.handle_join({"user": {"id": "b", "name": "remote"}}, None)
+            remote_user = handler.current_client.remotePeers["b"]
+            signaling.sent.clear()
+
+            # Both ends lost the connection: "a" offers at once, "c" waits for the OFFER of "b"
+            await handler.replace_peer({"user": {"id": "b"}, "peer_connection": remote_user.peerConnection}, None)
+            offered_at_once = bool(signaling.sent)
+
+            # An OFFER crossing ours loses when our id is lower
+            remote = RTCPeerConnection()
+            remote.createDataChannel("chat")
+            await remote.setLocalDescription(await remote.createOffer())
+            pc_before = remote_user.peerConnection
+            await handler.handle_offer({"user": {"id": "b", "name": "remote"}, "sdp": remote.localDescription.sdp}, None)
+            kept_ours = handler.current_client.remotePeers["b"].peerConnection is pc_before
+
+            await asyncio.sleep(0.2)
+            results[local_id] = (offered_at_once, kept_ours, signaling.sent, handler.replacements)
+            await remote.close()
+            for peer in handler.current_client.remotePeers.values():
+                await peer.peerConnection.close()
+        return results
+
+    results = asyncio.run(run())
+
+    assert results["a"] == (True, True, [("b", MessageType.OFFER)], 1)
+    # The remote OFFER replaced the connection, the deferred replacement was dropped
+    assert results["c"] == (False, False, [("b", MessageType.ANSWER)], 0)
+
+def test__a_lost_sfu_subscription_is_replaced():
+    async def sfu_offer(sfu_pc: RTCPeerConnection) -> dict:
+        sfu_pc.createDataChannel("chat")
+        await sfu_pc.setLocalDescription(await sfu_pc.createOffer())
+        return {"user": {"id": "sfu:7", "name": "publisher (SFU)"}, "sdp": sfu_pc.localDescription.sdp}
+
+    async def run():
+        signaling = RecordingSignaling()
+        manager = PeerConnectionManager(logger, noop, noop, noop)
+        handler = SignalingHandler(signaling, LocalClient(name="local", id="140000000000001"), manager, logger, replace_wait=0.1)
+        handler.sfu_id = "sfu"
+        first, second = RTCPeerConnection(), RTCPeerConnection()
+
+        await handler.handle_offer(await sfu_offer(first), None)
+        subscription = handler.current_client.remotePeers["sfu:7"]
+        lost_pc = subscription.peerConnection
+        signaling.sent.clear()
+
+        # The client replaces at once, the SFU answers that OFFER with a fresh subscription OFFER
+        await handler.replace_peer({"user": {"id": "sfu:7"}, "peer_connection": lost_pc}, None)
+        await handler.handle_offer(await sfu_offer(second), None)
+
+        current = handler.current_client.remotePeers["sfu:7"].peerConnection
+        result = (handler.replaces_first(subscription), list(signaling.sent), current is not lost_pc, current.signalingState)
+        for pc in (first, second, current):
+            await pc.close()
+        return result
+
+    replaces_first, sent, replaced, signaling_state = asyncio.run(run())
+
+    assert replaces_first
+    assert sent == [("sfu:7", MessageType.OFFER), ("sfu:7", MessageType.ANSWER)]
+    assert replaced and signaling_state == "stable"
@@ -0,0 +1,28 @@
+import ssl
+import subprocess
+import sys, os
+import tempfile
+
+# Adding root reference
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from cert import load_or_create
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + "/..")
+
+
+def test__importing_the_config_does_not_load_the_cert():
+    code = "import sys, config; assert 'cryptography' not in sys.modules and 'cert' not in sys.modules; print(config.SSL_CONTEXT is config.get_ssl_context())"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    # Loaded once, on first use
+    assert result.stdout.strip() == "True"
+
+def test__missing_cert_is_generated():
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = os.path.join(directory, "server.crt"), os.path.join(directory, "server.key")
+        context = load_or_create(keyfile=keyfile, certfile=certfile)
+
+        assert isinstance(context, ssl.SSLContext)
+        assert os.path.exists(certfile) and os.path.exists(keyfile)
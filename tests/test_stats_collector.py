@@ -0,0 +1,76 @@
+import asyncio
+import json
+import logging
+import sys, os
+
+from aiortc import RTCPeerConnection
+from aiortc.mediastreams import AudioStreamTrack
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.StatsCollector import PeerSeries, StatsCollector, SERIES_FIELDS
+from includes.classes.clients import LocalClient, RemoteClient
+from helpers import negotiate
+
+logger = logging.getLogger(__name__)
+
+
+def test__collects_ring_buffered_series_and_serves_them(tmp_path):
+    async def run():
+        local_client = LocalClient(name="local")
+        sender, receiver = RTCPeerConnection(), RTCPeerConnection()
+        sender.addTrack(AudioStreamTrack())
+        await negotiate(sender, receiver)
+        local_client.remotePeers["peer"] = RemoteClient(name="browser", id="peer", peerConnection=sender)
+
+        export_path = str(tmp_path / "stats.jsonl")
+        collector = StatsCollector(logger, local_client, interval=0.05, history=3, http_port=0, export_path=export_path)
+        await collector.start()
+        for _ in range(20):
+            await asyncio.sleep(0.05)
+            if collector.polls >= 5:
+                break
+
+        port = collector._server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+
+        # Peers which left are forgotten
+        del local_client.remotePeers["peer"]
+        await collector.collect()
+        remaining = dict(collector.series)
+
+        await collector.stop()
+        await sender.close()
+        await receiver.close()
+        with open(export_path) as file:
+            lines = [json.loads(line) for line in file]
+        return response, remaining, lines
+
+    response, remaining, lines = asyncio.run(run())
+
+    head, body = response.split(b"\r\n\r\n", 1)
+    assert head.startswith(b"HTTP/1.1 200")
+    series = json.loads(body)["peers"]["peer"]
+    assert series["name"] == "browser"
+    assert len(series["samples"]) == 3
+    packets_sent = [sample[SERIES_FIELDS.index("packets_sent")] for sample in series["samples"]]
+    assert packets_sent == sorted(packets_sent) and packets_sent[-1] > 0
+
+    assert not remaining
+    assert lines and lines[-1]["peer"] == "peer"
+
+def test__send_rate_restarts_when_the_byte_counter_resets():
+    summary = {"rtt": None, "remote_jitter": None, "fraction_lost": None, "packets_sent": 0, "packets_received": 0}
+    series = PeerSeries("remote", history=10)
+    series.add(0.0, {**summary, "bytes_sent": 100_000})
+    series.add(1.0, {**summary, "bytes_sent": 200_000})
+    series.add(2.0, {**summary, "bytes_sent": 1_000})
+    series.add(3.0, {**summary, "bytes_sent": 11_000})
+
+    send_kbps = [sample[SERIES_FIELDS.index("send_kbps")] for sample in series.samples]
+    assert send_kbps == [0.0, 800.0, 0.0, 80.0]
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import logging
+import sys, os
+
+import websockets
+
+# Adding root and win_client references
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/../win_client"))
+
+from includes.SignalingTracer import SignalingTracer
+from servers.includes.tracing import add_hop
+from servers.signaling_main import signaling_server
+from helpers import recv
+
+logger = logging.getLogger(__name__)
+
+
+def hop_names(trace: dict) -> list[str]:
+    return [hop[0] for hop in trace["hops"]]
+
+def test__negotiation_span_has_every_hop(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    caller, callee = SignalingTracer(logger), SignalingTracer(logger, str(path))
+
+    join = {"type": "JOIN", "payload": {}}
+    caller.outgoing(join)
+    join["trace"] = add_hop(join["trace"], "JOIN server_send")
+    join["payload"]["user"] = {"id": "caller"}
+    callee.incoming(join)
+
+    offer = {"type": "OFFER", "payload": {"user": {"id": "callee"}}}
+    callee.outgoing(offer, peer_id="caller")
+    assert offer["trace"]["id"] == join["trace"]["id"]
+    assert hop_names(offer["trace"]) == ["JOIN client_send", "JOIN server_send", "JOIN client_recv", "OFFER client_send"]
+
+    # Untraced messages are left alone
+    candidate = {"type": "CANDIDATE", "payload": {}}
+    callee.outgoing(candidate, peer_id="caller")
+    assert "trace" not in candidate
+
+    callee.connected("caller")
+    assert callee.traces == {}
+    span = callee.spans[0]
+    assert span["trace_id"] == join["trace"]["id"]
+    assert [segment["name"] for segment in span["segments"]][-1] == "OFFER client_send -> connected"
+    assert json.loads(path.read_text()) == span
+
+async def run_relay_checks():
+    server = await websockets.serve(signaling_server.signaling_handler, "127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+
+    async def connect(name):
+        websocket = await websockets.connect(url)
+        await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": name}}))
+        return websocket, json.loads(await recv(websocket))["payload"]["user"]["id"]
+
+    try:
+        (caller, _), (callee, callee_id) = await connect("caller"), await connect("callee")
+        async with caller, callee:
+            trace = add_hop({"id": "abc", "hops": []}, "OFFER client_send")
+            await caller.send(json.dumps({"type": "OFFER", "target": {"id": callee_id}, "payload": {"sdp": "v=0"}, "trace": trace}))
+            offer = json.loads(await recv(callee))
+            await caller.send(json.dumps({"type": "OFFER", "target": {"id": callee_id}, "payload": {"sdp": "v=0"}}))
+            untraced = json.loads(await recv(callee))
+    finally:
+        server.close()
+        await server.wait_closed()
+    return offer, untraced
+
+def test__server_appends_its_hops_to_relayed_messages():
+    offer, untraced = asyncio.run(run_relay_checks())
+
+    assert offer["trace"]["id"] == "abc"
+    assert hop_names(offer["trace"]) == ["OFFER client_send", "OFFER server_recv", "OFFER server_send"]
+    assert offer["trace"]["hops"][0][1] <= offer["trace"]["hops"][1][1] <= offer["trace"]["hops"][2][1]
+    assert "trace" not in untraced
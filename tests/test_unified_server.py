@@ -0,0 +1,62 @@
+import asyncio
+import json
+import ssl
+import sys, os
+import urllib.request
+
+import websockets
+
+# Adding root reference
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__) + "/.."))
+
+from config import SSL_CONTEXT, SIGNALING_PATH
+from servers.web import UnifiedWebHandler
+from servers.signaling_main import signaling_server
+from helpers import recv
+
+
+def client_ssl_context():
+    ssl_context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+def http_get(url):
+    with urllib.request.urlopen(url, context=client_ssl_context()) as response:
+        return response.status, response.headers["Content-Type"], response.read()
+
+async def run_unified_checks():
+    base_dir = os.path.join(os.path.dirname(__file__), "..", "web")
+    server = await websockets.serve(
+        signaling_server.signaling_handler, "127.0.0.1", 0,
+        ssl=SSL_CONTEXT, process_request=UnifiedWebHandler(os.path.abspath(base_dir)),
+    )
+    port = server.sockets[0].getsockname()[1]
+
+    try:
+        status, content_type, body = await asyncio.to_thread(http_get, f"https://127.0.0.1:{port}/")
+        assert status == 200 and content_type == "text/html"
+        assert b"window.APP_CONFIG" in body
+
+        status, content_type, body = await asyncio.to_thread(http_get, f"https://127.0.0.1:{port}/client.js")
+        assert status == 200 and "javascript" in content_type
+
+        # Same port, signaling path
+        async with websockets.connect(f"wss://127.0.0.1:{port}{SIGNALING_PATH}", ssl=client_ssl_context()) as websocket:
+            await websocket.send(json.dumps({"type": "CONFIRM_ID", "payload": {"name": "Unified"}}))
+            response = json.loads(await recv(websocket))
+            assert response["type"] == "CONFIRM_ID"
+            assert response["payload"]["user"]["name"] == "Unified"
+    finally:
+        server.close()
+        await server.wait_closed()
+
+def test__unified_server():
+    asyncio.run(run_unified_checks())
+
+def test__static_path_traversal():
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "web"))
+    from servers.web import load_static_file
+
+    assert load_static_file(base_dir, "/index.html") is not None
+    assert load_static_file(base_dir, "/../config.py") is None
@@ -60,31 +60,39 @@ submitNameButton.addEventListener('click', () => {
     }
 });
 
+/**
+ * Config is inlined into the page by the web server (window.APP_CONFIG).
+ * `/config` is only requested when the page was served without it.
+ */
+async function loadConfig() {
+    if (window.APP_CONFIG) {
+        console.debug(`[DEBUG] Using inlined config:`, window.APP_CONFIG);
+        return window.APP_CONFIG;
+    }
+
+    const response = await fetch('/config');
+    if (!response.ok) {
+        throw new Error("Failed to load config");
+    }
+    const config = await response.json();
+    console.debug(`[DEBUG] Loaded config:`, config);
+    return config;
+}
+
 serverConnectButton.addEventListener('click', async () => {
     console.debug('[DEBUG] Loading WebSocket host...');
 
-    fetch('/config')
-        .then(response => {
-            if (!response.ok) {
-                throw new Error("Failed to load config");
-            }
-            response = response.json();
-            console.debug(`[DEBUG] Loaded config:`, response);
-            return response;
-        })
-        .then(async config => {
-            const websocketHost = config.websocket_host;
-            console.info(`[INFO] WebSocket Host: `, websocketHost);
-            
-            app = new AppManager(websocketHost);
-            await app.start();
-
-            sendButton.addEventListener("click", () => {
-                const message = chatInput.value.trim();
-                if (message) {
-                    app.broadcastMessageToChannel(message)
-                }
-            });
-        })
+    const config = await loadConfig();
+    const websocketHost = config.websocket_host;
+    console.info(`[INFO] WebSocket Host: `, websocketHost);
+
+    app = new AppManager(websocketHost);
+    await app.start();
 
+    sendButton.addEventListener("click", () => {
+        const message = chatInput.value.trim();
+        if (message) {
+            app.broadcastMessageToChannel(message)
+        }
+    });
 })
\ No newline at end of file
@@ -103,7 +103,13 @@ class AppManager {
             }
         
             this.logger.log("Before creating conn", remoteUser);
-        
+
+            // A new OFFER from a known user replaces its connection (e.g. restarted after a network change)
+            if (remoteUser.peerConnection) {
+                remoteUser.peerConnection.close();
+                remoteUser.pendingCandidates = [];
+            }
+
             // Create PeerConnection for remoteUser
             this.createPeerConnection(remoteUser);
         
@@ -241,19 +247,34 @@ class AppManager {
         };
     
         dataChannel.onmessage = (event) => {
-            let message = event.data;
-
-            message = message.replace(/\\u[\dA-F]{4}/gi, (match) => {
-                return String.fromCharCode(parseInt(match.replace("\\u", ""), 16));
-            });
+            // Several messages may arrive in one frame: {"batch": [...]}
+            for (let message of this.unpackChannelFrame(event.data)) {
+                message = message.replace(/\\u[\dA-F]{4}/gi, (match) => {
+                    return String.fromCharCode(parseInt(match.replace("\\u", ""), 16));
+                });
 
-            this.logger.info(`[AppManager] Message received from ${remoteUser.name}: ${message}`);
-            this.displayMessage(remoteUser, message);
+                this.logger.info(`[AppManager] Message received from ${remoteUser.name}: ${message}`);
+                this.displayMessage(remoteUser, message);
+            }
         };
     
         remoteUser.dataChannel = dataChannel;
     }
 
+    unpackChannelFrame(data) {
+        if (!data.startsWith('{"batch"')) {
+            return [data];
+        }
+
+        try {
+            return JSON.parse(data).batch.map(
+                (item) => typeof item === "string" ? item : JSON.stringify(item)
+            );
+        } catch (error) {
+            return [data];
+        }
+    }
+
     broadcastMessageToChannel(message) {
         for (const remoteUserId of app.remotePeers.keys()) {
             app.sendMessage(remoteUserId, message);
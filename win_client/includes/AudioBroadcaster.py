@@ -0,0 +1,251 @@
+import asyncio
+import logging
+
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCRtpCodecParameters
+from aiortc.mediastreams import MediaStreamError
+from aiortc.sdp import SessionDescription
+
+from servers.includes.opus import OPUS_SAMPLE_RATE, EncoderProfile, ENCODER_PROFILES, VOICE_ENCODER_PROFILES, SharedOpusEncoder
+from includes.classes.BetterLog import BetterLog
+from includes.classes.VoiceActivityDetector import DtxGate, is_silent
+
+
+def codec_key(codec: RTCRtpCodecParameters) -> tuple:
+    """
+    Senders with equal keys can share encoded packets
+    """
+    return (codec.mimeType.lower(), codec.clockRate, codec.channels, tuple(sorted(codec.parameters.items())))
+
+def negotiated_codec(peer_connection: RTCPeerConnection, track: MediaStreamTrack) -> RTCRtpCodecParameters:
+    """
+    Codec the sender of `track` uses: the first codec of its m-section in the answer.
+
+    :returns: None if the connection is not negotiated yet
+    """
+    transceiver = next((t for t in peer_connection.getTransceivers() if t.sender.track is track), None)
+    local, remote = peer_connection.localDescription, peer_connection.remoteDescription
+    if transceiver is None or local is None or remote is None:
+        return None
+
+    answer = local if local.type == "answer" else remote
+    for media in SessionDescription.parse(answer.sdp).media:
+        if media.rtp.muxId == transceiver.mid and media.rtp.codecs:
+            return media.rtp.codecs[0]
+    return None
+
+
+class EncoderGroup:
+    def __init__(self, key: tuple, profile: EncoderProfile):
+        self.key = key
+        self.profile = profile
+        self.encoder = SharedOpusEncoder(profile)
+        self.dtx = DtxGate()
+        self.subscribers: set["BroadcastSubscriberTrack"] = set()
+        self.frames_encoded = 0
+
+
+class BroadcastSubscriberTrack(MediaStreamTrack):
+    """
+    Per-peer view of an `AudioBroadcaster` source.
+
+    Frames (or shared encoded packets) wait in a bounded queue. When the peer is too slow
+    the oldest item is dropped, so a single slow sender never stalls the others.
+    """
+    kind = "audio"
+
+    def __init__(self, broadcaster: "AudioBroadcaster", max_queue: int, peer_connection: RTCPeerConnection = None, codec: RTCRtpCodecParameters = None):
+        super().__init__()
+        self.broadcaster = broadcaster
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped_frames = 0
+
+        self.peer_connection = peer_connection
+        self.codec = codec
+        self.profile = broadcaster.default_profile
+        self.group: EncoderGroup = None
+        self._resolved = False
+
+    def put(self, item):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped_frames += 1
+        self.queue.put_nowait(item)
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        if not self._resolved:
+            # The sender only starts pulling once the connection is negotiated
+            self._resolved = True
+            if self.codec is None and self.peer_connection is not None:
+                self.codec = negotiated_codec(self.peer_connection, self)
+            self.broadcaster.assign_group(self)
+
+        item = await self.queue.get()
+        if item is None:
+            # Source has ended
+            self.stop()
+            raise MediaStreamError
+        return item
+
+    def stop(self):
+        super().stop()
+        self.broadcaster.unsubscribe(self)
+
+
+class AudioBroadcaster(BetterLog):
+    """
+    Capture-once fan-out of one source track to every peer connection.
+
+    A single pump task calls `source.recv()` and hands the frame to all subscribers.
+    The pump only runs while somebody is subscribed.
+
+    With `encode_once`, subscribers whose peers negotiated the same Opus parameters share
+    one encoder: every frame is encoded once per group and the packets are passed to the
+    senders, which only packetize them. Other codecs still get raw frames.
+    Frames the source marked silent (voice activity detection) are not encoded for these
+    groups, apart from a keepalive frame every 400 ms (DTX).
+    """
+    def __init__(self, logger: logging.Logger, source: MediaStreamTrack, max_queue=5, encode_once=False, default_profile: EncoderProfile = ENCODER_PROFILES[0]):
+        super().__init__(logger)
+
+        self.source = source
+        self.max_queue = max_queue
+        self.encode_once = encode_once
+        self.default_profile = default_profile
+
+        self.subscribers: set[BroadcastSubscriberTrack] = set()
+        self.raw_subscribers: set[BroadcastSubscriberTrack] = set()
+        self.idle_subscribers: set[BroadcastSubscriberTrack] = set()
+        """ Created ahead of time (pre-warmed connections), not fed until activated"""
+        self.groups: dict[tuple, EncoderGroup] = {}
+        self._pump_task: asyncio.Task = None
+
+    def subscribe(self, peer_connection: RTCPeerConnection = None, codec: RTCRtpCodecParameters = None, active=True) -> BroadcastSubscriberTrack:
+        """
+        :param peer_connection: the connection this track is added to. Used to find the negotiated codec
+        :param codec: explicit codec, skips the negotiation lookup
+        :param active: False keeps the track idle (and the source not captured for it) until `activate`
+        :returns: a new track to be added to ONE peer connection
+        """
+        track = BroadcastSubscriberTrack(self, self.max_queue, peer_connection, codec)
+        if active:
+            self.activate(track)
+        else:
+            self.idle_subscribers.add(track)
+        return track
+
+    def activate(self, track: BroadcastSubscriberTrack):
+        self.idle_subscribers.discard(track)
+        if track in self.subscribers:
+            return
+
+        self.subscribers.add(track)
+        self.raw_subscribers.add(track)
+        self.log_debug(f"Subscriber added. Total: {len(self.subscribers)}")
+
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+    def assign_group(self, track: BroadcastSubscriberTrack):
+        """
+        Move a subscriber to the shared encoder of its codec and profile (encode-once mode, Opus only)
+        """
+        codec = track.codec
+        if not self.encode_once or codec is None or track not in self.subscribers:
+            return
+        if codec.mimeType.lower() != "audio/opus" or codec.clockRate != OPUS_SAMPLE_RATE:
+            return
+
+        key = codec_key(codec) + (track.profile.name,)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = EncoderGroup(key, track.profile)
+            self.log_debug(f"New encoder group: {key}")
+
+        if track.group is None:
+            # Raw frames already queued would be encoded by the sender itself with a different timeline
+            while not track.queue.empty():
+                track.queue.get_nowait()
+        else:
+            # Packets already queued stay valid: both encoders share the source timeline
+            self._leave_group(track)
+
+        self.raw_subscribers.discard(track)
+        group.subscribers.add(track)
+        track.group = group
+
+    def set_profile(self, track: BroadcastSubscriberTrack, profile: EncoderProfile) -> bool:
+        """
+        Switch the encoder settings of one subscriber.
+
+        :returns: False if the track does not use a shared encoder (its sender encodes by itself)
+        """
+        track.profile = profile
+        if track.group is None:
+            return False
+        if track.group.profile != profile:
+            self.assign_group(track)
+        return True
+
+    def _leave_group(self, track: BroadcastSubscriberTrack):
+        track.group.subscribers.discard(track)
+        if not track.group.subscribers:
+            self.groups.pop(track.group.key, None)
+        track.group = None
+
+    def unsubscribe(self, track: BroadcastSubscriberTrack):
+        self.idle_subscribers.discard(track)
+        if track not in self.subscribers:
+            return
+
+        self.subscribers.discard(track)
+        self.raw_subscribers.discard(track)
+        if track.group is not None:
+            self._leave_group(track)
+        self.log_debug(f"Subscriber removed. Total: {len(self.subscribers)}")
+
+        if not self.subscribers and self._pump_task is not None:
+            self._pump_task.cancel()
+            self._pump_task = None
+
+    async def _pump(self):
+        loop = asyncio.get_running_loop()
+
+        while self.subscribers:
+            try:
+                frame = await self.source.recv()
+            except MediaStreamError:
+                self.log_warn("Source track has ended")
+                for track in list(self.subscribers):
+                    track.put(None)
+                return
+
+            for track in list(self.raw_subscribers):
+                track.put(frame)
+
+            silent = is_silent(frame)
+            for group in list(self.groups.values()):
+                if not group.dtx.should_send(silent):
+                    # Silence: nothing is encoded or sent, but the occasional keepalive frame
+                    continue
+                packets = await loop.run_in_executor(None, group.encoder.encode, frame)
+                group.frames_encoded += 1
+                for packet in packets:
+                    for track in list(group.subscribers):
+                        track.put(packet)
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "raw_subscribers": len(self.raw_subscribers),
+            "encoder_groups": {str(key): len(group.subscribers) for key, group in self.groups.items()},
+            "dropped_frames": sum(track.dropped_frames for track in self.subscribers),
+            "dtx_skipped_frames": sum(group.dtx.frames_skipped for group in self.groups.values()),
+        }
+
+    def stop(self):
+        for track in list(self.subscribers | self.idle_subscribers):
+            track.stop()
+        self.source.stop()
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
+
+from includes.classes.BetterLog import BetterLog
+from includes.classes.RingBuffer import AudioRingBuffer
+from includes.classes.AudioConverter import AudioConverter
+from includes.audio_sinks import PlaybackSink
+
+
+class MixerInput:
+    """
+    Decoded audio of one remote track, waiting in its jitter buffer
+    """
+    def __init__(self, user_id, track: MediaStreamTrack, capacity:int, channels:int):
+        self.user_id = user_id
+        self.track = track
+        self.ring = AudioRingBuffer(capacity, channels)
+        self.converter: AudioConverter = None
+        self.format: tuple = None
+        """ (rate, channels) of the decoded frames `converter` was made for """
+        self.buffering = True
+        """ Not mixed until the jitter buffer holds its target depth again """
+        self.task: asyncio.Task = None
+
+        self.frames_received = 0
+        self.rebuffers = 0
+
+
+class AudioMixer(BetterLog):
+    """
+    Plays the audio of every remote peer: one output at a fixed frame cadence into a `PlaybackSink`.
+
+    Each remote track is received (and decoded by aiortc) on its own task into a per-peer jitter
+    buffer. A peer is mixed once `jitter_frames` are buffered; when it runs dry it is left out
+    (silence) until the buffer is refilled, and audio beyond `max_jitter_frames` is dropped so the
+    delay stays bounded.
+
+    Mixing is one vectorized sum over a preallocated (peers, frames, channels) stack: per peer
+    it costs one copy out of its buffer, no Python-level work per sample.
+    """
+    def __init__(self, logger: logging.Logger, sink: PlaybackSink, rate=48000, channels=2, frame_duration=20,
+                 jitter_frames=3, max_jitter_frames=8, max_peers=8):
+        """
+        :param jitter_frames: depth (in mixer frames) a peer's buffer fills to before it is played
+        :param max_jitter_frames: older audio of a peer is dropped beyond this
+        :param max_peers: initial size of the mixing stack, grows when needed
+        """
+        super().__init__(logger)
+
+        self.sink = sink
+        self.rate = rate
+        self.channels = channels
+        self.frame_duration = frame_duration
+        self.frames_per_buffer = frames = rate * frame_duration // 1000
+        self.jitter_frames = jitter_frames * frames
+        self.max_jitter_frames = max_jitter_frames * frames
+
+        self.inputs: dict[object, MixerInput] = {}
+        self._stack = np.zeros((max_peers, frames, channels), dtype=np.int16)
+        self._sum = np.zeros((frames, channels), dtype=np.int32)
+        self._out = np.zeros((frames, channels), dtype=np.int16)
+
+        self._task: asyncio.Task = None
+        self.frames_mixed = 0
+        self.late_ticks = 0
+        self.mix_ns = 0
+
+    """
+    Inputs
+    """
+
+    def add_track(self, user_id, track: MediaStreamTrack) -> MixerInput:
+        """
+        Starts receiving `track`. A previous track of the same user (e.g. a replaced connection) is replaced.
+        """
+        self.remove(user_id)
+
+        mixer_input = self.inputs[user_id] = MixerInput(user_id, track, 2 * self.max_jitter_frames, self.channels)
+        mixer_input.task = asyncio.create_task(self._receive(mixer_input))
+        self.log_info(f"Mixing audio of {user_id} ({len(self.inputs)} peers)")
+        self.start()
+        return mixer_input
+
+    def remove(self, user_id):
+        mixer_input = self.inputs.pop(user_id, None)
+        if mixer_input is not None and mixer_input.task is not asyncio.current_task():
+            mixer_input.task.cancel()
+
+    async def _receive(self, mixer_input: MixerInput):
+        try:
+            while True:
+                frame = await mixer_input.track.recv()
+                self.push(mixer_input, frame)
+        except MediaStreamError:
+            self.log_debug(f"Audio track of {mixer_input.user_id} ended")
+        finally:
+            if self.inputs.get(mixer_input.user_id) is mixer_input:
+                self.remove(mixer_input.user_id)
+
+    def push(self, mixer_input: MixerInput, frame):
+        """
+        Adds a decoded frame (aiortc decoders output packed s16) to the input's jitter buffer
+        """
+        channels = len(frame.layout.channels)
+        if mixer_input.format != (frame.sample_rate, channels):
+            mixer_input.format = (frame.sample_rate, channels)
+            mixer_input.converter = AudioConverter(frame.sample_rate, channels, self.rate, self.channels)
+
+        samples = frame.to_ndarray().reshape(-1, channels)
+        mixer_input.ring.write(mixer_input.converter.convert(samples))
+        mixer_input.frames_received += 1
+
+    """
+    Mixing
+    """
+
+    def mix(self) -> np.ndarray:
+        """
+        Mixes the next frame of every ready input.
+
+        :returns: int16 (frames_per_buffer, channels), valid until the next call
+        """
+        started = time.perf_counter_ns()
+        if len(self.inputs) > len(self._stack):
+            self._stack = np.zeros((2 * len(self.inputs),) + self._stack.shape[1:], dtype=np.int16)
+
+        active = 0
+        for mixer_input in self.inputs.values():
+            ring = mixer_input.ring
+            if mixer_input.buffering:
+                if ring.available() < self.jitter_frames:
+                    continue
+                mixer_input.buffering = False
+
+            ring.trim(self.max_jitter_frames)
+            if ring.read_into(self._stack[active]):
+                active += 1
+            else:
+                mixer_input.buffering = True
+                mixer_input.rebuffers += 1
+
+        if active == 0:
+            self._out.fill(0)
+        elif active == 1:
+            np.copyto(self._out, self._stack[0])
+        else:
+            np.sum(self._stack[:active], axis=0, dtype=np.int32, out=self._sum)
+            np.clip(self._sum, -32768, 32767, out=self._sum)
+            np.copyto(self._out, self._sum, casting="unsafe")
+
+        self.frames_mixed += 1
+        self.mix_ns += time.perf_counter_ns() - started
+        return self._out
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.sink.open()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for user_id in list(self.inputs):
+            self.remove(user_id)
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.sink.close()
+
+    async def _run(self):
+        period = self.frame_duration / 1000
+        deadline = time.monotonic()
+        while True:
+            self.sink.write(self.mix())
+
+            deadline += period
+            wait = deadline - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif -wait > self.max_jitter_frames / self.rate:
+                # The loop was blocked: skip ahead instead of bursting
+                self.late_ticks += 1
+                deadline = time.monotonic()
+
+    def get_stats(self) -> dict:
+        return {
+            "peers": len(self.inputs),
+            "frames_mixed": self.frames_mixed,
+            "late_ticks": self.late_ticks,
+            "mix_us_per_frame": round(self.mix_ns / max(self.frames_mixed, 1) / 1000, 2),
+            **self.sink.stats(),
+            "inputs": {
+                str(user_id): {"frames_received": mixer_input.frames_received, "rebuffers": mixer_input.rebuffers, **mixer_input.ring.stats()}
+                for user_id, mixer_input in self.inputs.items()
+            },
+        }
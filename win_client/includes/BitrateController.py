@@ -0,0 +1,141 @@
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass
+
+from includes.classes.BetterLog import BetterLog
+from includes.AudioBroadcaster import AudioBroadcaster, BroadcastSubscriberTrack, EncoderProfile, ENCODER_PROFILES
+from includes.peer_stats import summarize_report
+
+
+@dataclass
+class PeerQuality:
+    """
+    Smoothed network conditions of one subscriber, as seen in the RTCP receiver reports
+    """
+    loss: float = 0.0
+    rtt: float = 0.0
+    reports: int = 0
+    good_intervals: int = 0
+    last_report: datetime.datetime = None
+
+
+class BitrateController(BetterLog):
+    """
+    Per-peer adaptation of the Opus settings (bitrate, packet time, FEC).
+
+    Every `interval` seconds the stats of each subscriber's peer connection are read. Loss
+    and RTT from the remote receiver reports pick one of `profiles` (best to worst): a worse
+    network switches down at once, a better one only after `upgrade_after` good intervals
+    in a row, one step at a time.
+
+    Only subscribers fed by a shared encoder (`AudioBroadcaster(encode_once=True)`) can be
+    adapted: aiortc's own per-sender encoder has fixed settings.
+    """
+    def __init__(self, logger: logging.Logger, broadcaster: AudioBroadcaster, interval=2.0, profiles: tuple[EncoderProfile] = ENCODER_PROFILES,
+                 loss_thresholds=(0.02, 0.08), rtt_thresholds=(0.25, 0.5), upgrade_after=3, smoothing=0.5):
+        super().__init__(logger)
+
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self.profiles = profiles
+        self.loss_thresholds = loss_thresholds
+        """ Loss above which the 2nd, 3rd... profile is used """
+        self.rtt_thresholds = rtt_thresholds
+        self.upgrade_after = upgrade_after
+        self.smoothing = smoothing
+
+        self.peers: dict[BroadcastSubscriberTrack, PeerQuality] = {}
+        self.switches = 0
+        self._task: asyncio.Task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.update()
+            except Exception as e:
+                self.log_warn(f"Bitrate adaptation failed: {e}")
+
+    async def update(self):
+        """
+        One adaptation step for every subscriber
+        """
+        tracks = [track for track in self.broadcaster.subscribers if track.peer_connection is not None and track.group is not None]
+        for track in set(self.peers) - set(tracks):
+            del self.peers[track]
+
+        reports = await asyncio.gather(*(track.peer_connection.getStats() for track in tracks), return_exceptions=True)
+        for track, report in zip(tracks, reports):
+            if isinstance(report, Exception):
+                continue
+            quality = self.peers.setdefault(track, PeerQuality())
+            if self.observe(quality, summarize_report(report)):
+                self.adapt(track, quality)
+
+    def observe(self, quality: PeerQuality, summary: dict) -> bool:
+        """
+        Fold a stats summary into the smoothed values.
+
+        :returns: False if no new receiver report arrived since the last call
+        """
+        if summary["reported_at"] is None or summary["reported_at"] == quality.last_report:
+            return False
+        quality.last_report = summary["reported_at"]
+
+        rtt = summary["rtt"] or 0.0
+        if quality.reports == 0:
+            quality.loss, quality.rtt = summary["fraction_lost"], rtt
+        else:
+            quality.loss += self.smoothing * (summary["fraction_lost"] - quality.loss)
+            quality.rtt += self.smoothing * (rtt - quality.rtt)
+        quality.reports += 1
+        return True
+
+    def target_index(self, quality: PeerQuality) -> int:
+        index = sum(quality.loss > threshold for threshold in self.loss_thresholds)
+        index = max(index, sum(quality.rtt > threshold for threshold in self.rtt_thresholds))
+        return min(index, len(self.profiles) - 1)
+
+    def adapt(self, track: BroadcastSubscriberTrack, quality: PeerQuality):
+        current = self.profiles.index(track.profile) if track.profile in self.profiles else 0
+        target = self.target_index(quality)
+
+        if target > current:
+            quality.good_intervals = 0
+        elif target < current:
+            quality.good_intervals += 1
+            if quality.good_intervals < self.upgrade_after:
+                return
+            quality.good_intervals = 0
+            target = current - 1
+        else:
+            quality.good_intervals = 0
+            return
+
+        profile = self.profiles[target]
+        self.log_info(f"Peer audio {track.profile.name} -> {profile.name} (loss {quality.loss:.1%}, rtt {quality.rtt * 1000:.0f} ms)")
+        self.broadcaster.set_profile(track, profile)
+        self.switches += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "switches": self.switches,
+            "peers": [
+                {"profile": track.profile.name, "loss": quality.loss, "rtt": quality.rtt}
+                for track, quality in self.peers.items()
+            ],
+        }
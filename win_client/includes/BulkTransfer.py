@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import time
+from itertools import count
+from typing import Callable
+
+from aiortc import RTCDataChannel, RTCPeerConnection
+
+from includes.classes.BetterLog import BetterLog
+
+
+CHANNEL_PREFIX = "bulk/"
+""" Label of the bulk channels: bulk/<index>, the chat channel is left alone """
+CHUNK_HEADER = struct.Struct("!IQ")
+""" Every binary frame: transfer number and file offset of the chunk, then its bytes """
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def file_sha256(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+def free_path(path: str) -> str:
+    """
+    :returns: `path`, or `name (n).ext` with the first n that doesn't exist yet
+    """
+    stem, extension = os.path.splitext(path)
+    index = 0
+    while os.path.exists(path):
+        index += 1
+        path = f"{stem} ({index}){extension}"
+    return path
+
+
+class BulkLink:
+    """
+    The bulk channels of one peer connection, kept open for every file sent over it
+    """
+    def __init__(self, channels: list[RTCDataChannel]):
+        self.channels = channels
+        self.lock = asyncio.Lock()
+        """ One transfer at a time, a playlist goes file by file """
+        self.replies = asyncio.Queue()
+        self.numbers = count(1)
+
+    @property
+    def control(self) -> RTCDataChannel:
+        """ Carries the offers and the receiver's replies """
+        return self.channels[0]
+
+
+class OutgoingTransfer:
+    """
+    A file being sent: the channels take the next chunk from `next_offset`
+    """
+    def __init__(self, number: int, size: int, offset: int):
+        self.number = number
+        self.size = size
+        self.offset = offset
+        """ Where the transfer (re)started """
+        self.next_offset = offset
+        self.stalls = 0
+        """ Times a channel waited for its `bufferedAmount` to drain """
+
+
+class IncomingTransfer:
+    """
+    A file being received into `<path>.<digest prefix>.part`: a part file only resumes the same content.
+
+    Chunks of parallel channels arrive out of order: the ones ahead of `offset` wait in
+    `pending`, the part file only ever holds the contiguous prefix. Its size is where an
+    interrupted transfer resumes.
+
+    Only chunks within `[offset, offset + window)` and the file size are kept, and `pending` never
+    holds more than `window` bytes: the remote peer can't make the receiver buffer without bound.
+    """
+    def __init__(self, number: int, path: str, size: int, control: RTCDataChannel, window=16 * 1024 * 1024, digest: str = None):
+        self.number = number
+        self.path = path
+        self.digest = digest
+        self.part_path = f"{path}.{digest[:16]}.part" if digest else path + ".part"
+        self.size = size
+        self.control = control
+        self.window = window
+
+        self.offset = os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+        if self.offset > size:
+            self.offset = 0  # Not a prefix of this file
+        self.resumed_from = self.offset
+        self.file = open(self.part_path, "r+b" if os.path.exists(self.part_path) else "wb")
+        self.file.truncate(self.offset)
+        self.file.seek(self.offset)
+
+        self.pending: dict[int, bytes] = {}
+        self.pending_bytes = 0
+        self.dropped_chunks = 0
+        """ Outside the window or the file """
+        self.started_at = time.perf_counter()
+
+    def receive(self, offset: int, data: bytes):
+        if not data or offset < self.offset or offset in self.pending:
+            return  # Already written or waiting
+        end = offset + len(data)
+        if end > min(self.size, self.offset + self.window) or (offset > self.offset and self.pending_bytes + len(data) > self.window):
+            self.dropped_chunks += 1
+            return
+
+        if offset > self.offset:
+            self.pending[offset] = data
+            self.pending_bytes += len(data)
+            return
+
+        self.file.write(data)
+        self.offset += len(data)
+        while self.offset in self.pending:
+            data = self.pending.pop(self.offset)
+            self.pending_bytes -= len(data)
+            self.file.write(data)
+            self.offset += len(data)
+
+    @property
+    def done(self) -> bool:
+        return self.offset >= self.size
+
+
+class BulkTransfer(BetterLog):
+    """
+    File transfers (audio files, playlists) over dedicated data channels of a peer connection.
+
+    The first file sent to a peer opens `channels` channels next to the chat channel, they stay
+    open for the next ones. On the first channel the sender offers the file (name, size, SHA-256),
+    the receiver answers with the offset it already has (the size of its part file for that
+    content), so an interrupted transfer resumes where it stopped. A received file never replaces
+    an existing one, it is renamed instead (`free_path`). The rest is sent in `chunk_size` chunks, every
+    channel taking the next one. A channel whose `bufferedAmount` is above `high_water` is not
+    written to until it drains below `low_water`. Chunks carry the transfer number: the ones
+    still in flight from an interrupted transfer are ignored.
+
+    Files are only received with a `directory` (see `accept_channel`), none by default.
+    """
+    def __init__(self, logger: logging.Logger, directory: str = None, channels=2, chunk_size=16 * 1024,
+                 high_water=1024 * 1024, low_water=256 * 1024, timeout=30.0, on_received: Callable[[str], None] = None,
+                 max_file_size=2 * 1024**3, window=16 * 1024 * 1024):
+        """
+        :param directory: received files are written here, offers are rejected without one
+        :param max_file_size: larger offers are rejected
+        :param window: bytes a received file may be ahead of its contiguous prefix (see `IncomingTransfer`).
+            Must exceed what the sender's channels buffer (`channels` x `high_water`), or its chunks get dropped
+        :param timeout: seconds to wait for the channels to open and for the receiver's replies
+        :param on_received: called with the path of every completely received file
+        """
+        super().__init__(logger)
+
+        self.directory = directory
+        self.channels = channels
+        self.chunk_size = chunk_size
+        self.high_water = high_water
+        self.low_water = low_water
+        self.timeout = timeout
+        self.on_received = on_received
+        self.max_file_size = max_file_size
+        self.window = window
+
+        self.links: dict[RTCPeerConnection, BulkLink] = {}
+        self.incoming: dict[object, IncomingTransfer] = {}
+        """ Per SCTP transport, i.e. per remote peer """
+        self.sent: list[dict] = []
+        self.received: list[dict] = []
+
+    """
+    Sending
+    """
+
+    async def send_file(self, pc: RTCPeerConnection, path: str, name: str = None) -> dict:
+        """
+        Sends the file at `path` to the remote peer of `pc`, resuming a previous attempt.
+
+        :returns: the transfer statistics, also kept in `sent`
+        :raises ConnectionError: when the receiver rejects the file or the channels close
+        """
+        name = name or os.path.basename(path)
+        size = os.path.getsize(path)
+        digest = await asyncio.get_running_loop().run_in_executor(None, file_sha256, path)
+        link = self.links.get(pc)
+        if link is None:
+            link = self.links[pc] = self._open_link(pc)
+
+        async with link.lock:
+            await asyncio.wait_for(asyncio.gather(*(self._opened(channel) for channel in link.channels)), self.timeout)
+            number = next(link.numbers)
+            link.control.send(json.dumps({"type": "offer", "transfer": number, "name": name, "size": size, "sha256": digest}))
+            reply = await self._reply(link, number, "accept")
+
+            transfer = OutgoingTransfer(number, size, reply["offset"])
+            started_at = time.perf_counter()
+            with open(path, "rb") as file:
+                await asyncio.gather(*(self._pump(channel, file, transfer) for channel in link.channels))
+            await self._reply(link, number, "complete")
+
+        seconds = time.perf_counter() - started_at
+        stats = {
+            "name": name,
+            "size": size,
+            "resumed_from": transfer.offset,
+            "seconds": round(seconds, 3),
+            "mbps": round((size - transfer.offset) * 8 / seconds / 1e6, 1) if seconds > 0 else None,
+            "channels": len(link.channels),
+            "stalls": transfer.stalls,
+        }
+        self.sent.append(stats)
+        self.log_info(f"Sent {name}: {size - transfer.offset} bytes in {seconds:.2f}s ({stats['mbps']} Mbit/s)")
+        return stats
+
+    def _open_link(self, pc: RTCPeerConnection) -> BulkLink:
+        link = BulkLink([pc.createDataChannel(f"{CHANNEL_PREFIX}{index}") for index in range(self.channels)])
+
+        def on_close():
+            if self.links.get(pc) is link:
+                del self.links[pc]
+            link.replies.put_nowait({"type": "closed"})
+
+        link.control.on("message", lambda message: link.replies.put_nowait(json.loads(message)) if isinstance(message, str) else None)
+        link.control.on("close", on_close)
+        return link
+
+    async def _opened(self, channel: RTCDataChannel):
+        if channel.readyState == "open":
+            return
+        if channel.readyState != "connecting":
+            raise ConnectionError(f"Bulk channel {channel.label} is {channel.readyState}")
+        opened = asyncio.Event()
+        channel.on("open", opened.set)
+        await opened.wait()
+
+    async def _reply(self, link: BulkLink, number: int, expected: str) -> dict:
+        while True:
+            reply = await asyncio.wait_for(link.replies.get(), self.timeout)
+            if reply.get("transfer", number) == number:
+                break  # Otherwise a late reply about an interrupted transfer
+        if reply["type"] != expected:
+            raise ConnectionError(f"Bulk transfer failed, got {reply['type']} instead of {expected}: {reply.get('reason')}")
+        return reply
+
+    async def _pump(self, channel: RTCDataChannel, file, transfer: OutgoingTransfer):
+        drained = asyncio.Event()
+        channel.bufferedAmountLowThreshold = self.low_water
+        channel.on("bufferedamountlow", drained.set)
+        channel.on("close", drained.set)
+
+        while transfer.next_offset < transfer.size:
+            if channel.readyState != "open":
+                raise ConnectionError(f"Bulk channel {channel.label} closed at offset {transfer.next_offset}")
+            if channel.bufferedAmount > self.high_water:
+                drained.clear()
+                transfer.stalls += 1
+                await drained.wait()
+                continue
+
+            # No await between the read and the send: the channels share the file
+            offset = transfer.next_offset
+            file.seek(offset)
+            data = file.read(self.chunk_size)
+            transfer.next_offset += len(data)
+            channel.send(CHUNK_HEADER.pack(transfer.number, offset) + data)
+
+        channel.remove_listener("bufferedamountlow", drained.set)
+        channel.remove_listener("close", drained.set)
+
+    """
+    Receiving
+    """
+
+    def accept_channel(self, channel: RTCDataChannel) -> bool:
+        """
+        Handles a channel opened by the remote peer (`datachannel` event) if it is a bulk channel
+
+        :returns: False for other channels
+        """
+        if not channel.label.startswith(CHANNEL_PREFIX):
+            return False
+
+        channel.on("message", lambda message: self._on_message(channel, message))
+        channel.on("close", lambda: self._on_close(channel))
+        return True
+
+    def _on_message(self, channel: RTCDataChannel, message):
+        if isinstance(message, str):
+            offer = json.loads(message)
+            if offer.get("type") == "offer":
+                self._on_offer(channel, offer)
+            return
+
+        transfer = self.incoming.get(channel.transport)
+        if transfer is None or len(message) < CHUNK_HEADER.size:
+            return
+        number, offset = CHUNK_HEADER.unpack_from(message)
+        if number != transfer.number:
+            return
+        transfer.receive(offset, message[CHUNK_HEADER.size:])
+        if transfer.done:
+            self._complete(transfer)
+
+    def _on_offer(self, channel: RTCDataChannel, offer: dict):
+        # A new offer of this peer replaces its interrupted transfer
+        self._interrupt(channel.transport)
+
+        number = offer.get("transfer")
+        name = os.path.basename(str(offer.get("name", "")))
+        digest = offer.get("sha256")
+        if self.directory is None:
+            reason = "not receiving files"
+        elif (not name or name.startswith(".") or not isinstance(offer.get("size"), int) or offer["size"] < 0 or not isinstance(number, int)
+              or not isinstance(digest, str) or not DIGEST_PATTERN.fullmatch(digest)):
+            reason = "invalid offer"
+        elif offer["size"] > self.max_file_size:
+            reason = "file too large"
+        elif any(transfer.path == os.path.join(self.directory, name) and transfer.digest == digest for transfer in self.incoming.values()):
+            reason = "already receiving this file"
+        else:
+            reason = None
+        if reason is not None:
+            self.log_warn(f"Rejected bulk transfer of {name!r}: {reason}")
+            channel.send(json.dumps({"type": "reject", "transfer": number, "reason": reason}))
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        transfer = IncomingTransfer(number, os.path.join(self.directory, name), offer["size"], channel, self.window, digest)
+        self.incoming[channel.transport] = transfer
+        self.log_info(f"Receiving {name} ({transfer.size} bytes{f', resuming at {transfer.offset}' if transfer.offset else ''})")
+        channel.send(json.dumps({"type": "accept", "transfer": number, "offset": transfer.offset}))
+        if transfer.done:
+            self._complete(transfer)
+
+    def _complete(self, transfer: IncomingTransfer):
+        del self.incoming[transfer.control.transport]
+        transfer.file.close()
+        # An existing file (e.g. an earlier version of this track) is kept
+        transfer.path = free_path(transfer.path)
+        os.replace(transfer.part_path, transfer.path)
+
+        seconds = time.perf_counter() - transfer.started_at
+        self.received.append({"path": transfer.path, "size": transfer.size, "resumed_from": transfer.resumed_from, "seconds": round(seconds, 3)})
+        self.log_info(f"Received {transfer.path} in {seconds:.2f}s")
+        transfer.control.send(json.dumps({"type": "complete", "transfer": transfer.number, "size": transfer.size}))
+        if self.on_received is not None:
+            self.on_received(transfer.path)
+
+    def _interrupt(self, transport):
+        transfer = self.incoming.pop(transport, None)
+        if transfer is None:
+            return
+        # The part file keeps the contiguous prefix, the next offer resumes there
+        transfer.file.close()
+        self.log_warn(f"Transfer of {transfer.path} interrupted at {transfer.offset}/{transfer.size} bytes")
+
+    def _on_close(self, channel: RTCDataChannel):
+        transfer = self.incoming.get(channel.transport)
+        if transfer is not None and transfer.control is channel:
+            self._interrupt(channel.transport)
+
+    def get_stats(self) -> dict:
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "incoming": [{"path": transfer.path, "offset": transfer.offset, "size": transfer.size, "pending_chunks": len(transfer.pending), "dropped_chunks": transfer.dropped_chunks}
+                         for transfer in self.incoming.values()],
+        }
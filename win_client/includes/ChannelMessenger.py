@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from itertools import count
+
+from aiortc import RTCDataChannel
+
+from includes.classes.BetterLog import BetterLog
+from includes.classes.clients import RemoteClient
+
+
+class OutgoingMessage:
+    """
+    A message serialized once and shared by every channel it is sent to
+    """
+    __slots__ = ("frame", "_item")
+
+    def __init__(self, message):
+        self.frame: str = message if isinstance(message, str) else json.dumps(message)
+        """ Sent as is when the message goes out alone (plain strings stay plain)"""
+        self._item: str = None if isinstance(message, str) else self.frame
+
+    @property
+    def item(self) -> str:
+        """ JSON value used inside a batch frame"""
+        if self._item is None:
+            self._item = json.dumps(self.frame)
+        return self._item
+
+
+class ChannelOutbox:
+    """
+    Pending messages of one data channel.
+
+    Keyed messages (e.g. now playing) replace the pending one with the same key, so a slow
+    peer only gets the latest state. Unkeyed messages (chat) keep their order, the oldest
+    ones are dropped when more than `max_pending` are waiting.
+    """
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self.pending: OrderedDict = OrderedDict()
+        self.channel: RTCDataChannel = None
+        self.flush_handle: asyncio.Handle = None
+
+        self.merged = 0
+        self.dropped = 0
+        self.frames_sent = 0
+        self.messages_sent = 0
+
+    def add(self, message: OutgoingMessage, key, sequence: int):
+        if key is not None:
+            if key in self.pending:
+                del self.pending[key]
+                self.merged += 1
+            self.pending[key] = message
+        else:
+            self.pending[sequence] = message
+
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+
+
+class ChannelMessenger(BetterLog):
+    """
+    Data channel messaging for all remote peers.
+
+    - Every message is serialized once, no matter how many peers receive it.
+    - Messages queued within `batch_delay` go out as one frame: `{"batch": [...]}`.
+    - A channel whose `bufferedAmount` is above `high_water` is not written to until it
+      drains below `low_water` (`bufferedamountlow`); meanwhile stale updates are merged.
+    """
+    def __init__(self, logger: logging.Logger, peers: dict[int, RemoteClient],
+                 batch_delay=0.02, high_water=64 * 1024, low_water=16 * 1024, max_pending=100):
+        super().__init__(logger)
+
+        self.peers = peers
+        self.batch_delay = batch_delay
+        self.high_water = high_water
+        self.low_water = low_water
+        self.max_pending = max_pending
+
+        self.outboxes: dict[int, ChannelOutbox] = {}
+        self._sequence = count()
+
+    def broadcast(self, message, key=None):
+        """
+        Queue `message` (str or JSON-serializable) for every remote peer
+        """
+        outgoing = OutgoingMessage(message)
+        for user_id in list(self.peers):
+            self._enqueue(user_id, outgoing, key)
+
+    def send(self, user_id, message, key=None):
+        self._enqueue(user_id, OutgoingMessage(message), key)
+
+    def drop(self, user_id):
+        """
+        Forget pending messages of a peer (channel closed)
+        """
+        outbox = self.outboxes.pop(user_id, None)
+        if outbox is not None and outbox.flush_handle is not None:
+            outbox.flush_handle.cancel()
+
+    def flush(self, user_id):
+        """
+        Send everything pending for a peer now, if its channel allows it
+        """
+        outbox = self.outboxes.get(user_id)
+        if outbox is None:
+            return
+        outbox.flush_handle = None
+
+        channel = self._bind_channel(user_id, outbox)
+        if channel is None or channel.readyState != "open" or not outbox.pending:
+            return  # Retried on open / bufferedamountlow
+        if channel.bufferedAmount > self.high_water:
+            return
+
+        messages = list(outbox.pending.values())
+        outbox.pending.clear()
+
+        if len(messages) == 1:
+            frame = messages[0].frame
+        else:
+            frame = '{"batch": [' + ", ".join(message.item for message in messages) + ']}'
+
+        channel.send(frame)
+        outbox.frames_sent += 1
+        outbox.messages_sent += len(messages)
+
+    def get_stats(self) -> dict:
+        return {
+            user_id: {
+                "pending": len(outbox.pending),
+                "merged": outbox.merged,
+                "dropped": outbox.dropped,
+                "frames_sent": outbox.frames_sent,
+                "messages_sent": outbox.messages_sent,
+            }
+            for user_id, outbox in self.outboxes.items()
+        }
+
+    def _enqueue(self, user_id, message: OutgoingMessage, key):
+        outbox = self.outboxes.get(user_id)
+        if outbox is None:
+            outbox = self.outboxes[user_id] = ChannelOutbox(self.max_pending)
+
+        outbox.add(message, key, next(self._sequence))
+        if outbox.flush_handle is None:
+            loop = asyncio.get_running_loop()
+            outbox.flush_handle = loop.call_later(self.batch_delay, self.flush, user_id)
+
+    def _bind_channel(self, user_id, outbox: ChannelOutbox) -> RTCDataChannel:
+        peer = self.peers.get(user_id)
+        channel = peer.data_channel if peer is not None else None
+
+        if channel is not None and channel is not outbox.channel:
+            # New (or first) channel of this peer
+            outbox.channel = channel
+            channel.bufferedAmountLowThreshold = self.low_water
+            channel.on("bufferedamountlow", lambda: self.flush(user_id))
+            channel.on("open", lambda: self.flush(user_id))
+        return channel
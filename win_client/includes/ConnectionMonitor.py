@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import logging
+from typing import Callable, Optional
+
+from aiortc import RTCPeerConnection
+
+from includes.classes.BetterLog import BetterLog
+from includes.classes.clients import LocalClient, RemoteClient
+
+
+def last_packet_at(pc: RTCPeerConnection) -> Optional[datetime.datetime]:
+    """
+    When the last RTP packet of a connection arrived, None if none did in the last 10 s.
+    The receivers stamp every packet, reading the stamps builds no stats report.
+    """
+    stamps = [source.timestamp for receiver in pc.getReceivers() for source in receiver.getSynchronizationSources()]
+    return max(stamps, default=None)
+
+def receives_media(pc: RTCPeerConnection) -> bool:
+    """
+    True if the remote side sends RTP on this connection. Data-only connections (and the upload
+    to an SFU) are mostly quiet while healthy, silence means nothing there.
+    """
+    return any(transceiver.currentDirection in ("sendrecv", "recvonly") for transceiver in pc.getTransceivers())
+
+
+class ConnectionMonitor(BetterLog):
+    """
+    Detects dead peer connections of `LocalClient.remotePeers` and reports them to `on_lost`,
+    which replaces them (see `SignalingHandler.replace_peer`).
+
+    A connection is lost when its state is `failed`, or when a connected peer that was
+    sending media stops for `silence_timeout` seconds. aioice only declares a path dead after
+    ~30 s of failed consent checks, while a browser in a call sends RTP every 20 ms, and at
+    least every 400 ms in DTX silence (see `DtxGate`), so silence is the much faster signal.
+    The arrival of the last packet is checked every `interval` seconds: a lost connection is
+    reported at most `silence_timeout + interval` (0.7 s) after its last packet.
+
+    `on_lost(remote_user, peer_connection)` is called once per connection.
+    """
+    def __init__(self, logger: logging.Logger, local_client: LocalClient, on_lost: Callable[[RemoteClient, RTCPeerConnection], None],
+                 interval=0.1, silence_timeout=0.6):
+        super().__init__(logger)
+
+        self.local_client = local_client
+        self.on_lost = on_lost
+        self.interval = interval
+        self.silence_timeout = silence_timeout
+
+        self.heard: set[RTCPeerConnection] = set()
+        """ Connections the remote side has sent media on """
+        self.reported: set[RTCPeerConnection] = set()
+        self.losses_detected = 0
+        self._task: asyncio.Task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.check()
+            except Exception as e:
+                self.log_warn(f"Connection check failed: {e}")
+
+    def check(self):
+        peers = [peer for peer in self.local_client.remotePeers.values() if peer.peerConnection is not None]
+        current = {peer.peerConnection for peer in peers}
+        self.heard &= current
+        self.reported &= current
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        for peer in peers:
+            pc = peer.peerConnection
+            if pc in self.reported or pc.connectionState in ("new", "closed"):
+                continue
+
+            lost = pc.connectionState == "failed"
+            if pc.connectionState == "connected" and receives_media(pc):
+                last = last_packet_at(pc)
+                if last is not None and (now - last).total_seconds() < self.silence_timeout:
+                    self.heard.add(pc)
+                # Silence only counts once the peer has been sending
+                elif pc in self.heard:
+                    lost = True
+
+            if lost:
+                self.reported.add(pc)
+                self.losses_detected += 1
+                self.log_warn(f"Connection with {peer.name} ({peer.id}) lost ({pc.connectionState})")
+                self.on_lost(peer, pc)
@@ -1,26 +1,26 @@
 import asyncio
 import logging
 from typing import Callable
-from winsdk.windows.media.control import (
-    GlobalSystemMediaTransportControlsSessionManager as MediaManager
-)
 
 from .enums.MediaAction import MediaAction
+from .media_backends import MediaSessionBackend, WinsdkMediaBackend
 
 from includes.classes.BetterLog import BetterLog
 
 class MediaController(BetterLog):
-    def __init__(self, logger: logging.Logger = None):
+    def __init__(self, logger: logging.Logger = None, backend: MediaSessionBackend = None):
         super().__init__(logger)
-        self.sessions = None
-        self.current_session = None
+        self.backend = backend if backend is not None else WinsdkMediaBackend(logger)
+
+    @property
+    def has_session(self) -> bool:
+        return self.backend.has_session()
 
     async def initialize(self):
         self.log_info("Initializing.")
-        self.sessions = await MediaManager.request_async()
-        self.current_session = self.sessions.get_current_session()
+        await self.backend.initialize()
 
-        if not self.current_session:
+        if not self.has_session:
             self.log_warn("No active media session found.")
             return
         
@@ -29,23 +29,23 @@ class MediaController(BetterLog):
 
 
     async def _perform_action_async(self, action: MediaAction):
-        if not self.current_session:
+        if not self.has_session:
             self.log_warn("No active media session available.")
             return
 
         try:
             match action:
                 case MediaAction.PLAY:
-                    await self.current_session.try_play_async()
+                    await self.backend.play()
                     self.log_info("Track resumed.")
                 case MediaAction.PAUSE:
-                    await self.current_session.try_pause_async()
+                    await self.backend.pause()
                     self.log_info("Track paused.")
                 case MediaAction.NEXT:
-                    await self.current_session.try_skip_next_async()
+                    await self.backend.next_track()
                     self.log_info("Skipped to next track.")
                 case MediaAction.PREVIOUS:
-                    await self.current_session.try_skip_previous_async()
+                    await self.backend.previous_track()
                     self.log_info("Skipped to previous track.")
                 case MediaAction.NOW_PLAYING:
                     return await self.get_now_playing()
@@ -76,20 +76,14 @@ class MediaController(BetterLog):
         Get Current audio information
         :return: dict or None
         """
-        if not self.current_session:
+        if not self.has_session:
             if not logger_force_disable:
                 self.log_warn("No active media session available.")
             return None
 
         async def fetch_media_properties():
             try:
-                properties = await self.current_session.try_get_media_properties_async()
-                result = {
-                    "title": properties.title,
-                    "artist": properties.artist,
-                    "album": properties.album_title,
-                    "track_number": properties.track_number,
-                }
+                result = await self.backend.get_media_properties()
 
                 if not logger_force_disable:
                     self.log_debug(f"Successfully fetched now playing information: {result}")
@@ -101,17 +95,43 @@ class MediaController(BetterLog):
 
         return await fetch_media_properties()
 
-    async def on_np_update(self, callback:Callable):
+    async def on_np_update(self, callback:Callable, coalesce_delay=0.2, min_poll_interval=0.5, max_poll_interval=10.0):
+        """
+        Call `callback(media_info)` whenever the now playing information changes.
+
+        Event-driven when the backend supports change notifications: bursts of notifications
+        (title, artist, session...) within `coalesce_delay` collapse into one fetch, and
+        `max_poll_interval` is only a safety net. Otherwise polls, backing off from
+        `min_poll_interval` to `max_poll_interval` while nothing changes.
+        """
         async def get_np():
             return await self.get_now_playing(logger_force_disable=True)
-        
+
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        event_driven = self.backend.subscribe(lambda: loop.call_soon_threadsafe(changed.set))
+        self.log_info(f"Now playing updates: {'event-driven' if event_driven else 'adaptive polling'}")
+
         media_info = await get_np()
-        while True:
-            temp = await get_np()
-            if temp != media_info:
-                callback(temp)
-                # self.logger.warning(f"INFO IS DIFFERENT: {temp}")
-                media_info = temp
+        interval = max_poll_interval if event_driven else min_poll_interval
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout=interval)
+                    await asyncio.sleep(coalesce_delay)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+
+                temp = await get_np()
+                if temp != media_info:
+                    callback(temp)
+                    media_info = temp
+                    interval = max_poll_interval if event_driven else min_poll_interval
+                elif not event_driven:
+                    interval = min(interval * 2, max_poll_interval)
+        finally:
+            self.backend.unsubscribe()
 
 
 
@@ -1,24 +1,201 @@
-
+import asyncio
+import time
+from dataclasses import dataclass, field
 from typing import Callable
-from aiortc import MediaStreamTrack, RTCPeerConnection
+from aiortc import MediaStreamTrack, RTCPeerConnection, RTCDataChannel
 from includes.classes.BetterLog import BetterLog
 from includes.classes.clients import RemoteClient
+from includes.AudioBroadcaster import AudioBroadcaster, BroadcastSubscriberTrack
+
+
+@dataclass
+class PreparedConnection:
+    """
+    Peer connection with its track and data channel, not bound to a remote user yet
+    """
+    pc: RTCPeerConnection
+    data_channel: RTCDataChannel
+    audio_track: BroadcastSubscriberTrack
+    """ None for data-only connections """
+    audio_source: AudioBroadcaster
+    created_at: float = field(default_factory=time.monotonic)
+
 
 class PeerConnectionManager(BetterLog):
-    def __init__(self, logger, on_channel_open:Callable, on_channel_close:Callable, on_channel_message:Callable):
+    """
+    Creates the peer connections of the win client.
+
+    With `pool_size` > 0 a few connections are kept pre-warmed (track attached, data channel
+    created, ICE candidates gathered) and refilled in the background, so a JOIN or OFFER
+    skips the gathering wait. Entries older than `pool_max_age` are replaced in the background,
+    since server-reflexive candidates go stale with NAT bindings.
+
+    `on_track(track, remote_user)` gets the audio tracks the remote peers send,
+    `on_connected(remote_user)` is called when a connection is established,
+    `on_data_channel(channel, remote_user)` gets the data channels the remote peers open (e.g. bulk transfers).
+    Connections created without an audio source only carry the data channel (and receive audio).
+    """
+    def __init__(self, logger, on_channel_open:Callable, on_channel_close:Callable, on_channel_message:Callable, pool_size=0, pool_max_age=60.0,
+                 on_track:Callable[[MediaStreamTrack, RemoteClient], None] = None, on_connected:Callable[[RemoteClient], None] = None,
+                 on_data_channel:Callable[[RTCDataChannel, RemoteClient], None] = None):
         super().__init__(logger)
 
         self.on_channel_open = on_channel_open
         self.on_channel_close = on_channel_close
         self.on_channel_message = on_channel_message
+        self.on_track = on_track
+        self.on_connected = on_connected
+        self.on_data_channel = on_data_channel
+
+        self.pool_size = pool_size
+        self.pool_max_age = pool_max_age
+        self.pool: list[PreparedConnection] = []
+        self.pool_source: AudioBroadcaster = None
+        self._refill_task: asyncio.Task = None
+        self._expiry_task: asyncio.Task = None
+
+        self.connect_latencies: dict[int, float] = {}
+        """ Seconds from `create_pc` to `connected`, per remote user id"""
+
+    """
+    Pool
+    """
+
+    def start_pool(self, audio_source: AudioBroadcaster):
+        if self.pool_size <= 0:
+            return
+        self.pool_source = audio_source
+        self._schedule_refill()
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._expire_stale())
+
+    async def close_pool(self):
+        for task in (self._refill_task, self._expiry_task):
+            if task is not None:
+                task.cancel()
+        self._refill_task = self._expiry_task = None
+
+        while self.pool:
+            await self._discard(self.pool.pop())
+
+    def _schedule_refill(self):
+        if self.pool_source is None or (self._refill_task is not None and not self._refill_task.done()):
+            return
+        self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        while len(self.pool) < self.pool_size:
+            try:
+                prepared = await self._prepare(self.pool_source, pre_gather=True)
+            except Exception as e:
+                self.log_error(f"Failed to pre-warm a peer connection: {e}")
+                return
+            self.pool.append(prepared)
+            self.log_debug(f"Pre-warmed peer connection ready. Pool: {len(self.pool)}/{self.pool_size}")
+
+    async def _expire_stale(self):
+        """
+        Replaces entries before they age out, so the first JOIN after an idle period finds a warm pool
+        """
+        while True:
+            await asyncio.sleep(self.pool_max_age / 4)
+            deadline = time.monotonic() - self.pool_max_age * 3 / 4
+            stale = [prepared for prepared in self.pool if prepared.created_at < deadline]
+            if not stale:
+                continue
+            self.pool = [prepared for prepared in self.pool if prepared not in stale]
+            self.log_debug(f"Replacing {len(stale)} pre-warmed peer connection(s) before their candidates go stale")
+            for prepared in stale:
+                await self._discard(prepared)
+            self._schedule_refill()
+
+    def _take(self, audio_source: AudioBroadcaster) -> PreparedConnection:
+        if audio_source is not self.pool_source:
+            return None
+
+        now = time.monotonic()
+        while self.pool:
+            prepared = self.pool.pop(0)
+            if prepared.audio_source is audio_source and now - prepared.created_at < self.pool_max_age:
+                return prepared
+            asyncio.create_task(self._discard(prepared))
+        return None
+
+    async def _discard(self, prepared: PreparedConnection):
+        if prepared.audio_track is not None:
+            prepared.audio_track.stop()
+        await prepared.pc.close()
+
+    async def _prepare(self, audio_source: AudioBroadcaster, pre_gather=False) -> PreparedConnection:
+        pc = RTCPeerConnection()
+        audio_track = None
+        if audio_source is not None:
+            audio_track = audio_source.subscribe(pc, active=False)
+            pc.addTrack(audio_track)
+        data_channel = pc.createDataChannel("chat")
+
+        if pre_gather:
+            # setLocalDescription finds these already gathered
+            gatherers = self._ice_gatherers(pc)
+            await asyncio.gather(*(gatherer.gather() for gatherer in gatherers))
+
+        return PreparedConnection(pc, data_channel, audio_track, audio_source)
+
+    def _ice_gatherers(self, pc: RTCPeerConnection) -> set:
+        """
+        aiortc has no public API to gather before setLocalDescription: without these internals
+        the pool still saves creating the connection, only the gathering happens later
+        """
+        transports = [transceiver.sender.transport for transceiver in pc.getTransceivers()]
+        if pc.sctp is not None:
+            transports.append(pc.sctp.transport)
+        try:
+            return {transport.transport.iceGatherer for transport in transports}
+        except AttributeError as e:
+            self.log_debug(f"Not pre-gathering ICE candidates: {e}")
+            return set()
+
+    """
+    Connections
+    """
     
-    async def create_pc(self, remote_user:RemoteClient, audio_track: MediaStreamTrack):
-        self.log_debug("Creating Peer Connection..")
-        pc_remote = RTCPeerConnection()
-        pc_remote.addTrack(audio_track)
+    async def create_pc(self, remote_user:RemoteClient, audio_source: AudioBroadcaster):
+        started_at = time.perf_counter()
+        prepared = self._take(audio_source)
+        if prepared is not None:
+            self.log_debug("Using pre-warmed Peer Connection..")
+            self._schedule_refill()
+        else:
+            self.log_debug("Creating Peer Connection..")
+            prepared = await self._prepare(audio_source)
+
+        pc_remote, data_channel, audio_track = prepared.pc, prepared.data_channel, prepared.audio_track
+        if audio_track is not None:
+            audio_source.activate(audio_track)
+
         pc_remote.on("iceconnectionstatechange", lambda: self.log_info(f"ICE state: {pc_remote.iceConnectionState}"))
 
-        data_channel = pc_remote.createDataChannel("chat")
+        @pc_remote.on("connectionstatechange")
+        async def on_connection_state_change():
+            if pc_remote.connectionState == "connected":
+                latency = time.perf_counter() - started_at
+                self.connect_latencies[remote_user.id] = latency
+                self.log_info(f"Connected to {remote_user.name} ({remote_user.id}) in {latency * 1000:.0f} ms")
+                if self.on_connected is not None:
+                    self.on_connected(remote_user)
+            elif pc_remote.connectionState in ("failed", "closed") and audio_track is not None:
+                # Releases the broadcaster subscription of this peer
+                audio_track.stop()
+
+        if self.on_track is not None:
+            @pc_remote.on("track")
+            def on_track(track: MediaStreamTrack):
+                if track.kind == "audio":
+                    self.on_track(track, remote_user)
+
+        if self.on_data_channel is not None:
+            pc_remote.on("datachannel", lambda channel: self.on_data_channel(channel, remote_user))
+
         self.log_info(f"Data Channel Created")
 
 
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from servers.includes.enums import MessageType
+from includes.classes.BetterLog import BetterLog
+
+
+class PeerMessageDispatcher(BetterLog):
+    """
+    Runs signaling handlers per remote peer.
+
+    Messages of one peer are handled in order (OFFER before its CANDIDATEs), different peers
+    are handled concurrently, so a slow `handle_offer` no longer blocks everybody else.
+    A peer's worker exits after `idle_timeout` seconds without messages.
+    """
+    def __init__(self, logger: logging.Logger, handle: Callable[[MessageType, dict], Awaitable], idle_timeout=30.0):
+        super().__init__(logger)
+
+        self.handle = handle
+        self.idle_timeout = idle_timeout
+        self.queues: dict[str, asyncio.Queue] = {}
+        self.workers: dict[str, asyncio.Task] = {}
+
+    def dispatch(self, message_type: MessageType, payload: dict):
+        peer_id = payload.get("user", {}).get("id")
+
+        queue = self.queues.get(peer_id)
+        if queue is None:
+            queue = self.queues[peer_id] = asyncio.Queue()
+            self.workers[peer_id] = asyncio.create_task(self._worker(peer_id, queue))
+
+        queue.put_nowait((message_type, payload))
+
+    async def _worker(self, peer_id, queue: asyncio.Queue):
+        try:
+            while True:
+                try:
+                    message_type, payload = await asyncio.wait_for(queue.get(), timeout=self.idle_timeout)
+                except asyncio.TimeoutError:
+                    if queue.empty():
+                        return
+                    continue
+
+                try:
+                    await self.handle(message_type, payload)
+                except Exception as e:
+                    self.log_error(f"Failed to handle {message_type} from peer {peer_id}: {e}")
+        finally:
+            if self.queues.get(peer_id) is queue:
+                del self.queues[peer_id]
+                del self.workers[peer_id]
+
+    async def close(self):
+        workers = list(self.workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
@@ -1,20 +1,50 @@
+import asyncio
 import json
+import time
+from collections import deque
 from includes.WebSocketClient import WebSocketClient
 from includes.PeerConnectionManager import PeerConnectionManager
+from includes.AudioBroadcaster import AudioBroadcaster
+from includes.ice_candidates import parse_candidate
 
 from includes.classes.BetterLog import BetterLog
 from includes.classes.clients import LocalClient, RemoteClient
 from servers.includes.enums import MessageType
 
-from aiortc import MediaStreamTrack, RTCSessionDescription, RTCIceCandidate
+from aiortc import RTCSessionDescription
 
 class SignalingHandler(BetterLog):
-    def __init__(self, wsc: WebSocketClient, current_client:LocalClient, peer_connection_manager:PeerConnectionManager, logger):
+    def __init__(self, wsc: WebSocketClient, current_client:LocalClient, peer_connection_manager:PeerConnectionManager, logger, max_pending_candidates=50,
+                 pending_candidates_max_age=10.0, replace_wait=3.0):
         super().__init__(logger)
 
         self.wsc = wsc
         self.current_client = current_client
         self.peer_connection_manager = peer_connection_manager
+        self.sfu_id: str = None
+        """ Virtual user of the server's SFU, None when the server only relays signaling (mesh) """
+
+        # Candidates of peers that have no remotePeers entry yet, by user id: (buffered at, candidate)
+        # Older than `pending_candidates_max_age` seconds they belong to an earlier negotiation and are dropped
+        self.max_pending_candidates = max_pending_candidates
+        self.pending_candidates_max_age = pending_candidates_max_age
+        self.pending_candidates: dict[str, deque] = {}
+
+        # Both ends of a lost connection may replace it. Their OFFERs would cross (glare), so only the
+        # peer with the lower id replaces it at once, the other waits `replace_wait` seconds for its OFFER
+        self.replace_wait = replace_wait
+        self.deferred_replacements: dict[str, asyncio.Task] = {}
+
+        self.replacements = 0
+        self.replacement_latencies: dict[str, float] = {}
+        """ Seconds from the replacement OFFER to `connected`, per remote user id"""
+
+        self.candidates_parsed = 0
+        self.candidates_invalid = 0
+        self.candidates_applied = 0
+        self.candidates_buffered = 0
+        self.candidates_dropped = 0
+        self.candidate_parse_ns = 0
 
     async def process_confirm_id(self):
         while True:
@@ -24,6 +54,7 @@ class SignalingHandler(BetterLog):
 
             if response["type"] == MessageType.CONFIRM_ID.value:
                 self.current_client.id = response["payload"]["user"]["id"]
+                self.sfu_id = response["payload"].get("sfu")
                 self.log_info(f"Client ID confirmed: {self.current_client.id}")
                 break
 
@@ -31,69 +62,244 @@ class SignalingHandler(BetterLog):
 
         self.log_info(f"Success: CONFIRM_ID. Full user: {self.current_client.to_dict()}")
 
-    async def handle_join(self, payload: dict, audio_track: MediaStreamTrack):
+    def is_sfu(self, remote_user: RemoteClient) -> bool:
+        """
+        The SFU's publish user `sfu` or one of its subscription users `sfu:<publisher id>`
+        """
+        return self.sfu_id is not None and (remote_user.id == self.sfu_id or str(remote_user.id).startswith(self.sfu_id + ":"))
+
+    def replaces_first(self, remote_user: RemoteClient) -> bool:
+        """
+        Tie-breaker of a replacement: the peer with the lower id offers. The SFU never replaces a connection
+        by itself, the client does
+        """
+        return self.is_sfu(remote_user) or str(self.current_client.id) < str(remote_user.id)
+
+    async def close_peer(self, user_id):
+        """
+        Close the existing connection with a peer (if any), e.g. when it joins again.
+        """
+        remote_user = self.current_client.remotePeers.pop(user_id, None)
+        self.candidates_dropped += len(self.pending_candidates.pop(user_id, ()))
+        if remote_user and remote_user.peerConnection:
+            self.log_info(f"Closing previous connection with {remote_user.name} ({remote_user.id})")
+            await remote_user.peerConnection.close()
+
+    async def publish(self, audio_source: AudioBroadcaster):
+        """
+        SFU mode: the audio goes to the server once instead of to every peer.
+        The SFU is offered a connection like a peer which joined.
+        """
+        self.log_info(f"Publishing audio to the SFU ({self.sfu_id})")
+        await self.handle_join({"user": {"id": self.sfu_id, "name": "SFU"}}, audio_source)
+
+    async def handle_join(self, payload: dict, audio_source: AudioBroadcaster):
         # Handle new client joining
         remote_user = RemoteClient.from_payload(payload["user"])
         
         self.log_info(f"New peer joined: {remote_user.name} ({remote_user.id})")
+        await self.close_peer(remote_user.id)
         
-        pc_remote, data_channel = await self.peer_connection_manager.create_pc(remote_user, audio_track)
+        pc_remote, data_channel = await self.peer_connection_manager.create_pc(remote_user, audio_source)
         
         remote_user.peerConnection = pc_remote
         remote_user.data_channel = data_channel
+        remote_user.pending_candidates.extend(self.take_pending_candidates(remote_user.id))
         self.current_client.remotePeers[remote_user.id] = remote_user
 
         offer = await pc_remote.createOffer()
         await pc_remote.setLocalDescription(offer)
         self.log_info("Created offer for remote peer")
 
-        # Send answer back
-        await self.wsc.send_to(remote_user, MessageType.OFFER, payload={"sdp": offer.sdp})
+        # Send answer back. The local description carries the gathered candidates, the win client doesn't trickle them
+        await self.wsc.send_to(remote_user, MessageType.OFFER, payload={"sdp": pc_remote.localDescription.sdp})
         self.log_info(f"Sent offer to {remote_user.name}")
 
-    async def handle_offer(self, payload, audio_track: MediaStreamTrack):
+    async def handle_offer(self, payload, audio_source: AudioBroadcaster):
         remote_user = RemoteClient.from_payload(payload["user"])
+
+        current = self.current_client.remotePeers.get(remote_user.id)
+        # The SFU answers the OFFER replacing a subscription with an OFFER of its own: that one is never glare
+        if (current is not None and current.peerConnection is not None and current.peerConnection.signalingState == "have-local-offer"
+                and self.replaces_first(current) and not self.is_sfu(current)):
+            # Glare: our OFFER wins, the remote peer takes it instead
+            self.log_info(f"Ignoring the OFFER of {remote_user.name} ({remote_user.id}) crossing ours")
+            return
+
+        deferred = self.deferred_replacements.pop(remote_user.id, None)
+        if deferred is not None:
+            deferred.cancel()
+        await self.close_peer(remote_user.id)
         
-        pc_remote, data_channel = await self.peer_connection_manager.create_pc(remote_user, audio_track)
+        pc_remote, data_channel = await self.peer_connection_manager.create_pc(remote_user, audio_source)
 
         remote_user.peerConnection = pc_remote
         remote_user.data_channel = data_channel
+        remote_user.pending_candidates.extend(self.take_pending_candidates(remote_user.id))
         self.current_client.remotePeers[remote_user.id] = remote_user
 
         await remote_user.peerConnection.setRemoteDescription(RTCSessionDescription(sdp=payload["sdp"], type="offer"))
+        await self.apply_pending_candidates(remote_user)
 
         answer = await remote_user.peerConnection.createAnswer()
         await remote_user.peerConnection.setLocalDescription(answer)
         self.log_info("Generated answer for incoming offer")
 
         # Send answer back
-        await self.wsc.send_to(remote_user, MessageType.ANSWER, payload={"sdp": answer.sdp})
+        await self.wsc.send_to(remote_user, MessageType.ANSWER, payload={"sdp": remote_user.peerConnection.localDescription.sdp})
         self.log_info(f"Sent answer to {remote_user.name}")
 
+    async def replace_peer(self, payload: dict, audio_source: AudioBroadcaster):
+        """
+        Replace a lost connection without a new JOIN.
+
+        This is not an ICE restart: aiortc can't restart ICE on an existing connection, so the
+        peer gets a new (usually pre-warmed) connection, with new DTLS and SCTP associations,
+        negotiated with an OFFER over the current signaling connection.
+        The remote user stays in `remotePeers`: its queued data channel messages go out on
+        the new channel and the audio source keeps capturing.
+
+        If the remote peer replaces it first (see `replaces_first`), its OFFER replaces the connection
+        and this replacement is dropped.
+        """
+        remote_user = self.current_client.remotePeers.get(payload["user"]["id"])
+        old_pc = payload.get("peer_connection")
+        if remote_user is None or remote_user.peerConnection is not old_pc:
+            # Replaced meanwhile (e.g. the peer joined again)
+            return
+
+        if not self.replaces_first(remote_user) and not payload.get("deferred"):
+            self.log_info(f"Waiting {self.replace_wait}s for {remote_user.name} ({remote_user.id}) to replace the connection")
+            self.deferred_replacements[remote_user.id] = asyncio.create_task(self._replace_later({**payload, "deferred": True}, audio_source))
+            return
+        self.deferred_replacements.pop(remote_user.id, None)
+
+        self.log_info(f"Replacing connection with {remote_user.name} ({remote_user.id})")
+        started_at = time.perf_counter()
+        pc_remote, data_channel = await self.peer_connection_manager.create_pc(remote_user, audio_source)
+        if self.current_client.remotePeers.get(remote_user.id) is not remote_user or remote_user.peerConnection is not old_pc:
+            # The remote OFFER was handled meanwhile
+            await pc_remote.close()
+            return
+
+        @pc_remote.on("connectionstatechange")
+        def on_connection_state_change():
+            if pc_remote.connectionState == "connected":
+                self.replacement_latencies[remote_user.id] = time.perf_counter() - started_at
+
+        remote_user.peerConnection = pc_remote
+        remote_user.data_channel = data_channel
+        remote_user.pending_candidates = []
+        self.replacements += 1
+
+        offer = await pc_remote.createOffer()
+        await pc_remote.setLocalDescription(offer)
+        await self.wsc.send_to(remote_user, MessageType.OFFER, payload={"sdp": pc_remote.localDescription.sdp})
+
+        if old_pc is not None:
+            await old_pc.close()
+
+    async def _replace_later(self, payload: dict, audio_source: AudioBroadcaster):
+        await asyncio.sleep(self.replace_wait)
+        await self.replace_peer(payload, audio_source)
+
+    def cancel_deferred_replacements(self):
+        for task in self.deferred_replacements.values():
+            task.cancel()
+        self.deferred_replacements.clear()
+
     async def handle_answer(self, payload):
         remote_user = self.current_client.remotePeers.get(payload["user"]["id"])
         if remote_user and remote_user.peerConnection:
+            if remote_user.peerConnection.signalingState != "have-local-offer":
+                # Answer to an OFFER that lost the glare, its connection is gone
+                self.log_info(f"Ignoring unexpected answer from {remote_user.name}")
+                return
             await remote_user.peerConnection.setRemoteDescription(RTCSessionDescription(sdp=payload["sdp"], type="answer"))
             self.log_info(f"Answer processed for {remote_user.name}")
+            await self.apply_pending_candidates(remote_user)
 
     async def handle_candidate(self,payload):
         # Handle ICE candidates
         candidate:dict = payload["candidate"]
-        remote_user = self.current_client.remotePeers.get(payload["user"]["id"])
+        user_id = payload["user"]["id"]
 
-        if remote_user and remote_user.peerConnection:
+        started = time.perf_counter_ns()
+        try:
+            rtc_candidate = parse_candidate(candidate["candidate"], candidate.get("sdpMid"), candidate.get("sdpMLineIndex"))
+        except (ValueError, KeyError) as e:
+            self.candidates_invalid += 1
+            self.log_warn(f"Ignoring invalid ICE candidate from {user_id}: {e}")
+            return
+        finally:
+            self.candidate_parse_ns += time.perf_counter_ns() - started
+
+        if rtc_candidate is None:
+            # End-of-candidates indication
+            return
+        self.candidates_parsed += 1
+
+        remote_user = self.current_client.remotePeers.get(user_id)
+        if remote_user is None or remote_user.peerConnection is None:
+            # The peer connection does not exist yet: keep the candidate until it is created
+            self.expire_pending_candidates()
+            if user_id not in self.pending_candidates and len(self.pending_candidates) >= self.max_pending_candidates:
+                # Bound the number of unknown peers too: forget the oldest one
+                oldest = next(iter(self.pending_candidates))
+                self.candidates_dropped += len(self.pending_candidates.pop(oldest))
+
+            pending = self.pending_candidates.setdefault(user_id, deque(maxlen=self.max_pending_candidates))
+            if len(pending) == pending.maxlen:
+                self.candidates_dropped += 1
+            pending.append((time.monotonic(), rtc_candidate))
+            self.candidates_buffered += 1
+            self.log_info(f"ICE candidate buffered for unknown peer {user_id}")
+            return
+
+        if remote_user.peerConnection.remoteDescription is None:
+            # Trickle ICE: the candidate can overtake the ANSWER
+            remote_user.pending_candidates.append(rtc_candidate)
+            self.candidates_buffered += 1
+            self.log_info(f"ICE candidate buffered for {remote_user.name} until the remote description is set")
+            return
 
-            rtc_candidate = RTCIceCandidate(
-                component=1,
-                foundation=candidate["candidate"].split(" ")[0],
-                ip=candidate["candidate"].split(" ")[4],
-                port=int(candidate["candidate"].split(" ")[5]),
-                priority=int(candidate["candidate"].split(" ")[3]),
-                protocol=candidate["candidate"].split(" ")[2],
-                type=candidate["candidate"].split(" ")[7],
-                sdpMid=candidate.get("sdpMid"),
-                sdpMLineIndex=candidate.get("sdpMLineIndex"),
-            )
+        await remote_user.peerConnection.addIceCandidate(rtc_candidate)
+        self.candidates_applied += 1
+        self.log_info(f"ICE candidate added for {remote_user.name}")
 
+    def take_pending_candidates(self, user_id) -> list:
+        """
+        :returns: the buffered candidates of a peer whose connection is created now, stale ones are dropped
+        """
+        deadline = time.monotonic() - self.pending_candidates_max_age
+        pending = self.pending_candidates.pop(user_id, ())
+        fresh = [rtc_candidate for buffered_at, rtc_candidate in pending if buffered_at >= deadline]
+        self.candidates_dropped += len(pending) - len(fresh)
+        return fresh
+
+    def expire_pending_candidates(self):
+        deadline = time.monotonic() - self.pending_candidates_max_age
+        for user_id in [user_id for user_id, pending in self.pending_candidates.items() if pending[-1][0] < deadline]:
+            self.candidates_dropped += len(self.pending_candidates.pop(user_id))
+
+    async def apply_pending_candidates(self, remote_user: RemoteClient):
+        pending, remote_user.pending_candidates = remote_user.pending_candidates, []
+        for rtc_candidate in pending:
             await remote_user.peerConnection.addIceCandidate(rtc_candidate)
-            self.log_info(f"ICE candidate added for {remote_user.name}")
+        self.candidates_applied += len(pending)
+
+        if pending:
+            self.log_info(f"Applied {len(pending)} buffered ICE candidates for {remote_user.name}")
+
+    def get_stats(self) -> dict:
+        parsed = self.candidates_parsed + self.candidates_invalid
+        return {
+            "replacements": self.replacements,
+            "candidates_parsed": self.candidates_parsed,
+            "candidates_invalid": self.candidates_invalid,
+            "candidates_applied": self.candidates_applied,
+            "candidates_buffered": self.candidates_buffered,
+            "candidates_dropped": self.candidates_dropped,
+            "candidates_pending": sum(len(pending) for pending in self.pending_candidates.values()),
+            "candidate_parse_us": self.candidate_parse_ns / parsed / 1000 if parsed else 0.0,
+        }
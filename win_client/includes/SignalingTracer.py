@@ -0,0 +1,76 @@
+import json
+import logging
+
+from servers.includes.enums import MessageType
+from servers.includes.tracing import TRACED_MESSAGES, add_hop, is_valid_trace, new_trace, trace_segments
+from includes.classes.BetterLog import BetterLog
+
+
+class SignalingTracer(BetterLog):
+    """
+    Optional signaling latency tracing (`WebSocketClient.tracer`).
+
+    A negotiation carries one trace in the message envelope. A JOIN starts a new one, the OFFER
+    and ANSWER replies continue the trace of the message they answer, and the clients and the
+    server append a hop at every send and receive. The last receiver so has the whole timeline:
+    JOIN client_send, server_recv, server_send, client_recv, OFFER client_send, ... connected.
+
+    When a peer connection is connected its span (hops and the time between them) is kept in
+    `spans` and, with `path`, appended to that file as one JSON line.
+    """
+    def __init__(self, logger: logging.Logger, path: str = None, max_spans=1000):
+        super().__init__(logger)
+        self.path = path
+        self.max_spans = max_spans
+
+        self.traces: dict[str, dict] = {}
+        """ Per remote peer id: the trace the next message to it continues """
+        self.spans: list[dict] = []
+
+    def outgoing(self, message: dict, peer_id: str = None):
+        """
+        Stamps a message about to be sent. Broadcasts (JOIN) start a new trace
+        """
+        message_type = MessageType(message["type"])
+        if message_type not in TRACED_MESSAGES:
+            return
+
+        trace = self.traces.get(peer_id) if peer_id is not None else None
+        message["trace"] = add_hop(trace if trace is not None else new_trace(), f"{message_type.value} client_send")
+        if peer_id is not None:
+            self.traces[peer_id] = message["trace"]
+
+    def incoming(self, message: dict):
+        """
+        Stamps a received message, its sender's next reply continues the trace
+        """
+        trace = message.get("trace")
+        peer_id = message.get("payload", {}).get("user", {}).get("id")
+        if not is_valid_trace(trace) or peer_id is None:
+            return
+        self.traces[peer_id] = add_hop(trace, f"{message['type']} client_recv")
+
+    def connected(self, peer_id: str):
+        """
+        Ends the negotiation with `peer_id`: its span is recorded
+        """
+        trace = self.traces.pop(peer_id, None)
+        if trace is None:
+            return
+
+        hops = add_hop(trace, "connected")["hops"]
+        span = {
+            "trace_id": trace["id"],
+            "peer": peer_id,
+            "started_at": hops[0][1],
+            "total_ms": round((hops[-1][1] - hops[0][1]) * 1000, 2),
+            "hops": hops,
+            "segments": trace_segments(hops),
+        }
+        self.spans.append(span)
+        del self.spans[:-self.max_spans]
+        self.log_info(f"Negotiation with {peer_id} took {span['total_ms']:.0f} ms (trace {span['trace_id']})")
+
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(span) + "\n")
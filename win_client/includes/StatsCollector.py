@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from includes.classes.BetterLog import BetterLog
+from includes.classes.clients import LocalClient
+from includes.peer_stats import summarize_report
+
+
+SERIES_FIELDS = ("time", "rtt_ms", "jitter", "loss", "send_kbps", "packets_sent", "packets_received")
+
+
+class PeerSeries:
+    """
+    Ring-buffered time series of one peer: one tuple of `SERIES_FIELDS` per poll
+    """
+    __slots__ = ("name", "samples", "last_bytes_sent", "last_time")
+
+    def __init__(self, name: str, history: int):
+        self.name = name
+        self.samples: deque[tuple] = deque(maxlen=history)
+        self.last_bytes_sent: int = None
+        self.last_time: float = None
+
+    def add(self, now: float, summary: dict):
+        send_kbps = 0.0
+        # bytes_sent starts over with a new sender (renegotiation, replaced connection): new baseline, 0 for this sample
+        if self.last_time is not None and now > self.last_time and summary["bytes_sent"] >= self.last_bytes_sent:
+            send_kbps = (summary["bytes_sent"] - self.last_bytes_sent) * 8 / (now - self.last_time) / 1000
+        self.last_bytes_sent, self.last_time = summary["bytes_sent"], now
+
+        rtt = summary["rtt"]
+        self.samples.append((
+            round(now, 3),
+            round(rtt * 1000, 1) if rtt is not None else None,
+            summary["remote_jitter"],
+            summary["fraction_lost"],
+            round(send_kbps, 1),
+            summary["packets_sent"],
+            summary["packets_received"],
+        ))
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "fields": SERIES_FIELDS,
+            "samples": list(self.samples),
+        }
+
+
+class StatsCollector(BetterLog):
+    """
+    Background collector of connection quality for every peer in `LocalClient.remotePeers`.
+
+    Every `interval` seconds `getStats()` is called on all peer connections at once and
+    reduced to one small tuple per peer, kept in a ring buffer of `history` samples.
+    Series of peers which left are dropped.
+
+    Exported through `http_port` (GET / returns the JSON of every series, bound to
+    localhost) and/or appended as JSON lines to `export_path`, rotated at `max_file_bytes`.
+    """
+    def __init__(self, logger: logging.Logger, local_client: LocalClient, interval=5.0, history=120,
+                 http_port: int = None, export_path: str = None, max_file_bytes=5 * 1024 * 1024):
+        super().__init__(logger)
+
+        self.local_client = local_client
+        self.interval = interval
+        self.history = history
+        self.http_port = http_port
+        self.export_path = export_path
+        self.max_file_bytes = max_file_bytes
+
+        self.series: dict[str, PeerSeries] = {}
+        self.polls = 0
+        self.poll_time = 0.0
+        """ Total seconds spent in `collect` """
+        self._task: asyncio.Task = None
+        self._server: asyncio.Server = None
+
+    async def start(self):
+        if self.http_port is not None and self._server is None:
+            self._server = await asyncio.start_server(self._handle_http, "127.0.0.1", self.http_port)
+            self.log_info(f"Stats available on http://127.0.0.1:{self.http_port}/")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.collect()
+                if self.export_path:
+                    self.export_to_file()
+            except Exception as e:
+                self.log_warn(f"Stats collection failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def collect(self):
+        """
+        Poll every peer connection once
+        """
+        started = time.perf_counter()
+        peers = [peer for peer in self.local_client.remotePeers.values() if peer.peerConnection is not None]
+
+        for peer_id in self.series.keys() - {str(peer.id) for peer in peers}:
+            del self.series[peer_id]
+
+        reports = await asyncio.gather(*(peer.peerConnection.getStats() for peer in peers), return_exceptions=True)
+        now = time.time()
+        for peer, report in zip(peers, reports):
+            if isinstance(report, Exception):
+                continue
+            series = self.series.get(str(peer.id))
+            if series is None:
+                series = self.series[str(peer.id)] = PeerSeries(peer.name, self.history)
+            series.add(now, summarize_report(report))
+
+        self.polls += 1
+        self.poll_time += time.perf_counter() - started
+
+    def snapshot(self) -> dict:
+        return {
+            "interval": self.interval,
+            "polls": self.polls,
+            "poll_ms": self.poll_time / self.polls * 1000 if self.polls else 0.0,
+            "peers": {peer_id: series.to_dict() for peer_id, series in self.series.items()},
+        }
+
+    def export_to_file(self):
+        """
+        Append the latest sample of every peer, keeping one rotated file
+        """
+        if os.path.exists(self.export_path) and os.path.getsize(self.export_path) >= self.max_file_bytes:
+            os.replace(self.export_path, self.export_path + ".1")
+
+        with open(self.export_path, "a", encoding="utf-8") as file:
+            for peer_id, series in self.series.items():
+                if series.samples:
+                    file.write(json.dumps({"peer": peer_id, "name": series.name, **dict(zip(SERIES_FIELDS, series.samples[-1]))}) + "\n")
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # Only the request line matters, the headers are skipped
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+
+            if request_line.split(b" ")[0] == b"GET":
+                status, body = "200 OK", json.dumps(self.snapshot()).encode()
+            else:
+                status, body = "405 Method Not Allowed", b"{}"
+
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
@@ -7,15 +7,18 @@ import websockets
 from servers.includes.enums import MessageType
 from includes.classes.BetterLog import BetterLog
 from includes.classes.clients import RemoteClient
+from includes.SignalingTracer import SignalingTracer
 
 
 class WebSocketClient(BetterLog):
-    def __init__(self, signaling_server: str, ssl_context: ssl.SSLContext, logger:logging.Logger):
+    def __init__(self, signaling_server: str, ssl_context: ssl.SSLContext, logger:logging.Logger, tracer:SignalingTracer=None):
         super().__init__(logger)
 
         self.signaling_server = signaling_server
         self.ssl_context = ssl_context
         self.websocket = None
+        # Optional: trace IDs and per-hop timestamps of the negotiations
+        self.tracer = tracer
 
     def connect(self):
         self.log_info(f"Connecting to signaling server {self.signaling_server}")
@@ -38,10 +41,14 @@ class WebSocketClient(BetterLog):
 
     async def broadcast(self, message_type: MessageType, payload: dict):
         message = {"type": message_type.value, "payload": payload}
+        if self.tracer is not None:
+            self.tracer.outgoing(message)
         await self._send_message(message)
 
     async def send_to(self, target: RemoteClient, message_type: MessageType, payload):
         message = {"type": message_type.value, "target": target.to_dict(), "payload": payload}
+        if self.tracer is not None:
+            self.tracer.outgoing(message, target.id)
         await self._send_message(message)
 
     async def recv(self):
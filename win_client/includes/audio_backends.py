@@ -0,0 +1,286 @@
+import logging
+import time
+import wave
+from abc import ABC, abstractmethod
+from typing import BinaryIO
+
+import numpy as np
+
+from .classes.BetterLog import BetterLog
+
+
+class CaptureBackend(BetterLog, ABC):
+    """
+    Blocking audio source used by the capture thread of `CustomAudioTrack`.
+
+    `read` must return int16 samples shaped (frames, channels).
+    Sources which are not a real device call `pace` to block like one (`realtime=True`).
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960, realtime=True):
+        BetterLog.__init__(self, logger=logger)
+
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.realtime = realtime
+
+        self._position = 0
+        self._started_at = None
+
+    def open(self):
+        self._position = 0
+        self._started_at = time.perf_counter()
+
+    @abstractmethod
+    def read(self, frames:int) -> np.ndarray: ...
+
+    def close(self):
+        pass
+
+    def pace(self, frames:int):
+        """
+        Block until `frames` more frames "were captured" and advance the position
+        """
+        if self.realtime:
+            deadline = self._started_at + (self._position + frames) / self.rate
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self._position += frames
+
+    def to_channels(self, samples:np.ndarray) -> np.ndarray:
+        """
+        Match (frames, N) int16 samples to the backend channel count
+        """
+        if samples.shape[1] == self.channels:
+            return samples
+        if self.channels == 1:
+            return samples.mean(axis=1, dtype=np.int32).astype(np.int16)[:, None]
+        return np.repeat(samples[:, :1], self.channels, axis=1)
+
+
+class PyAudioBackend(CaptureBackend):
+    """
+    By Default: Uses Microphone. The device itself blocks, no pacing needed
+
+    With `native_format` the device is opened at its own rate and channel count (shared-mode
+    WASAPI devices refuse anything else), `CustomAudioTrack` converts to its profile.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960, native_format=True):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime=False)
+        self.native_format = native_format
+        self.pa = None
+        self.stream = None
+        self.stream_parameters = None
+
+    def open(self):
+        # Windows-only dependency, imported when the device is actually opened
+        import pyaudiowpatch as pyaudio
+
+        self.pa = pyaudio.PyAudio()
+        device = self.device_info()
+        self.log_debug(f"Capture device: {device}")
+
+        if self.native_format:
+            requested_rate = self.rate
+            self.rate = int(device["defaultSampleRate"])
+            self.channels = int(device["maxInputChannels"])
+            # Same buffer duration at the native rate
+            self.frames_per_buffer = round(self.frames_per_buffer * self.rate / requested_rate)
+
+        self.stream_parameters = {
+            "format": pyaudio.paInt16,
+            "channels": self.channels,
+            "rate": self.rate,
+            "input": True,
+            "input_device_index": device["index"],
+            "frames_per_buffer": self.frames_per_buffer
+        }
+        self.open_stream()
+
+    def device_info(self) -> dict:
+        return self.pa.get_default_input_device_info()
+
+    def open_stream(self):
+        self.log_debug(f"Opening the stream with parameters: {self.stream_parameters}")
+        self.stream = self.pa.open(**self.stream_parameters)
+
+    def read(self, frames:int) -> np.ndarray:
+        data = np.frombuffer(self.stream.read(frames), dtype=np.int16)
+        return data.reshape(-1, self.channels)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.pa is not None:
+            self.pa.terminate()
+            self.pa = None
+
+
+class LoopbackBackend(PyAudioBackend):
+    """
+    WASAPI loopback of the default output device
+    """
+    def device_info(self) -> dict:
+        return self.pa.get_default_wasapi_loopback()
+
+
+class SyntheticBackend(CaptureBackend):
+    """
+    Sine tone paced like a real device: `read` blocks until the requested frames "were captured".
+    Runs everywhere, used for tests and benchmarks.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960, frequency=440.0, amplitude=0.3, realtime=True):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime)
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self._phase_step = 2 * np.pi * self.frequency / self.rate
+
+    def read(self, frames:int) -> np.ndarray:
+        start = self._position
+        self.pace(frames)
+
+        phase = (np.arange(frames) + start) * self._phase_step
+        samples = (np.sin(phase) * self.amplitude * 32767).astype(np.int16)
+        return np.repeat(samples[:, None], self.channels, axis=1)
+
+
+class NoiseBackend(CaptureBackend):
+    """
+    White noise. Worst case for the encoder, nothing to predict
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960, amplitude=0.3, seed=None, realtime=True):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime)
+        self.amplitude = amplitude
+        self._rng = np.random.default_rng(seed)
+
+    def read(self, frames:int) -> np.ndarray:
+        self.pace(frames)
+        noise = self._rng.uniform(-self.amplitude, self.amplitude, size=(frames, self.channels))
+        return (noise * 32767).astype(np.int16)
+
+
+class MarkerBackend(CaptureBackend):
+    """
+    Silence with a short tone burst every `interval` seconds, for end-to-end latency measurements.
+    The capture time (`time.perf_counter()`) of the first sample of every burst is appended to `markers`.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960, interval=0.5, duration=0.01,
+                 frequency=1000.0, amplitude=0.5, realtime=True):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime)
+        self.period = int(interval * rate)
+        self.burst = int(duration * rate)
+        self.amplitude = amplitude
+        self._phase_step = 2 * np.pi * frequency / rate
+        self.markers: list[float] = []
+
+    def read(self, frames:int) -> np.ndarray:
+        start = self._position
+        self.pace(frames)
+        # The block was "captured" up to now
+        captured_at = time.perf_counter()
+
+        positions = np.arange(start, start + frames)
+        in_period = positions % self.period
+        samples = np.sin(positions * self._phase_step) * (self.amplitude * 32767)
+        samples[in_period >= self.burst] = 0
+        for offset in np.flatnonzero(in_period == 0):
+            self.markers.append(captured_at - (frames - offset) / self.rate)
+
+        return np.repeat(samples.astype(np.int16)[:, None], self.channels, axis=1)
+
+
+class WavFileBackend(CaptureBackend):
+    """
+    16-bit PCM WAV file, optionally looped. Pads with silence once the file is over.
+    The file is loaded once, reads are slices of it.
+
+    The backend takes the rate of the file, `CustomAudioTrack` resamples to its profile.
+    """
+    def __init__(self, logger: logging.Logger, path:str, rate=48000, channels=2, frames_per_buffer=960, loop=True, realtime=True):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime)
+        self.path = path
+        self.loop = loop
+        self.samples: np.ndarray = None
+
+    def open(self):
+        with wave.open(self.path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError(f"Only 16-bit PCM WAV files are supported: {self.path}")
+            self.rate = wav.getframerate()
+
+            data = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+            self.samples = self.to_channels(data.reshape(-1, wav.getnchannels()))
+
+        self.log_debug(f"Loaded {len(self.samples)} frames from {self.path}")
+        super().open()
+
+    def read(self, frames:int) -> np.ndarray:
+        start = self._position
+        self.pace(frames)
+
+        total = len(self.samples)
+        if self.loop and total:
+            indices = np.arange(start, start + frames) % total
+            return self.samples[indices]
+
+        out = np.zeros((frames, self.channels), dtype=np.int16)
+        chunk = self.samples[start:start + frames]
+        out[:len(chunk)] = chunk
+        return out
+
+
+class PcmPipeBackend(CaptureBackend):
+    """
+    Raw interleaved s16le PCM from a pipe, FIFO or file (e.g. `ffmpeg ... -f s16le -`).
+    The writer provides the pacing, so `realtime` is off by default.
+    `read` raises EOFError once the writer is gone, the capture then ends.
+    """
+    def __init__(self, logger: logging.Logger, source:BinaryIO | str, rate=48000, channels=2, frames_per_buffer=960, realtime=False):
+        super().__init__(logger, rate, channels, frames_per_buffer, realtime)
+        self.source = source
+        self.stream: BinaryIO = None
+
+    def open(self):
+        self.stream = open(self.source, "rb") if isinstance(self.source, str) else self.source
+        super().open()
+
+    def read(self, frames:int) -> np.ndarray:
+        self.pace(frames)
+
+        size = frames * self.channels * 2
+        data = self.stream.read(size)
+        if not data:
+            raise EOFError("PCM pipe is closed")
+        if len(data) < size:
+            data = data.ljust(size, b"\0")
+        return np.frombuffer(data, dtype=np.int16).reshape(-1, self.channels)
+
+    def close(self):
+        if self.stream is not None and isinstance(self.source, str):
+            self.stream.close()
+        self.stream = None
+
+
+CAPTURE_BACKENDS: dict[str, type[CaptureBackend]] = {
+    "microphone": PyAudioBackend,
+    "loopback": LoopbackBackend,
+    "tone": SyntheticBackend,
+    "noise": NoiseBackend,
+    "marker": MarkerBackend,
+    "wav": WavFileBackend,
+    "pipe": PcmPipeBackend,
+}
+""" Backends by name, see `create_backend`"""
+
+def create_backend(name:str, logger: logging.Logger, **kwargs) -> CaptureBackend:
+    """
+    :raises ValueError: unknown backend name
+    """
+    try:
+        backend_class = CAPTURE_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown capture backend `{name}`. Available: {list(CAPTURE_BACKENDS)}")
+    return backend_class(logger=logger, **kwargs)
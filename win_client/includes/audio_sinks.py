@@ -0,0 +1,192 @@
+import logging
+import math
+import time
+import wave
+
+import numpy as np
+
+from .classes.BetterLog import BetterLog
+from .classes.RingBuffer import AudioRingBuffer
+from .classes.AudioConverter import AudioConverter
+
+
+class PlaybackSink(BetterLog):
+    """
+    Destination of the mixed receive audio (see `AudioMixer`).
+
+    `write` gets int16 samples shaped (frames, channels) once per mixer frame, on the event loop:
+    it must not block. The samples are only valid during the call.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2):
+        BetterLog.__init__(self, logger=logger)
+
+        self.rate = rate
+        self.channels = channels
+        self.frames_written = 0
+
+    def open(self):
+        pass
+
+    def write(self, samples:np.ndarray):
+        self.frames_written += len(samples)
+
+    def close(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"frames_written": self.frames_written}
+
+
+class NullSink(PlaybackSink):
+    """
+    Discards the audio. The remote tracks are still decoded and mixed (and their queues drained)
+    """
+
+
+class MarkerSink(PlaybackSink):
+    """
+    Detects the tone bursts of `MarkerBackend`: the playout time (`time.perf_counter()`) of the first
+    sample above `threshold` after at least `min_gap` seconds of quiet is appended to `detections`.
+    A sample plays `index / rate` after the write of its frame.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, threshold=0.1, min_gap=0.2):
+        super().__init__(logger, rate, channels)
+        self.threshold = int(threshold * 32767)
+        self.min_gap = int(min_gap * rate)
+        self.detections: list[float] = []
+        self._last_loud = -math.inf
+        """ Position of the last sample above the threshold """
+
+    def write(self, samples:np.ndarray):
+        now = time.perf_counter()
+        loud = np.flatnonzero(np.abs(samples[:, 0].astype(np.int32)) > self.threshold)
+        if len(loud):
+            positions = loud + self.frames_written
+            gaps = np.diff(positions, prepend=self._last_loud)
+            for index in loud[gaps > self.min_gap]:
+                self.detections.append(now + index / self.rate)
+            self._last_loud = positions[-1]
+        super().write(samples)
+
+
+class WavFileSink(PlaybackSink):
+    """
+    16-bit PCM WAV file. Used for tests and recordings
+    """
+    def __init__(self, logger: logging.Logger, path:str, rate=48000, channels=2):
+        super().__init__(logger, rate, channels)
+        self.path = path
+        self.wav: wave.Wave_write = None
+
+    def open(self):
+        self.wav = wave.open(self.path, "wb")
+        self.wav.setnchannels(self.channels)
+        self.wav.setsampwidth(2)
+        self.wav.setframerate(self.rate)
+
+    def write(self, samples:np.ndarray):
+        self.wav.writeframesraw(samples)
+        super().write(samples)
+
+    def close(self):
+        if self.wav is not None:
+            self.wav.close()
+            self.wav = None
+
+
+class PyAudioSink(PlaybackSink):
+    """
+    By Default: the default output device, in its native format (shared-mode WASAPI).
+
+    The device pulls from a ring buffer on PortAudio's callback thread, `write` only copies
+    into it. Missing audio is played as silence, audio beyond `max_latency_frames` mixer
+    frames is dropped.
+    """
+    def __init__(self, logger: logging.Logger, rate=48000, channels=2, buffer_frames=10, max_latency_frames=4, frame_duration=20):
+        super().__init__(logger, rate, channels)
+        self.buffer_frames = buffer_frames
+        self.max_latency_frames = max_latency_frames
+        self.frame_duration = frame_duration
+
+        self.pa = None
+        self.stream = None
+        self.converter: AudioConverter = None
+        self.ring: AudioRingBuffer = None
+        self.device_rate = rate
+        self.device_channels = channels
+        self._callback_buffer: np.ndarray = None
+
+    def open(self):
+        # Windows-only dependency, imported when the device is actually opened
+        import pyaudiowpatch as pyaudio
+
+        self.pa = pyaudio.PyAudio()
+        device = self.device_info()
+        self.log_debug(f"Playback device: {device}")
+
+        self.device_rate = int(device["defaultSampleRate"])
+        self.device_channels = min(int(device["maxOutputChannels"]), 2) or self.channels
+        self.converter = AudioConverter(self.rate, self.channels, self.device_rate, self.device_channels)
+
+        device_frames = self.device_rate * self.frame_duration // 1000
+        self.ring = AudioRingBuffer(self.buffer_frames * device_frames, self.device_channels)
+        self._max_latency = self.max_latency_frames * device_frames
+        self._callback_buffer = np.zeros((device_frames, self.device_channels), dtype=np.int16)
+        self._paContinue = pyaudio.paContinue
+
+        self.stream = self.pa.open(
+            format=pyaudio.paInt16,
+            channels=self.device_channels,
+            rate=self.device_rate,
+            output=True,
+            output_device_index=device["index"],
+            frames_per_buffer=device_frames,
+            stream_callback=self._callback,
+        )
+
+    def device_info(self) -> dict:
+        return self.pa.get_default_output_device_info()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if len(self._callback_buffer) != frame_count:
+            self._callback_buffer = np.zeros((frame_count, self.device_channels), dtype=np.int16)
+
+        self.ring.trim(self._max_latency)
+        if not self.ring.read_into(self._callback_buffer):
+            self._callback_buffer.fill(0)
+        return self._callback_buffer.tobytes(), self._paContinue
+
+    def write(self, samples:np.ndarray):
+        self.ring.write(self.converter.convert(samples))
+        super().write(samples)
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
+        if self.pa is not None:
+            self.pa.terminate()
+            self.pa = None
+
+    def stats(self) -> dict:
+        return {**super().stats(), **(self.ring.stats() if self.ring is not None else {})}
+
+
+PLAYBACK_SINKS: dict[str, type[PlaybackSink]] = {
+    "speaker": PyAudioSink,
+    "wav": WavFileSink,
+    "null": NullSink,
+    "marker": MarkerSink,
+}
+""" Sinks by name, see `create_sink`"""
+
+def create_sink(name:str, logger: logging.Logger, **kwargs) -> PlaybackSink:
+    """
+    :raises ValueError: unknown sink name
+    """
+    try:
+        sink_class = PLAYBACK_SINKS[name]
+    except KeyError:
+        raise ValueError(f"Unknown playback sink `{name}`. Available: {list(PLAYBACK_SINKS)}")
+    return sink_class(logger=logger, **kwargs)
@@ -1,87 +1,384 @@
+import asyncio
 import logging
+import threading
+import time
 
 import fractions
+from dataclasses import dataclass
+
 import numpy as np
 from av import AudioFrame
-import pyaudiowpatch as pyaudio
 
 from aiortc import MediaStreamTrack
+from aiortc.mediastreams import MediaStreamError
 
 from .classes.BetterLog import BetterLog
+from .classes.RingBuffer import AudioRingBuffer
+from .classes.AudioConverter import AudioConverter
+from .classes.VoiceActivityDetector import VoiceActivityDetector
+from .audio_backends import CaptureBackend, PyAudioBackend, LoopbackBackend
+from .capture_profiles import CaptureProfile, get_capture_profile
 
 
 # class _CombinedMeta(type(MediaStreamTrack), type(BetterLog)):
 #     pass
 
 
+class CaptureSource(BetterLog):
+    """
+    One backend captured on a dedicated thread into a preallocated ring buffer,
+    converted to the track's format (rate, channels) on the way in.
+    """
+    def __init__(self, logger: logging.Logger, backend: CaptureBackend, rate:int, channels:int, frames_per_buffer:int, buffer_frames=10):
+        BetterLog.__init__(self, logger=logger)
+
+        self.backend = backend
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+
+        self.ring = AudioRingBuffer(buffer_frames * frames_per_buffer, channels)
+        self.converter: AudioConverter = None
+        self._device_frames = frames_per_buffer
+        """ Frames read from the backend per track frame """
+
+        self.last_write = None
+        """ `time.perf_counter()` when the newest buffered audio was captured """
+        self.capture_errors = 0
+        self.ended = False
+        """ The backend reached the end of its stream (e.g. a closed pipe), the track continues with silence """
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        self.log_debug(f"Starting capture thread with {self.backend.__class__.__name__}")
+        self.backend.open()
+
+        # The backend knows its format once open (e.g. the native rate of a device)
+        self.converter = AudioConverter(self.backend.rate, self.backend.channels, self.rate, self.channels)
+        self._device_frames = round(self.frames_per_buffer * self.backend.rate / self.rate)
+        if not self.converter.passthrough:
+            self.log_info(f"Converting {self.backend.rate} Hz x{self.backend.channels} to {self.rate} Hz x{self.channels}")
+
+        self._stop.clear()
+        self.ended = False
+        self._thread = threading.Thread(target=self._capture_loop, name=f"{self.backend.__class__.__name__}-capture", daemon=True)
+        self._thread.start()
+
+    def _capture_loop(self):
+        while not self._stop.is_set():
+            try:
+                data = self.backend.read(self._device_frames)
+            except EOFError as e:
+                self.ended = True
+                self.log_info(f"Capture stopped, end of stream: {e}")
+                return
+            except Exception as e:
+                self.capture_errors += 1
+                self.log_error(f"Capture failed: {e}")
+                self._stop.wait(self.frames_per_buffer / self.rate)
+                continue
+
+            if self.ring.write(self.converter.convert(data)):
+                self.last_write = time.perf_counter()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join(timeout=1)
+        self._thread = None
+        self.backend.close()
+
+    def latency(self, now:float) -> float:
+        """
+        Seconds between the capture of the oldest buffered frame and `now`. None before any capture
+        """
+        if self.last_write is None:
+            return None
+        return self.ring.available() / self.rate + (now - self.last_write)
+
+
 
 class CustomAudioTrack(MediaStreamTrack, BetterLog):
     """
     By Default: Uses Microphone
+
+    Capture runs on a dedicated thread which fills a preallocated ring buffer,
+    `recv` only paces itself and copies the next frame out of it, so a late device
+    never blocks the event loop. Missing audio is replaced with silence (underrun).
+
+    Frames follow the capture `profile` (e.g. "voice": 24 kHz mono, "music": 48 kHz stereo).
+    A device with another native rate or channel count is converted on the capture thread.
+    Frames below the profile's VAD threshold are marked silent (`frame.opaque["silent"]`),
+    the shared encoders of `AudioBroadcaster` then skip them.
     """
     kind = "audio"
 
-    def __init__(self, logger: logging.Logger, rate=48000, channels=2, frames_per_buffer=960):
+    backend_class: type[CaptureBackend] = PyAudioBackend
+    """ Used when no backend is passed explicitly"""
+
+    def __init__(self, logger: logging.Logger, profile: str | CaptureProfile = "music",
+                 backend: CaptureBackend = None, buffer_frames=10, max_latency_frames=3, vad: VoiceActivityDetector = None):
+        """
+        :param profile: name in `CAPTURE_PROFILES` or a `CaptureProfile`
+        :param backend: capture source, in any format. Defaults to `backend_class`
+        :param buffer_frames: ring buffer capacity, in `frames_per_buffer` units
+        :param max_latency_frames: older audio is dropped when more than this is buffered
+        :param vad: silence detection. Defaults to one with the profile's threshold (if any)
+        """
         MediaStreamTrack.__init__(self)
         BetterLog.__init__(self, logger=logger)
         # super().__init__(logger=logger)  # initializes both supers
 
-        self.rate = rate
-        self.channels = channels
-        self.frames_per_buffer = frames_per_buffer
+        self.profile = get_capture_profile(profile)
+        self.rate = self.profile.rate
+        self.channels = channels = self.profile.channels
+        self.frames_per_buffer = frames_per_buffer = self.profile.frames_per_buffer
+        self.max_latency_frames = max_latency_frames * frames_per_buffer
+
+        backend = backend if backend is not None else self.backend_class(logger, self.rate, channels, frames_per_buffer)
+        self.source = CaptureSource(logger, backend, self.rate, channels, frames_per_buffer, buffer_frames)
+        self.backend = backend
+        self.ring = self.source.ring
+        if vad is None and self.profile.vad_threshold_db is not None:
+            vad = VoiceActivityDetector(
+                threshold_db=self.profile.vad_threshold_db,
+                hangover_frames=300 // self.profile.frame_duration,
+                noise_tracking=self.profile.vad_noise_tracking,
+            )
+        self.vad = vad
+
+        self._frame_buffer = np.zeros((frames_per_buffer, channels), dtype=np.int16)
+        self._layout = "mono" if channels == 1 else "stereo"
+        self._time_base = fractions.Fraction(1, self.rate)
 
         self._timestamp = 0
+        self._start = None
+        self.frames_sent = 0
 
-        self.pa = pyaudio.PyAudio()
+    """
+    Capture thread
+    """
 
-        self.stream_parameters = {
-            "format": pyaudio.paInt16,
-            "channels": self.channels,
-            "rate": self.rate,
-            "input": True,
-            "frames_per_buffer": self.frames_per_buffer
-        }
+    def start_capture(self):
+        self.source.start()
+
+    def stop_capture(self):
+        self.source.stop()
 
-        self.open_stream()
+    @property
+    def capture_errors(self) -> int:
+        return self.source.capture_errors
 
-    def open_stream(self):
-        self.log_debug(f"Opening the stream with parameters: {self.stream_parameters}")
-        self.stream = self.pa.open(**self.stream_parameters)
+    def read_frame(self, out:np.ndarray) -> bool:
+        """
+        Fills `out` with the next frame of captured audio.
 
-    def stream_read(self):
-        data = np.frombuffer(self.stream.read(self.frames_per_buffer), 
-                             dtype=np.int16)
-        data = data.reshape(-1, 1).T
-        return data
+        :returns: False if not enough audio was captured
+        """
+        # Keep latency bounded if the device clock runs faster than ours
+        self.ring.trim(self.max_latency_frames)
+        return self.ring.read_into(out)
+
+    """
+    MediaStreamTrack
+    """
 
     async def recv(self):
-        data = self.stream_read()
+        if self.readyState != "live":
+            raise MediaStreamError
+
+        if self._start is None:
+            self.start_capture()
+            self._start = time.time()
+        else:
+            self._timestamp += self.frames_per_buffer
+            wait = self._start + (self._timestamp / self.rate) - time.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif -wait > self.max_latency_frames / self.rate:
+                # Nobody pulled for a while (e.g. no subscribers). Resync instead of bursting
+                self._start = time.time() - self._timestamp / self.rate
+
+        if not self.read_frame(self._frame_buffer):
+            self._frame_buffer.fill(0)
 
-        self._timestamp += self.frames_per_buffer
-        pts = self._timestamp
-        time_base = fractions.Fraction(1, self.rate)
-        
-        audio_frame = AudioFrame.from_ndarray(data, format='s16', layout='stereo')
+        audio_frame = AudioFrame.from_ndarray(self._frame_buffer.reshape(1, -1), format='s16', layout=self._layout)
         audio_frame.sample_rate = self.rate
-        audio_frame.pts = pts
-        audio_frame.time_base = time_base
+        audio_frame.pts = self._timestamp
+        audio_frame.time_base = self._time_base
+        if self.vad is not None:
+            audio_frame.opaque = {"silent": not self.vad.process(self._frame_buffer)}
 
+        self.frames_sent += 1
         return audio_frame
 
+    def stop(self):
+        super().stop()
+        self.stop_capture()
+
+    def get_stats(self) -> dict:
+        return {
+            "frames_sent": self.frames_sent,
+            "capture_errors": self.capture_errors,
+            **self.ring.stats(),
+            **(self.vad.stats() if self.vad is not None else {}),
+        }
+
     def __del__(self):
-        self.stream.stop_stream()
-        self.stream.close()
-        self.pa.terminate()
+        if getattr(self, "source", None) is not None and self.source.running:
+            self.stop_capture()
 
 class MicrophoneAudioTrack(CustomAudioTrack):
     pass
 
 class LoopbackAudioTrack(CustomAudioTrack):
-    def open_stream(self):
+    backend_class = LoopbackBackend
+
+
+@dataclass
+class MixSource:
+    """
+    One input of a `MixedAudioTrack`
+    """
+    name: str
+    backend: CaptureBackend
+    gain: float = 1.0
+    voice: bool = False
+    """ Speech on this source ducks the other sources """
+
+
+class MixedAudioTrack(CustomAudioTrack):
+    """
+    By Default: Microphone + Loopback, sent as one track. Peers encode (and receive) one
+    stream instead of two.
+
+    Every source is captured on its own thread. Before each frame the sources are aligned
+    on capture time: a source whose buffered audio is older than the others' (it started
+    earlier, or its device delivers bigger blocks) is trimmed to match, so voice and
+    music don't drift apart.
+
+    Sources are scaled by their gain and summed in preallocated float32 buffers. While speech
+    is detected on a `voice` source the others are ducked by `ducking_db` (0: no ducking).
+    Gain changes ramp over one frame, no clicks.
+    """
+    def __init__(self, logger: logging.Logger, profile: str | CaptureProfile = "music", sources: list[MixSource] = None,
+                 ducking_db=-12.0, duck_hangover_ms=500, buffer_frames=10, max_latency_frames=3, vad: VoiceActivityDetector = None):
+        """
+        :param sources: defaults to the microphone (voice) and the loopback of the default output
+        :param duck_hangover_ms: the others stay ducked this long after the last speech
+        """
+        profile = get_capture_profile(profile)
+        if sources is None:
+            device_format = (logger, profile.rate, profile.channels, profile.frames_per_buffer)
+            sources = [
+                MixSource("microphone", PyAudioBackend(*device_format), gain=1.0, voice=True),
+                MixSource("loopback", LoopbackBackend(*device_format), gain=0.7),
+            ]
+
+        super().__init__(logger, profile, backend=sources[0].backend, buffer_frames=buffer_frames, max_latency_frames=max_latency_frames, vad=vad)
+
+        frames, channels = self.frames_per_buffer, self.channels
+        self.sources = sources
+        self.captures = [self.source] + [
+            CaptureSource(logger, source.backend, self.rate, channels, frames, buffer_frames) for source in sources[1:]
+        ]
+        self.voice_detectors = {
+            i: VoiceActivityDetector(hangover_frames=duck_hangover_ms // profile.frame_duration)
+            for i, source in enumerate(sources) if source.voice and ducking_db
+        }
+        self.duck_gain = 10 ** (ducking_db / 20)
+
+        self._stack = np.zeros((len(sources), frames, channels), dtype=np.int16)
+        self._read = np.zeros(len(sources), dtype=bool)
+        self._applied_gains = np.array([source.gain for source in sources], dtype=np.float32)
+        self._ramp = np.linspace(1 / frames, 1, frames, dtype=np.float32)[:, None]
+        self._gains = np.zeros((frames, 1), dtype=np.float32)
+        self._scaled = np.zeros((frames, channels), dtype=np.float32)
+        self._mix = np.zeros((frames, channels), dtype=np.float32)
+
+        self.aligned_frames = 0
+        """ Frames trimmed to align the sources """
+        self.ducked_frames = 0
+
+    def start_capture(self):
+        for capture in self.captures:
+            capture.start()
+
+    def stop_capture(self):
+        for capture in self.captures:
+            capture.stop()
+
+    @property
+    def capture_errors(self) -> int:
+        return sum(capture.capture_errors for capture in self.captures)
 
-        device_index = self.pa.get_default_wasapi_loopback().get("index")
-        device = self.pa.get_device_info_by_index(device_index)
-        self.log_debug(f"Found Loopback device: {device}")
+    def align(self):
+        """
+        Trims every source to the capture time of the most recent one
+        """
+        now = time.perf_counter()
+        latencies = [capture.latency(now) for capture in self.captures]
+        known = [latency for latency in latencies if latency is not None]
+        if len(known) < 2:
+            return
 
-        self.stream_parameters["input_device_index"] = device_index
-        return super().open_stream()
+        target = min(known)
+        for capture, latency in zip(self.captures, latencies):
+            excess = 0 if latency is None else int((latency - target) * self.rate)
+            # Within half a frame is what device block sizes jitter anyway
+            if excess > self.frames_per_buffer // 2:
+                self.aligned_frames += capture.ring.trim(max(capture.ring.available() - excess, 0))
+
+    def read_frame(self, out:np.ndarray) -> bool:
+        self.align()
+
+        speaking = False
+        for i, capture in enumerate(self.captures):
+            capture.ring.trim(self.max_latency_frames)
+            self._read[i] = capture.ring.read_into(self._stack[i])
+            if self._read[i] and i in self.voice_detectors:
+                speaking |= self.voice_detectors[i].process(self._stack[i])
+
+        if not self._read.any():
+            return False
+
+        self.ducked_frames += speaking
+        self._mix.fill(0)
+        for i, source in enumerate(self.sources):
+            gain = source.gain * (self.duck_gain if speaking and not source.voice else 1.0)
+            applied = self._applied_gains[i]
+            self._applied_gains[i] = gain
+            if not self._read[i]:
+                continue
+
+            if gain == applied:
+                np.multiply(self._stack[i], gain, out=self._scaled)
+            else:
+                # applied -> gain over the frame
+                np.multiply(self._ramp, gain - applied, out=self._gains)
+                self._gains += applied
+                np.multiply(self._stack[i], self._gains, out=self._scaled)
+            self._mix += self._scaled
+
+        np.rint(self._mix, out=self._mix)
+        np.clip(self._mix, -32768, 32767, out=self._mix)
+        np.copyto(out, self._mix, casting="unsafe")
+        return True
+
+    def get_stats(self) -> dict:
+        return {
+            **super().get_stats(),
+            "aligned_frames": self.aligned_frames,
+            "ducked_frames": self.ducked_frames,
+            "sources": {source.name: {"capture_errors": capture.capture_errors, **capture.ring.stats()} for source, capture in zip(self.sources, self.captures)},
+        }
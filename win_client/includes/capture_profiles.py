@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+
+from .AudioBroadcaster import EncoderProfile, ENCODER_PROFILES, VOICE_ENCODER_PROFILES
+
+
+@dataclass(frozen=True)
+class CaptureProfile:
+    """
+    Format the audio is captured, buffered and sent in. Devices with another native
+    format are converted by the track.
+    """
+    name: str
+    rate: int
+    channels: int
+    frame_duration: int = 20
+    """ ms per frame """
+    encoder_profiles: tuple[EncoderProfile] = ENCODER_PROFILES
+    """ Opus settings for this content, best to worst (see `BitrateController`) """
+    vad_threshold_db: float = None
+    """ Frames below this level (dBFS) are marked silent and not sent. None: no detection """
+    vad_noise_tracking: bool = True
+    """ Also require a margin above the background noise (speech) """
+
+    @property
+    def frames_per_buffer(self) -> int:
+        return self.rate * self.frame_duration // 1000
+
+
+CAPTURE_PROFILES: dict[str, CaptureProfile] = {profile.name: profile for profile in (
+    CaptureProfile("voice", rate=24000, channels=1, encoder_profiles=VOICE_ENCODER_PROFILES, vad_threshold_db=-45),
+    CaptureProfile("voice_hd", rate=48000, channels=1, encoder_profiles=VOICE_ENCODER_PROFILES, vad_threshold_db=-45),
+    # Quiet passages must not be cut: only (near) digital silence, e.g. paused playback
+    CaptureProfile("music", rate=48000, channels=2, vad_threshold_db=-70, vad_noise_tracking=False),
+    CaptureProfile("music_low_latency", rate=48000, channels=2, frame_duration=10, vad_threshold_db=-70, vad_noise_tracking=False),
+)}
+""" Profiles by name, see `get_capture_profile`"""
+
+def get_capture_profile(profile: str | CaptureProfile) -> CaptureProfile:
+    """
+    :raises ValueError: unknown profile name
+    """
+    if isinstance(profile, CaptureProfile):
+        return profile
+    try:
+        return CAPTURE_PROFILES[profile]
+    except KeyError:
+        raise ValueError(f"Unknown capture profile `{profile}`. Available: {list(CAPTURE_PROFILES)}")
@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+
+
+class AudioConverter:
+    """
+    Streaming channel mix and sample rate conversion of int16 audio, vectorized with NumPy.
+
+    - Channels: the mean of the input channels is copied to every output channel
+    - Integer downsampling (48 kHz -> 24/16 kHz): mean of each group of input frames.
+      This box filter is a poor low-pass: its response only falls to zero at multiples of the
+      output rate and its first sidelobe is just ~13 dB down, so content above the new
+      Nyquist frequency (e.g. 8-24 kHz for 16 kHz) aliases back, only mildly attenuated.
+      Fine for voice, not for music at a reduced rate
+    - Other ratios (e.g. a 44.1 kHz device for a 48 kHz profile): linear interpolation
+
+    State carries over between blocks, so blocks of any size give one continuous signal.
+    All work buffers are preallocated: `convert` returns a view of an internal buffer,
+    valid until the next call.
+    """
+    def __init__(self, in_rate:int, in_channels:int, out_rate:int, out_channels:int, max_frames=4096):
+        self.in_rate = in_rate
+        self.in_channels = in_channels
+        self.out_rate = out_rate
+        self.out_channels = out_channels
+
+        self.step = in_rate / out_rate
+        """ Input frames per output frame """
+        self.factor = in_rate // out_rate if in_rate % out_rate == 0 else None
+        """ Decimation factor, None when interpolating """
+        self.passthrough = in_rate == out_rate and in_channels == out_channels
+
+        self._lead = 0
+        """ Rows at the start of the work buffer carried over from the previous block """
+        self._position = 1.0
+        """ Interpolation: position of the next output frame, 0 being the last frame of the previous block """
+        if self.factor is None:
+            self._lead = 1
+
+        self.max_frames = 0
+        self._allocate(max_frames)
+
+    def _allocate(self, max_frames:int):
+        carried = self._work[:self._lead].copy() if self.max_frames else None
+
+        self.max_frames = max_frames
+        max_out = math.ceil(max_frames / self.step) + 1
+        channels = self.out_channels
+
+        self._work = np.zeros((max_frames + (self.factor or 1), channels), dtype=np.float32)
+        self._mono = np.zeros(max_frames, dtype=np.float32)
+        self._result = np.zeros((max_out, channels), dtype=np.float32)
+        self._out = np.zeros((max_out, channels), dtype=np.int16)
+
+        if self.factor is None:
+            self._offsets = np.arange(max_out) * self.step
+            self._positions = np.zeros(max_out)
+            self._indices = np.zeros(max_out, dtype=np.intp)
+            self._fractions = np.zeros((max_out, 1), dtype=np.float32)
+            self._right = np.zeros((max_out, channels), dtype=np.float32)
+
+        if carried is not None:
+            self._work[:len(carried)] = carried
+
+    def convert(self, samples:np.ndarray) -> np.ndarray:
+        """
+        :param samples: int16 (frames, in_channels)
+        :returns: int16 (frames', out_channels). frames' follows the rate ratio, +-1 between blocks
+        """
+        if self.passthrough:
+            return samples
+
+        frames = len(samples)
+        if frames > self.max_frames:
+            self._allocate(frames)
+
+        self._mix(samples, self._work[self._lead:self._lead + frames])
+
+        if self.factor == 1:
+            result = self._work[:frames]
+        elif self.factor is not None:
+            result = self._decimate(frames)
+        else:
+            result = self._interpolate(frames)
+
+        out = self._out[:len(result)]
+        np.rint(result, out=result)
+        np.clip(result, -32768, 32767, out=result)
+        np.copyto(out, result, casting="unsafe")
+        return out
+
+    def _mix(self, samples:np.ndarray, mixed:np.ndarray):
+        if self.in_channels == self.out_channels:
+            np.copyto(mixed, samples)
+            return
+
+        mono = self._mono[:len(samples)]
+        np.mean(samples, axis=1, dtype=np.float32, out=mono)
+        mixed[:] = mono[:, None]
+
+    def _decimate(self, frames:int) -> np.ndarray:
+        total = self._lead + frames
+        count = total // self.factor
+        used = count * self.factor
+
+        result = self._result[:count]
+        groups = self._work[:used].reshape(count, self.factor, self.out_channels)
+        np.mean(groups, axis=1, out=result)
+
+        # Incomplete group waits for the next block
+        self._lead = total - used
+        self._work[:self._lead] = self._work[used:total]
+        return result
+
+    def _interpolate(self, frames:int) -> np.ndarray:
+        # Row 0 is the last frame of the previous block, this block is at rows 1..frames
+        count = max(0, math.ceil((frames - self._position) / self.step))
+
+        positions = self._positions[:count]
+        np.add(self._offsets[:count], self._position, out=positions)
+        indices = self._indices[:count]
+        np.copyto(indices, positions, casting="unsafe")
+        fractions = self._fractions[:count, 0]
+        np.subtract(positions, indices, out=fractions, casting="unsafe")
+
+        result, right = self._result[:count], self._right[:count]
+        np.take(self._work, indices, axis=0, out=result)
+        indices += 1
+        np.take(self._work, indices, axis=0, out=right)
+
+        # left + (right - left) * fraction
+        right -= result
+        right *= self._fractions[:count]
+        result += right
+
+        self._position += count * self.step - frames
+        self._work[0] = self._work[frames]
+        return result
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """
+    Preallocated single-producer / single-consumer ring buffer for interleaved audio.
+
+    Lock-free: the producer (capture thread) only advances `write_pos`, the consumer
+    (event loop) only advances `read_pos`. Both are monotonic frame counters and a plain
+    int assignment is atomic under the GIL, so the data is always copied before
+    the position which publishes it is moved.
+    """
+    def __init__(self, capacity_frames:int, channels:int, dtype=np.int16):
+        self.capacity = capacity_frames
+        self.channels = channels
+        self.buffer = np.zeros((capacity_frames, channels), dtype=dtype)
+
+        self.write_pos = 0
+        self.read_pos = 0
+
+        self.overruns = 0
+        """ Writes dropped because the buffer was full (producer side)"""
+        self.underruns = 0
+        """ Reads which could not be served (consumer side)"""
+        self.trimmed_frames = 0
+        """ Frames skipped by the consumer to keep the latency bounded"""
+
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def free(self) -> int:
+        return self.capacity - self.available()
+
+    def write(self, data:np.ndarray) -> bool:
+        """
+        Producer side. Copies `data` (frames x channels) into the buffer.
+
+        :returns: False if there was not enough space. The data is dropped and counted as overrun.
+        """
+        frames = len(data)
+        if frames > self.free():
+            self.overruns += 1
+            return False
+
+        start = self.write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        self.buffer[start:start + first] = data[:first]
+        if first < frames:
+            self.buffer[:frames - first] = data[first:]
+
+        self.write_pos += frames
+        return True
+
+    def read_into(self, out:np.ndarray) -> bool:
+        """
+        Consumer side. Fills `out` (frames x channels) without allocating.
+
+        :returns: False if not enough frames are buffered. `out` is left untouched and counted as underrun.
+        """
+        frames = len(out)
+        if frames > self.available():
+            self.underruns += 1
+            return False
+
+        start = self.read_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        out[:first] = self.buffer[start:start + first]
+        if first < frames:
+            out[first:] = self.buffer[:frames - first]
+
+        self.read_pos += frames
+        return True
+
+    def trim(self, max_frames:int) -> int:
+        """
+        Consumer side. Drops the oldest frames so no more than `max_frames` stay buffered.
+
+        :returns: amount of dropped frames
+        """
+        excess = self.available() - max_frames
+        if excess <= 0:
+            return 0
+
+        self.read_pos += excess
+        self.trimmed_frames += excess
+        return excess
+
+    def stats(self) -> dict:
+        return {
+            "buffered": self.available(),
+            "overruns": self.overruns,
+            "underruns": self.underruns,
+            "trimmed_frames": self.trimmed_frames,
+        }
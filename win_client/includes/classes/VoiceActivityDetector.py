@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+
+
+def is_silent(frame) -> bool:
+    """
+    True if the frame was marked silent by a `VoiceActivityDetector` (see `CustomAudioTrack`)
+    """
+    opaque = getattr(frame, "opaque", None)
+    return isinstance(opaque, dict) and opaque.get("silent", False)
+
+
+class VoiceActivityDetector:
+    """
+    Energy based voice activity detection of int16 frames.
+
+    A frame is active when its level is above `threshold_db` (dBFS). With `noise_tracking`
+    (speech) it must also be `margin_db` above the noise floor, which follows quieter frames
+    at once and rises slowly up to `max_floor_db`: a fan or a noisy room is not "speech".
+    Music keeps it off, otherwise quiet steady passages would be learned as noise.
+
+    Activity is held for `hangover_frames` after the last active frame: word endings and short
+    pauses between words stay in, and a new onset does not have to ramp the encoder up again.
+    """
+    def __init__(self, threshold_db=-45.0, margin_db=10.0, hangover_frames=15, noise_tracking=True, max_floor_db=-30.0, floor_rise_db=0.05):
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.hangover_frames = hangover_frames
+        self.noise_tracking = noise_tracking
+        self.max_floor_db = max_floor_db
+        self.floor_rise_db = floor_rise_db
+        """ Per frame """
+
+        self.noise_floor_db = -120.0
+        self.level_db = -math.inf
+        self._hangover = 0
+        self._buffer = np.zeros(0, dtype=np.float32)
+
+        self.frames = 0
+        self.silent_frames = 0
+
+    def level(self, samples: np.ndarray) -> float:
+        """
+        RMS level of int16 samples (any shape) in dBFS
+        """
+        flat = samples.reshape(-1)
+        if len(self._buffer) != len(flat):
+            self._buffer = np.zeros(len(flat), dtype=np.float32)
+
+        np.multiply(flat, 1 / 32768, out=self._buffer)
+        energy = float(np.dot(self._buffer, self._buffer)) / max(len(flat), 1)
+        return 10 * math.log10(energy) if energy > 1e-12 else -120.0
+
+    def process(self, samples: np.ndarray) -> bool:
+        """
+        :returns: True if the frame is speech (or within the hangover)
+        """
+        self.level_db = level = self.level(samples)
+        if self.noise_tracking:
+            # Starts at the first frame: a noisy room is known from the beginning, a pause corrects a loud start
+            floor = self.noise_floor_db + self.floor_rise_db if self.frames else level
+            self.noise_floor_db = min(level, floor, self.max_floor_db)
+
+        if level >= self.threshold_db and level >= self.noise_floor_db + self.margin_db:
+            self._hangover = self.hangover_frames
+            active = True
+        elif self._hangover > 0:
+            self._hangover -= 1
+            active = True
+        else:
+            active = False
+
+        self.frames += 1
+        self.silent_frames += not active
+        return active
+
+    def stats(self) -> dict:
+        return {
+            "vad_frames": self.frames,
+            "silent_frames": self.silent_frames,
+            "noise_floor_db": round(self.noise_floor_db, 1),
+        }
+
+
+class DtxGate:
+    """
+    Discontinuous transmission: decides which silent frames are still encoded and sent.
+
+    During silence only one frame every `keepalive_frames` goes out (400 ms at 20 ms frames,
+    like WebRTC's Opus DTX), enough for the receiver to play comfort noise and keep its
+    jitter buffer alive. Everything else is skipped before the encoder.
+    """
+    def __init__(self, keepalive_frames=20):
+        self.keepalive_frames = keepalive_frames
+        self._since_sent = 0
+
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def should_send(self, silent: bool) -> bool:
+        self._since_sent += 1
+        if not silent or self._since_sent >= self.keepalive_frames:
+            self._since_sent = 0
+            self.frames_sent += 1
+            return True
+
+        self.frames_skipped += 1
+        return False
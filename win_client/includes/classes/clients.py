@@ -24,6 +24,8 @@ class BaseClient(BetterLog):
 class RemoteClient(BaseClient):
     peerConnection: RTCPeerConnection = None
     data_channel:RTCDataChannel = None
+    pending_candidates: list = field(default_factory=list)
+    """ ICE candidates received before the remote description was set"""
 
     @staticmethod
     def from_payload(user_dict):
@@ -0,0 +1,7 @@
+from enum import Enum
+
+class PeerEvent(Enum):
+    """
+    Local events, handled in the same per-peer queue as the signaling messages
+    """
+    CONNECTION_LOST = "connection_lost"
\ No newline at end of file
@@ -0,0 +1,28 @@
+from aiortc import RTCIceCandidate
+from aiortc.sdp import candidate_from_sdp
+
+
+def parse_candidate(candidate: str, sdpMid: str = None, sdpMLineIndex: int = None) -> RTCIceCandidate:
+    """
+    Parse an `a=candidate` value (RFC 8839) with aiortc's parser, like the SFU does:
+
+        candidate:<foundation> <component> <transport> <priority> <address> <port> typ <type> ...
+
+    :returns: the candidate or None for an end-of-candidates indication (empty string)
+    :raises ValueError: if the string does not follow the grammar. aiortc only asserts it
+    """
+    if candidate.startswith("candidate:"):
+        candidate = candidate[10:]
+
+    parts = candidate.split()
+    if not parts:
+        return None
+    if len(parts) < 8 or parts[6] != "typ":
+        raise ValueError(f"Invalid ICE candidate: {candidate!r}")
+
+    rtc_candidate = candidate_from_sdp(candidate)
+    # Firefox sends "UDP"
+    rtc_candidate.protocol = rtc_candidate.protocol.lower()
+    rtc_candidate.sdpMid = sdpMid
+    rtc_candidate.sdpMLineIndex = sdpMLineIndex
+    return rtc_candidate
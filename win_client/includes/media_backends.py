@@ -0,0 +1,185 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from .classes.BetterLog import BetterLog
+
+
+class MediaSessionBackend(BetterLog, ABC):
+    """
+    System media session used by `MediaController`.
+
+    `subscribe` registers a change notification (new session, new media properties).
+    Backends without notifications return False and are polled instead.
+    The callback may be called from any thread.
+    """
+    def __init__(self, logger: logging.Logger = None):
+        super().__init__(logger)
+
+    async def initialize(self):
+        pass
+
+    @abstractmethod
+    def has_session(self) -> bool: ...
+
+    @abstractmethod
+    async def play(self): ...
+
+    @abstractmethod
+    async def pause(self): ...
+
+    @abstractmethod
+    async def next_track(self): ...
+
+    @abstractmethod
+    async def previous_track(self): ...
+
+    @abstractmethod
+    async def get_media_properties(self) -> dict: ...
+
+    def subscribe(self, on_change: Callable[[], None]) -> bool:
+        return False
+
+    def unsubscribe(self):
+        pass
+
+
+class WinsdkMediaBackend(MediaSessionBackend):
+    """
+    Windows Global System Media Transport Controls
+    """
+    def __init__(self, logger: logging.Logger = None):
+        super().__init__(logger)
+        self.sessions = None
+        self.current_session = None
+
+        self._on_change: Callable = None
+        self._session_token = None
+        self._properties_token = None
+        self._playback_token = None
+
+    async def initialize(self):
+        # Windows-only dependency
+        from winsdk.windows.media.control import (
+            GlobalSystemMediaTransportControlsSessionManager as MediaManager
+        )
+
+        self.sessions = await MediaManager.request_async()
+        self.current_session = self.sessions.get_current_session()
+
+    def has_session(self) -> bool:
+        return self.current_session is not None
+
+    async def play(self):
+        await self.current_session.try_play_async()
+
+    async def pause(self):
+        await self.current_session.try_pause_async()
+
+    async def next_track(self):
+        await self.current_session.try_skip_next_async()
+
+    async def previous_track(self):
+        await self.current_session.try_skip_previous_async()
+
+    async def get_media_properties(self) -> dict:
+        properties = await self.current_session.try_get_media_properties_async()
+        return {
+            "title": properties.title,
+            "artist": properties.artist,
+            "album": properties.album_title,
+            "track_number": properties.track_number,
+        }
+
+    def subscribe(self, on_change: Callable[[], None]) -> bool:
+        self._on_change = on_change
+        self._session_token = self.sessions.add_current_session_changed(self._handle_session_changed)
+        self._subscribe_session()
+        return True
+
+    def unsubscribe(self):
+        self._unsubscribe_session()
+        if self._session_token is not None:
+            self.sessions.remove_current_session_changed(self._session_token)
+            self._session_token = None
+        self._on_change = None
+
+    def _subscribe_session(self):
+        if self.current_session is None:
+            return
+        self._properties_token = self.current_session.add_media_properties_changed(self._notify)
+        self._playback_token = self.current_session.add_playback_info_changed(self._notify)
+
+    def _unsubscribe_session(self):
+        if self.current_session is None:
+            return
+        if self._properties_token is not None:
+            self.current_session.remove_media_properties_changed(self._properties_token)
+            self._properties_token = None
+        if self._playback_token is not None:
+            self.current_session.remove_playback_info_changed(self._playback_token)
+            self._playback_token = None
+
+    def _handle_session_changed(self, *_):
+        self._unsubscribe_session()
+        self.current_session = self.sessions.get_current_session()
+        self._subscribe_session()
+        self._notify()
+
+    def _notify(self, *_):
+        # Runs on a WinRT thread, possibly after `unsubscribe`
+        on_change = self._on_change
+        if on_change is not None:
+            on_change()
+
+
+class FakeMediaBackend(MediaSessionBackend):
+    """
+    In-memory media session for tests and Linux runs.
+
+    :param supports_events: False emulates a backend which can only be polled
+    """
+    def __init__(self, logger: logging.Logger = None, now_playing: dict = None, supports_events=True):
+        super().__init__(logger)
+        self.now_playing = now_playing
+        self.supports_events = supports_events
+        self.playing = False
+        self.actions: list[str] = []
+        self.properties_requests = 0
+
+        self._on_change: Callable = None
+
+    def has_session(self) -> bool:
+        return self.now_playing is not None
+
+    async def play(self):
+        self.actions.append("play")
+        self.playing = True
+
+    async def pause(self):
+        self.actions.append("pause")
+        self.playing = False
+
+    async def next_track(self):
+        self.actions.append("next")
+
+    async def previous_track(self):
+        self.actions.append("previous")
+
+    async def get_media_properties(self) -> dict:
+        self.properties_requests += 1
+        return dict(self.now_playing)
+
+    def set_now_playing(self, now_playing: dict):
+        self.now_playing = now_playing
+        if self._on_change is not None:
+            self._on_change()
+
+    def subscribe(self, on_change: Callable[[], None]) -> bool:
+        if not self.supports_events:
+            return False
+        self._on_change = on_change
+        return True
+
+    def unsubscribe(self):
+        self._on_change = None
@@ -0,0 +1,42 @@
+from aiortc import RTCStatsReport
+
+
+SUMMARY_FIELDS = (
+    "packets_sent", "bytes_sent", "packets_received", "bytes_received",
+    "remote_packets_lost", "fraction_lost", "rtt", "remote_jitter", "jitter", "reported_at",
+)
+
+
+def summarize_report(report: RTCStatsReport) -> dict:
+    """
+    Flatten an aiortc stats report into one small dict per peer connection.
+
+    Counters are summed over the RTP streams. `fraction_lost` (0..1) and `rtt` (seconds)
+    come from the latest RTCP receiver report of the remote side (received at `reported_at`),
+    `None` until one arrived.
+    Jitter values are in RTP timestamp units.
+    """
+    summary = dict.fromkeys(SUMMARY_FIELDS, 0)
+    summary["fraction_lost"] = summary["rtt"] = summary["reported_at"] = None
+
+    for stats in report.values():
+        match stats.type:
+            case "outbound-rtp":
+                summary["packets_sent"] += stats.packetsSent
+                summary["bytes_sent"] += stats.bytesSent
+            case "inbound-rtp":
+                summary["packets_received"] += stats.packetsReceived
+                summary["jitter"] = max(summary["jitter"], stats.jitter)
+            case "remote-inbound-rtp":
+                summary["remote_packets_lost"] += stats.packetsLost
+                summary["reported_at"] = max(summary["reported_at"] or stats.timestamp, stats.timestamp)
+                summary["remote_jitter"] = max(summary["remote_jitter"], stats.jitter)
+                # RTCP carries the fraction as an 8 bit fixed point number
+                fraction_lost = stats.fractionLost / 256
+                summary["fraction_lost"] = max(summary["fraction_lost"] or 0.0, fraction_lost)
+                if stats.roundTripTime is not None:
+                    summary["rtt"] = max(summary["rtt"] or 0.0, stats.roundTripTime)
+            case "transport":
+                summary["bytes_received"] += stats.bytesReceived
+
+    return summary
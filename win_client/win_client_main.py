@@ -17,20 +17,31 @@ from config import SIGNALING_SERVER
 from servers.logging_config import get_logger
 from servers.includes.enums import MessageType
 
-from includes.audio_tracks import MicrophoneAudioTrack, LoopbackAudioTrack
+from includes.audio_tracks import CustomAudioTrack, MicrophoneAudioTrack, LoopbackAudioTrack
+from includes.AudioBroadcaster import AudioBroadcaster, ENCODER_PROFILES
+from includes.AudioMixer import AudioMixer
+from includes.BulkTransfer import BulkTransfer
+from includes.audio_sinks import create_sink
+from includes.BitrateController import BitrateController
+from includes.StatsCollector import StatsCollector
+from includes.ConnectionMonitor import ConnectionMonitor
+from includes.ChannelMessenger import ChannelMessenger
+from includes.PeerMessageDispatcher import PeerMessageDispatcher
 from includes.MediaController import MediaController, MediaAction
+from includes.enums.PeerEvent import PeerEvent
 from includes.SignalingHandler import SignalingHandler
 from includes.PeerConnectionManager import PeerConnectionManager
 
 from includes.classes.BetterLog import BetterLog
 from includes.classes.clients import LocalClient, RemoteClient
 from includes.WebSocketClient import WebSocketClient
+from includes.SignalingTracer import SignalingTracer
 
 
 
 class SignalingClient(LocalClient):
 
-    def __init__(self, name:str, logger, media_controller:MediaController, wsc: WebSocketClient, audio_track:MediaStreamTrack):
+    def __init__(self, name:str, logger, media_controller:MediaController, wsc: WebSocketClient, audio_track:MediaStreamTrack, encode_once=False, pc_pool_size=0, adaptive_bitrate=False, stats_port=None, stats_file=None, playback:AudioMixer=None, receive_dir:str=None):
         LocalClient.__init__(self, name=name)
         BetterLog.__init__(self, logger=logger)
 
@@ -38,6 +49,26 @@ class SignalingClient(LocalClient):
         self.background_np_update = None
         self.wsc = wsc
         self.audio_track = audio_track
+        # Every peer gets its own subscriber track, the source is captured once
+        # encode_once: peers with the same negotiated Opus parameters also share one encoder
+        # The capture profile (voice/music) picks the Opus settings
+        encoder_profiles = audio_track.profile.encoder_profiles if isinstance(audio_track, CustomAudioTrack) else ENCODER_PROFILES
+        self.audio_broadcaster = AudioBroadcaster(logger, audio_track, encode_once=encode_once, default_profile=encoder_profiles[0])
+        # Serialize-once, batched and backpressure-aware data channel messages
+        self.messenger = ChannelMessenger(logger, self.remotePeers)
+        # Pre-warmed peer connections, so JOIN/OFFER don't wait for ICE gathering
+        self.pc_pool_size = pc_pool_size
+        # Dead connections are replaced over the current signaling connection, no re-JOIN
+        self.connection_monitor = ConnectionMonitor(logger, self, self.on_connection_lost)
+        self.dispatcher: PeerMessageDispatcher = None
+        # Per-peer Opus bitrate/packet time/FEC from RTCP feedback (needs encode_once)
+        self.bitrate_controller = BitrateController(logger, self.audio_broadcaster, profiles=encoder_profiles) if adaptive_bitrate else None
+        # RTT/jitter/loss/bitrate history of every peer, on localhost HTTP and/or a rolling file
+        self.stats_collector = StatsCollector(logger, self, http_port=stats_port, export_path=stats_file) if stats_port or stats_file else None
+        # Audio the peers send: decoded, jitter-buffered and mixed into one sink
+        self.playback = playback
+        # Audio files over dedicated data channels. Only received into `receive_dir` if one is given
+        self.bulk = BulkTransfer(logger, directory=receive_dir)
 
     async def initialize(self):
         await self.media_controller.initialize()
@@ -51,32 +82,52 @@ class SignalingClient(LocalClient):
         self.background_np_update = asyncio.create_task(self.media_controller.on_np_update(self.on_now_playing_update))
 
     def on_now_playing_update(self, media_info:dict):
-        self.broadcast_to_channels({"message":"update: NOW_PLAYING track", "payload": media_info})
+        # Keyed: a peer which is behind only gets the latest track
+        self.broadcast_to_channels({"message":"update: NOW_PLAYING track", "payload": media_info}, key="now_playing")
 
-    def broadcast_to_channels(self, message):
+    def broadcast_to_channels(self, message, key=None):
         self.log_info(f"Broadcasting message to all remote users: {message}")
-
-        for user in self.remotePeers.values():
-            self.send_to_user_channel(user, message)
+        self.messenger.broadcast(message, key=key)
     
-    def send_to_user_channel(self, user:RemoteClient, message):
-        message = json.dumps(message)
+    def send_to_user_channel(self, user:RemoteClient, message, key=None):
+        self.messenger.send(user.id, message, key=key)
+
+    def on_track(self, track:MediaStreamTrack, remote_user: RemoteClient):
+        self.playback.add_track(remote_user.id, track)
 
-        dc = self.remotePeers[user.id].data_channel
+    def on_connected(self, remote_user: RemoteClient):
+        self.wsc.tracer.connected(remote_user.id)
 
-        if dc is not None:
-            dc.send(message)
+    async def send_files(self, remote_user: RemoteClient, paths: list[str]) -> list[dict]:
+        """
+        Sends audio files (e.g. a playlist) one after another, each resumes an earlier attempt
+        """
+        return [await self.bulk.send_file(remote_user.peerConnection, path) for path in paths]
 
     """
     Channel handlers
     """
 
+    def on_data_channel(self, data_channel:RTCDataChannel, remote_user: RemoteClient):
+        if not self.bulk.accept_channel(data_channel):
+            self.log_debug(f"Ignoring data channel {data_channel.label} of {remote_user.name}")
+
     async def on_channel_open(self, data_channel:RTCDataChannel, remote_user: RemoteClient):
         # data_channels[remote_user.id] = data_channel  # removed. Reason: we already add the data_channel to remote_user during handling offers
-        data_channel.send("Hey! it's me, uber Windows Client")
+        self.send_to_user_channel(remote_user, "Hey! it's me, uber Windows Client")
+        # Messages queued before the channel was open
+        self.messenger.flush(remote_user.id)
 
     async def on_channel_close(self, data_channel:RTCDataChannel, remote_user: RemoteClient):
-        self.remotePeers[remote_user.id].data_channel = None
+        if remote_user.data_channel is not data_channel:
+            # Old channel of a replaced connection: the peer's pending messages wait for the new one
+            return
+        remote_user.data_channel = None
+        self.messenger.drop(remote_user.id)
+
+    def on_connection_lost(self, remote_user: RemoteClient, peer_connection: RTCPeerConnection):
+        if self.dispatcher is not None:
+            self.dispatcher.dispatch(PeerEvent.CONNECTION_LOST, {"user": {"id": remote_user.id}, "peer_connection": peer_connection})
 
     async def on_channel_message(self, data_channel:RTCDataChannel, remote_user: RemoteClient, message: str):
         """
@@ -88,11 +139,38 @@ class SignalingClient(LocalClient):
             self.log_warn("Couldn't convert the msg to MediaAction")
             return
         
-        data_channel.send(f"Handling the Media Action {action.name}")
+        self.send_to_user_channel(remote_user, f"Handling the Media Action {action.name}")
         result = await self.media_controller._perform_action_async(action)
 
         if action == MediaAction.NOW_PLAYING:
-            data_channel.send(json.dumps(result))
+            self.send_to_user_channel(remote_user, result)
+
+    """
+    Signaling
+    """
+
+    def audio_source_for(self, signaling_handler: SignalingHandler, payload: dict) -> AudioBroadcaster:
+        """
+        With an SFU only the connection to it carries our audio, peers get the data channel
+        """
+        if signaling_handler.sfu_id is None or payload["user"]["id"] == signaling_handler.sfu_id:
+            return self.audio_broadcaster
+        return None
+
+    async def handle_signaling_message(self, signaling_handler: SignalingHandler, message_type: MessageType, payload: dict):
+        match message_type:
+            case MessageType.JOIN:
+                await signaling_handler.handle_join(payload, self.audio_source_for(signaling_handler, payload))
+            case MessageType.OFFER:
+                await signaling_handler.handle_offer(payload, self.audio_source_for(signaling_handler, payload))
+            case MessageType.ANSWER:
+                await signaling_handler.handle_answer(payload)
+            case MessageType.CANDIDATE:
+                await signaling_handler.handle_candidate(payload)
+            case PeerEvent.CONNECTION_LOST:
+                await signaling_handler.replace_peer(payload, self.audio_source_for(signaling_handler, payload))
+            case _:
+                self.log_warn(f"Unhandled message type: {message_type}")
 
     """
     Main RUN
@@ -102,35 +180,60 @@ class SignalingClient(LocalClient):
             self.wsc.websocket = websocket
 
             self.log_debug(self.__dict__)
-            peer_connection_manager = PeerConnectionManager(self.logger, self.on_channel_open, self.on_channel_close, self.on_channel_message)
-            signaling_handler = SignalingHandler(self.wsc, self, peer_connection_manager, self.logger)
-
-            await signaling_handler.process_confirm_id()
-
-            # When ID is confirmed, we send JOIN request to all peers (send to Signaling Server, which will broadcast it to everyone)
-            await self.wsc.broadcast(MessageType.JOIN, {})
-
-            # Start signaling loop
-            async for message in websocket:
-                # We don't need to validate messages from server since they are trusted.
-                message:dict = json.loads(message)
-                self.log_debug(f"Received signaling message: {message}")
-
-                message_type = MessageType(message["type"])
-                payload = message.get("payload", {})
-
-                match message_type:
-                    case MessageType.JOIN:
-                        await signaling_handler.handle_join(payload, self.audio_track)
-                    case MessageType.OFFER:
-                        await signaling_handler.handle_offer(payload, self.audio_track)
-                    case MessageType.ANSWER:
-                        await signaling_handler.handle_answer(payload)
-                    case MessageType.CANDIDATE:
-                        await signaling_handler.handle_candidate(payload)
-                    case _:
-                        self.log_warn(f"Unhandled message type: {message_type}")
-            self.log_info("WebRTC connection closed")
+            peer_connection_manager = PeerConnectionManager(self.logger, self.on_channel_open, self.on_channel_close, self.on_channel_message, pool_size=self.pc_pool_size,
+                                                            on_track=self.on_track if self.playback else None,
+                                                            on_connected=self.on_connected if self.wsc.tracer else None,
+                                                            on_data_channel=self.on_data_channel)
+            dispatcher: PeerMessageDispatcher = None
+            signaling_handler: SignalingHandler = None
+            try:
+                peer_connection_manager.start_pool(self.audio_broadcaster)
+                signaling_handler = SignalingHandler(self.wsc, self, peer_connection_manager, self.logger)
+                if self.bitrate_controller:
+                    self.bitrate_controller.start()
+                if self.stats_collector:
+                    await self.stats_collector.start()
+
+                await signaling_handler.process_confirm_id()
+
+                # When ID is confirmed, we send JOIN request to all peers (send to Signaling Server, which will broadcast it to everyone)
+                await self.wsc.broadcast(MessageType.JOIN, {})
+                if signaling_handler.sfu_id is not None:
+                    # One upload for the whole room
+                    await signaling_handler.publish(self.audio_broadcaster)
+
+                # Start signaling loop. Each remote peer gets its own ordered queue
+                dispatcher = self.dispatcher = PeerMessageDispatcher(self.logger, lambda message_type, payload: self.handle_signaling_message(signaling_handler, message_type, payload))
+                self.connection_monitor.start()
+                async for message in websocket:
+                    # We don't need to validate messages from server since they are trusted.
+                    message:dict = json.loads(message)
+                    self.log_debug(f"Received signaling message: {message}")
+                    if self.wsc.tracer is not None:
+                        self.wsc.tracer.incoming(message)
+
+                    try:
+                        message_type = MessageType(message["type"])
+                    except ValueError:
+                        self.log_warn(f"Ignoring message of unknown type {message['type']}")
+                        continue
+                    payload = message.get("payload", {})
+                    dispatcher.dispatch(message_type, payload)
+            finally:
+                # Also when the connection drops: no background task or pooled connection outlives the session
+                await self.connection_monitor.stop()
+                if dispatcher is not None:
+                    await dispatcher.close()
+                if signaling_handler is not None:
+                    signaling_handler.cancel_deferred_replacements()
+                await peer_connection_manager.close_pool()
+                if self.bitrate_controller:
+                    await self.bitrate_controller.stop()
+                if self.stats_collector:
+                    await self.stats_collector.stop()
+                if self.playback:
+                    await self.playback.stop()
+                self.log_info("WebRTC connection closed")
 
 async def main():
 
@@ -142,16 +245,20 @@ async def main():
     ssl_context.verify_mode = ssl.CERT_REQUIRED
 
 
-    websocket_client = WebSocketClient(SIGNALING_SERVER, ssl_context, logger)
+    websocket_client = WebSocketClient(SIGNALING_SERVER, ssl_context, logger, tracer=SignalingTracer(logger))
     media_controller = MediaController(logger)
-    audio_track = LoopbackAudioTrack(logger)
+    audio_track = LoopbackAudioTrack(logger, profile="music")
+    # The loopback capture would send the peers' own audio back to them: mixed, not played
+    playback = AudioMixer(logger, create_sink("null", logger))
 
-    signaling_client = SignalingClient(name="<b>Win Client</b>",logger=logger, media_controller=media_controller, wsc=websocket_client, audio_track=audio_track)
+    signaling_client = SignalingClient(name="<b>Win Client</b>",logger=logger, media_controller=media_controller, wsc=websocket_client, audio_track=audio_track, encode_once=True, pc_pool_size=2, adaptive_bitrate=True, stats_port=8766, playback=playback)
     await signaling_client.initialize()
     
     try:
         await signaling_client.run()
     finally:
+        signaling_client.audio_broadcaster.stop()
+
         # Halt the task if it still works
         signaling_client.background_np_update.cancel()
         await signaling_client.background_np_update